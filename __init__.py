@@ -11,6 +11,7 @@ import threading
 
 
 gui_hooks.profile_did_open.append(menu.on_profile_loaded)
+gui_hooks.profile_will_close.append(lambda: manage_database.flush_subtitle_access(wait=True))
 threading.Thread(target=lambda: constants.timed_call(manage_database.update_database), daemon=True).start()
 
 if constants.addon_source_folder and not os.path.exists(constants.addon_source_folder):
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import constants
+from .constants import log_command, log_error
+
+# decoded audio tracks, cut from instead of demuxing the whole video again for every timing change
+audio_cache_folder = os.path.join(constants.addon_dir, "audio_cache")
+
+# tracks are decoded one at a time in the background
+_cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio_cache")
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def is_enabled():
+    return bool(constants.load_config().get("audio_track_cache", False))
+
+
+def get_cache_limit_bytes():
+    try:
+        limit_mb = int(constants.load_config().get("audio_track_cache_max_mb", 2048))
+    except (TypeError, ValueError):
+        limit_mb = 2048
+    return max(limit_mb, 0) * 1024 * 1024
+
+
+# the source's path, size and mtime are part of the name, so a changed file never matches an old cache entry
+def get_cache_path(source_path, stream_index):
+    path = os.path.abspath(source_path)
+    stat = os.stat(path)
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{stream_index}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=10).hexdigest()
+    return os.path.join(audio_cache_folder, f"{digest}.flac")
+
+
+# returns the decoded track to cut from, or None after queueing it so later cuts can use it
+def get_cached_track(source_path, stream_index):
+    if not is_enabled():
+        return None
+    try:
+        cache_path = get_cache_path(source_path, stream_index)
+    except OSError:
+        return None
+
+    if os.path.exists(cache_path):
+        # the mtime is the last use, for eviction
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+        return cache_path
+
+    with _pending_lock:
+        if cache_path in _pending:
+            return None
+        _pending.add(cache_path)
+    _cache_executor.submit(cache_track, source_path, stream_index, cache_path)
+    return None
+
+
+def cache_track(source_path, stream_index, cache_path):
+    tmp_path = cache_path + ".tmp.flac"
+    try:
+        ffmpeg_path, _ = constants.get_ffmpeg_exe_path()
+        if not ffmpeg_path:
+            return
+        os.makedirs(audio_cache_folder, exist_ok=True)
+
+        # first_pts=0 pads a delayed stream with silence, so the cache lines up with seeks in the source file
+        cmd = [
+            ffmpeg_path, "-y", "-loglevel", "error",
+            "-i", source_path,
+            "-map", f"0:{stream_index}",
+            "-af", "aresample=async=1:first_pts=0",
+            "-c:a", "flac",
+            tmp_path
+        ]
+        log_command(f"[FFmpeg audio cache]\n{' '.join(cmd)}")
+        result = constants.silent_run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+        if result.returncode != 0 or not os.path.exists(tmp_path):
+            log_error(f"Caching audio track {stream_index} of {source_path} failed:\n{result.stderr}")
+            return
+        os.replace(tmp_path, cache_path)
+        log_command(f"cached audio track {stream_index} of {os.path.basename(source_path)}: {cache_path}")
+        evict_old_tracks(keep=cache_path)
+    except Exception as e:
+        log_error(f"Error caching audio track {stream_index} of {source_path}: {e}")
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        with _pending_lock:
+            _pending.discard(cache_path)
+
+
+# removes the least recently used tracks until the cache fits its size limit
+def evict_old_tracks(keep=None):
+    try:
+        entries = [entry for entry in os.scandir(audio_cache_folder) if entry.is_file() and entry.name.endswith(".flac")]
+    except FileNotFoundError:
+        return
+
+    # tracks still being written end in .tmp.flac and aren't evicted
+    tracks = []
+    for entry in entries:
+        if entry.name.endswith(".tmp.flac"):
+            continue
+        stat = entry.stat()
+        tracks.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in tracks)
+    limit = get_cache_limit_bytes()
+    for _, size, path in sorted(tracks):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            log_command(f"evicted cached audio track {os.path.basename(path)}")
+        except OSError as e:
+            log_error(f"Could not evict cached audio track {path}: {e}")
+
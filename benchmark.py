@@ -0,0 +1,533 @@
+# headless benchmarks for indexing, search and extraction, run outside Anki:
+#   python benchmark.py --sizes 10 50 200 --output bench.json
+#   python benchmark.py --sizes 10 50 200 --output new.json --compare bench.json
+# the add-on is copied into a temporary folder so its database, config and sources don't touch the real ones
+# update_database and clip extraction need ffmpeg and ffprobe on the PATH and are skipped without them
+import argparse
+import glob
+import importlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime
+
+addon_dir = os.path.dirname(os.path.abspath(__file__))
+package_name = "audio_card_suite_bench"
+note_type_name = "Benchmark"
+language_code = "jpn"
+words = [
+    "今日", "明日", "学校", "先生", "電車", "友達", "映画", "音楽", "天気", "仕事",
+    "猫", "犬", "本", "水", "空", "海", "山", "川", "町", "家",
+    "行く", "来る", "見る", "食べる", "飲む", "話す", "聞く", "読む", "書く", "待つ",
+    "です", "ます", "でした", "ません", "だろう", "かな", "よね", "けど", "から", "まで",
+]
+
+
+## stubs and setup
+
+class Anything:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return Anything()
+
+    def __call__(self, *args, **kwargs):
+        return Anything()
+
+    def __or__(self, other):
+        return self
+
+    def __and__(self, other):
+        return False
+
+
+def stub_module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+
+# aqt is always replaced, PyQt6 and send2trash only when they aren't installed
+def install_stubs(collection_dir):
+    collection = types.SimpleNamespace(media=types.SimpleNamespace(dir=lambda: collection_dir))
+    aqt = stub_module("aqt", mw=types.SimpleNamespace(col=collection, taskman=Anything()), gui_hooks=Anything())
+    aqt.utils = stub_module("aqt.utils", showInfo=lambda *args, **kwargs: None, tooltip=lambda *args, **kwargs: None)
+    aqt.sound = stub_module("aqt.sound", play=lambda *args: None, av_player=Anything())
+    aqt.editor = stub_module("aqt.editor", Editor=object)
+    aqt.addcards = stub_module("aqt.addcards", AddCards=object)
+    aqt.qt = stub_module("aqt.qt")
+
+    try:
+        importlib.import_module("PyQt6.QtCore")
+    except ImportError:
+        class Signal:
+            def __init__(self, *types_):
+                self.slots = []
+
+            def __get__(self, instance, owner):
+                return self
+
+            def connect(self, slot, *args):
+                self.slots.append(slot)
+
+            def emit(self, *args):
+                for slot in list(self.slots):
+                    slot(*args)
+
+        stub_module("PyQt6")
+        stub_module("PyQt6.QtCore", Qt=Anything(), QTimer=Anything(), QUrl=Anything(), QObject=object, pyqtSignal=Signal)
+        stub_module("PyQt6.QtWidgets", QApplication=Anything(), QProgressDialog=Anything())
+        stub_module("PyQt6.QtGui", QDesktopServices=Anything())
+
+    try:
+        importlib.import_module("send2trash")
+    except ImportError:
+        stub_module("send2trash", send2trash=os.remove)
+
+
+# copies the add-on's modules into work_dir and imports them as a package
+def load_addon(work_dir):
+    package_dir = os.path.join(work_dir, package_name)
+    os.makedirs(package_dir)
+    for path in glob.glob(os.path.join(addon_dir, "*.py")):
+        shutil.copy2(path, package_dir)
+
+    package = types.ModuleType(package_name)
+    package.__path__ = [package_dir]
+    sys.modules[package_name] = package
+
+    modules = {}
+    for name in ("constants", "manage_database", "manage_files", "ffmpeg_batch"):
+        modules[name] = importlib.import_module(f"{package_name}.{name}")
+    # older commits parse subtitles inside manage_database
+    try:
+        modules["subtitle_parser"] = importlib.import_module(f"{package_name}.subtitle_parser")
+    except ImportError:
+        modules["subtitle_parser"] = None
+    constants = modules["constants"]
+    for flag in ("DEBUG_FILENAME", "DEBUG_COMMAND", "DEBUG_ERROR", "DEBUG_IMAGE", "DEBUG_DATABASE"):
+        setattr(constants, flag, False)
+    return modules
+
+
+# closes this thread's connection and removes the database, the next get_database creates it again
+# older commits without delete_database only had per-thread connections to close
+def reset_database(modules):
+    md = modules["manage_database"]
+    if hasattr(md, "delete_database"):
+        md.delete_database()
+        return
+    conn = getattr(md._thread_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        md._thread_local.conn = None
+    md.invalidate_track_cache()
+    for suffix in ("", "-wal", "-shm"):
+        path = os.path.join(modules["constants"].addon_dir, "subtitles_index.db" + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def get_benchmark_config(constants):
+    config = constants.extract_config_data()
+    note_config = {key: config[key] for key in constants.default_settings if key in config}
+    note_config.update({
+        "target_language_code": language_code,
+        "target_audio_track": 1,
+        "target_subtitle_track": 1,
+        "selected_tab_index": 0,
+    })
+    config[note_type_name] = note_config
+    return config
+
+
+## corpus
+
+def milliseconds_to_srt_time(ms):
+    hours, ms = divmod(ms, 3600 * 1000)
+    minutes, ms = divmod(ms, 60 * 1000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def milliseconds_to_ass_time(ms):
+    hours, ms = divmod(ms, 3600 * 1000)
+    minutes, ms = divmod(ms, 60 * 1000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{ms // 10:02d}"
+
+
+# [(start_ms, end_ms, text)] for one episode, with some overlapping lines like real subtitles
+def generate_blocks(rng, block_count):
+    blocks = []
+    position = rng.randint(0, 5000)
+    for _ in range(block_count):
+        duration = rng.randint(800, 4500)
+        text = "".join(rng.choice(words) for _ in range(rng.randint(3, 12)))
+        blocks.append((position, position + duration, text))
+        position += duration + rng.randint(-400, 1500)
+        position = max(position, blocks[-1][0] + 1)
+    return blocks
+
+
+def srt_text(blocks):
+    return "".join(
+        f"{i}\n{milliseconds_to_srt_time(start_ms)} --> {milliseconds_to_srt_time(end_ms)}\n{text}\n\n"
+        for i, (start_ms, end_ms, text) in enumerate(blocks, 1)
+    )
+
+
+def ass_text(blocks):
+    header = (
+        "[Script Info]\nScriptType: v4.00+\n\n[V4+ Styles]\n"
+        "Format: Name, Fontname, Fontsize, PrimaryColour, Bold, Italic, Alignment\n"
+        "Style: Default,Arial,20,&H00FFFFFF,0,0,2\n\n[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
+    return header + "".join(
+        f"Dialogue: 0,{milliseconds_to_ass_time(start_ms)},{milliseconds_to_ass_time(end_ms)},Default,,0,0,0,,{{\\i1}}{text}\n"
+        for start_ms, end_ms, text in blocks
+    )
+
+
+def write_srt(path, blocks):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(srt_text(blocks))
+
+
+def write_ass(path, blocks):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(ass_text(blocks))
+
+
+# episode names and blocks for a corpus of size files, every fourth subtitle is written as ass
+def generate_corpus(size, blocks_per_file, seed):
+    rng = random.Random(seed + size)
+    return [(f"bench_{size}_{i:04d}", generate_blocks(rng, blocks_per_file)) for i in range(size)]
+
+
+def write_corpus_files(corpus, source_folder, media_template):
+    for i, (name, blocks) in enumerate(corpus):
+        if i % 4 == 3:
+            write_ass(os.path.join(source_folder, f"{name}.{language_code}.ass"), blocks)
+        else:
+            write_srt(os.path.join(source_folder, f"{name}.{language_code}.srt"), blocks)
+        if media_template:
+            shutil.copyfile(media_template, os.path.join(source_folder, f"{name}.mkv"))
+
+
+def remove_corpus_files(source_folder):
+    for entry in os.scandir(source_folder):
+        if entry.is_file():
+            os.remove(entry.path)
+
+
+# a short video with a tone from lavfi, copied for every episode
+def make_test_media(path, seconds):
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=640x360:rate=24:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={seconds}",
+        "-map", "0:v", "-map", "1:a",
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", "48",
+        "-c:a", "aac", "-metadata:s:a:0", f"language={language_code}",
+        path
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)
+
+
+## timing
+
+class Results:
+    def __init__(self):
+        self.entries = []
+
+    def add(self, name, size, timings, **extra):
+        timings_ms = [t * 1000 for t in timings]
+        entry = {
+            "name": name,
+            "size": size,
+            "runs": len(timings_ms),
+            "total_ms": round(sum(timings_ms), 3),
+            "mean_ms": round(statistics.mean(timings_ms), 3),
+            "p50_ms": round(statistics.median(timings_ms), 3),
+            "p95_ms": round(sorted(timings_ms)[max(0, int(len(timings_ms) * 0.95) - 1)], 3),
+        }
+        entry.update(extra)
+        self.entries.append(entry)
+        print(f"{name:<32} size={size:<6} runs={entry['runs']:<5} mean={entry['mean_ms']:>10.3f}ms p95={entry['p95_ms']:>10.3f}ms")
+
+
+def time_calls(function, arguments):
+    timings = []
+    for args in arguments:
+        started = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def time_once(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+## benchmarks
+
+def parse_srt(modules, text):
+    if modules["subtitle_parser"] is not None:
+        return modules["subtitle_parser"].parse_subtitle_text(text, ass=False)
+    return modules["manage_database"].parse_srt_from_text(text)
+
+
+# parsing alone, ass is only timed where it's parsed without ffmpeg
+def bench_parse(modules, results, size, corpus):
+    texts = [srt_text(blocks) for _, blocks in corpus]
+    results.add("parse_srt", size, time_calls(lambda text: parse_srt(modules, text), [(text,) for text in texts]))
+
+    parser = modules["subtitle_parser"]
+    if parser is not None:
+        texts = [ass_text(blocks) for _, blocks in corpus]
+        results.add("parse_ass", size, time_calls(lambda text: parser.parse_subtitle_text(text, ass=True), [(text,) for text in texts]))
+
+
+# stores every track the way update_database does after parsing, without needing ffmpeg
+def bench_index_store(modules, results, size, corpus):
+    md = modules["manage_database"]
+    conn = md.get_database()
+    texts = [(name, srt_text(blocks)) for name, blocks in corpus]
+
+    started = time.perf_counter()
+    for name, text in texts:
+        blocks = parse_srt(modules, text)
+        md.store_subtitle_track(conn, f"{name}.mkv", language_code, language_code, "-1", blocks)
+        conn.execute(
+            "INSERT OR REPLACE INTO subtitle_access (filename, last_accessed) VALUES (?, CURRENT_TIMESTAMP)",
+            (f"{name}.mkv",)
+        )
+    results.add("index_store", size, [time.perf_counter() - started],
+                blocks=sum(len(blocks) for _, blocks in corpus))
+
+
+def bench_update_database(modules, results, size, corpus, media_template):
+    md = modules["manage_database"]
+    source_folder = md.folder
+    remove_corpus_files(source_folder)
+    write_corpus_files(corpus, source_folder, media_template)
+
+    reset_database(modules)
+    elapsed, _ = time_once(md.update_database)
+    results.add("update_database_cold", size, [elapsed])
+    elapsed, _ = time_once(md.update_database)
+    results.add("update_database_unchanged", size, [elapsed])
+
+
+def pick_sentences(rng, corpus, count):
+    sentences = []
+    for _ in range(count):
+        name, blocks = rng.choice(corpus)
+        i = rng.randrange(len(blocks))
+        # a third of the lookups span two lines, like a card made from a multi-line selection
+        if rng.random() < 0.33 and i + 1 < len(blocks):
+            sentences.append(blocks[i][2] + blocks[i + 1][2])
+        else:
+            sentences.append(blocks[i][2])
+    return sentences
+
+
+def bench_sentence_lookup(modules, results, size, corpus, config, queries, rng):
+    mf = modules["manage_files"]
+    sentences = pick_sentences(rng, corpus, queries)
+    timings = time_calls(
+        lambda sentence: mf.get_target_subtitle_block_and_subtitle_path_from_sentence_line(sentence, config, note_type_name),
+        [(sentence,) for sentence in sentences]
+    )
+    results.add("sentence_lookup", size, timings)
+
+    missing = ["存在しない台詞" + str(i) for i in range(max(1, queries // 10))]
+    timings = time_calls(
+        lambda sentence: mf.get_target_subtitle_block_and_subtitle_path_from_sentence_line(sentence, config, note_type_name),
+        [(sentence,) for sentence in missing]
+    )
+    results.add("sentence_lookup_miss", size, timings)
+
+
+def bench_next_match(modules, results, size, corpus, config, queries, rng):
+    mf = modules["manage_files"]
+    arguments = []
+    for _ in range(queries):
+        name, blocks = rng.choice(corpus)
+        i = rng.randrange(len(blocks))
+        sound_line_data = {"start_index": i + 1, "filename_base": name}
+        arguments.append((rng.choice(words), sound_line_data))
+    timings = time_calls(
+        lambda selected_text, data: mf.get_next_matching_subtitle_block(selected_text, selected_text, "", config, data, note_type_name),
+        arguments
+    )
+    results.add("get_next_matching_subtitle_block", size, timings)
+
+
+def bench_overlap(modules, results, size, corpus, queries, rng):
+    md = modules["manage_database"]
+    conn = md.get_database()
+    lookups = []
+    for _ in range(queries):
+        name, blocks = rng.choice(corpus)
+        start_ms = rng.randint(0, blocks[-1][1])
+        lookups.append((f"{name}.mkv", start_ms, start_ms + rng.randint(500, 8000)))
+
+    def lookup(filename, start_ms, end_ms):
+        md.load_subtitle_track(conn, filename, "-1", language_code).get_overlapping_blocks(start_ms, end_ms)
+
+    md.invalidate_track_cache()
+    cold = []
+    for filename, start_ms, end_ms in lookups:
+        md.invalidate_track_cache(filename, "-1", language_code)
+        cold += time_calls(lookup, [(filename, start_ms, end_ms)])
+    results.add("overlap_lookup_cold", size, cold)
+    results.add("overlap_lookup_cached", size, time_calls(lookup, lookups))
+
+
+def bench_clip_extraction(modules, results, media_path, config, clips, work_dir):
+    mf = modules["manage_files"]
+    fb = modules["ffmpeg_batch"]
+    constants = modules["constants"]
+    output_dir = os.path.join(work_dir, "clips")
+    os.makedirs(output_dir, exist_ok=True)
+    # normalizing would queue a loudness measurement during the timed runs, and only the clips cut
+    # after it's stored would use the gain filter, so both paths run without it
+    config = dict(config)
+    config[note_type_name] = dict(config[note_type_name], normalize_audio=False)
+
+    def build(i, kind):
+        start_ms = 1000 + i * 700
+        output = os.path.join(output_dir, f"{kind}_{i}.mp3")
+        cmd = mf.create_ffmpeg_extract_audio_command(
+            media_path, mf.to_hmsms_format(start_ms), mf.to_hmsms_format(start_ms + 2500), output,
+            "", config, {}, False, note_type_name, 0
+        )
+        return cmd, output
+
+    commands = [build(i, "single") for i in range(clips)]
+    timings = time_calls(lambda cmd: constants.silent_run(cmd, capture_output=True, text=True), [(cmd,) for cmd, _ in commands])
+    results.add("clip_extraction_single", clips, timings)
+
+    batch = fb.FFmpegBatch()
+    for i in range(clips):
+        cmd, output = build(i, "batched")
+        batch.add(cmd, media_path, output)
+    elapsed, _ = time_once(batch.run)
+    results.add("clip_extraction_batched", clips, [elapsed], failed=batch.failed)
+
+
+## output
+
+def get_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=addon_dir, capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous_path, entries):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(entry["name"], entry["size"]): entry for entry in json.load(f)["results"]}
+    print(f"\ncompared with {previous_path}:")
+    for entry in entries:
+        old = previous.get((entry["name"], entry["size"]))
+        if not old or not old["mean_ms"]:
+            continue
+        ratio = entry["mean_ms"] / old["mean_ms"]
+        print(f"{entry['name']:<32} size={entry['size']:<6} {old['mean_ms']:>10.3f}ms -> {entry['mean_ms']:>10.3f}ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio Card Suite benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="subtitle files per corpus")
+    parser.add_argument("--blocks", type=int, default=400, help="subtitle lines per file")
+    parser.add_argument("--queries", type=int, default=200, help="lookups per search benchmark")
+    parser.add_argument("--clips", type=int, default=16, help="clips for the extraction benchmark")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--skip-ffmpeg", action="store_true", help="skip the benchmarks that run ffmpeg")
+    args = parser.parse_args()
+
+    use_ffmpeg = not args.skip_ffmpeg and shutil.which("ffmpeg") and shutil.which("ffprobe")
+    if not use_ffmpeg:
+        print("ffmpeg benchmarks skipped, ffmpeg and ffprobe need to be on the PATH")
+
+    work_dir = tempfile.mkdtemp(prefix="acs_bench_")
+    try:
+        collection_dir = os.path.join(work_dir, "collection.media")
+        os.makedirs(collection_dir)
+        install_stubs(collection_dir)
+        modules = load_addon(work_dir)
+        constants = modules["constants"]
+        md = modules["manage_database"]
+        config = get_benchmark_config(constants)
+        os.makedirs(md.folder, exist_ok=True)
+
+        media_template = None
+        if use_ffmpeg:
+            media_template = os.path.join(work_dir, "template.mkv")
+            make_test_media(media_template, 60)
+
+        results = Results()
+        for size in args.sizes:
+            rng = random.Random(args.seed + size)
+            corpus = generate_corpus(size, args.blocks, args.seed)
+
+            # every size starts from an empty database
+            reset_database(modules)
+
+            bench_parse(modules, results, size, corpus)
+            if use_ffmpeg:
+                bench_update_database(modules, results, size, corpus, media_template)
+            else:
+                bench_index_store(modules, results, size, corpus)
+
+            bench_sentence_lookup(modules, results, size, corpus, config, args.queries, rng)
+            bench_next_match(modules, results, size, corpus, config, max(1, args.queries // 10), rng)
+            bench_overlap(modules, results, size, corpus, args.queries, rng)
+
+        if use_ffmpeg:
+            bench_clip_extraction(modules, results, media_template, config, args.clips, work_dir)
+
+        output = {
+            "commit": get_commit(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "ffmpeg": bool(use_ffmpeg),
+            "settings": {"sizes": args.sizes, "blocks": args.blocks, "queries": args.queries, "clips": args.clips, "seed": args.seed},
+            "results": results.entries,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"\nresults written to {args.output}")
+
+        if args.compare:
+            compare(args.compare, results.entries)
+    finally:
+        md = sys.modules.get(f"{package_name}.manage_database")
+        conn = getattr(md._thread_local, "conn", None) if md is not None else None
+        if conn is not None:
+            conn.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
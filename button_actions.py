@@ -1,17 +1,21 @@
 # imports
 import difflib
+import json
 import os
 import re
+import threading
 import aqt
+from concurrent.futures import ThreadPoolExecutor
 
-from aqt.sound import play, av_player
+from aqt.sound import av_player
 from aqt.utils import tooltip
-from PyQt6.QtCore import Qt, QTimer
-from PyQt6.QtWidgets import QApplication
-from PyQt6.QtCore import QTimer
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QProgressDialog
 
 from . import manage_database
 from . import manage_files
+from . import ffmpeg_batch
+from . import media_jobs
 from .manage_files import extract_sound_line_data
 from .manage_files import get_altered_sound_data
 from .manage_files import get_field_key_from_label
@@ -23,6 +27,7 @@ from .constants import log_image
 from .constants import log_database
 from .constants import log_command
 from .constants import addon_source_folder
+from .constants import showInfo
 
 
 # constants
@@ -216,7 +221,7 @@ def add_and_remove_edge_lines_update_note(editor, add_to_start, add_to_end):
     timing_subtitle_path = manage_files.get_subtitle_file_from_database(full_source_filename, track, timing_code, config, subtitle_database, note_type_name)
 
     if not timing_subtitle_path:
-        # aqt.utils.showInfo(f"No subtitle file found matching the source file '{full_source_filename}'.")
+        # showInfo(f"No subtitle file found matching the source file '{full_source_filename}'.")
         log_error(f"No subtitle file found matching the source file '{full_source_filename}'.")
 
     log_filename(f"getting timing blocks, start_index {start_index}, add to start: {add_to_start}, end_index {end_index}, add to end: {add_to_end}, timing subtitle path: {timing_subtitle_path}")
@@ -240,7 +245,7 @@ def add_and_remove_edge_lines_update_note(editor, add_to_start, add_to_end):
         log_filename(f"sentence_subtitle_path: {sentence_subtitle_path}")
 
         if not sentence_subtitle_path:
-            aqt.utils.showInfo(f"No subtitle file found matching {full_source_filename}|`track_{track}'|code:'{code}'")
+            showInfo(f"No subtitle file found matching {full_source_filename}|`track_{track}'|code:'{code}'")
 
         sentence_blocks = manage_files.get_overlapping_blocks_from_subtitle_path_and_hmsms_timings(sentence_subtitle_path, start_time, end_time)
         if not sentence_blocks:
@@ -292,7 +297,7 @@ def add_and_remove_edge_lines_update_note(editor, add_to_start, add_to_end):
         match = re.search(r"\[sound:(.*?)]", play_sound)
         if match:
             sound_filename = match.group(1)
-            QTimer.singleShot(50, lambda: play(sound_filename))
+            media_jobs.play_when_ready(sound_filename)
 
 
 def adjust_sound_tag(editor, start_delta: int, end_delta: int):
@@ -327,6 +332,8 @@ def adjust_sound_tag(editor, start_delta: int, end_delta: int):
         sentence_line = fields["sentence_line"]
 
     generated = False
+    # the editor buttons always cut from the first audio track matching the note's language
+    corresponding_audio_track_count = 0
 
     # generate a new sound line if no valid sound line is detected
     data = manage_files.extract_sound_line_data(sound_line)
@@ -344,7 +351,7 @@ def adjust_sound_tag(editor, start_delta: int, end_delta: int):
         return
 
     log_filename(f"sending data to alter sound file times: {altered_data}")
-    new_sound_line = manage_files.alter_sound_file_times(altered_data, sound_line, config, alt_pressed, note_type_name, 0)
+    new_sound_line = manage_files.alter_sound_file_times(altered_data, sound_line, config, alt_pressed, note_type_name, corresponding_audio_track_count)
 
     # generate a new sound line if first try failed
     if not new_sound_line and not generated:
@@ -356,11 +363,14 @@ def adjust_sound_tag(editor, start_delta: int, end_delta: int):
         altered_data = manage_files.get_altered_sound_data(sound_line, -start_delta, end_delta, config, data, note_type_name)
 
         log_filename(f"sending data to alter sound file times: {altered_data}")
-        new_sound_line = manage_files.alter_sound_file_times(altered_data, sound_line, config, alt_pressed, note_type_name, 0)
+        new_sound_line = manage_files.alter_sound_file_times(altered_data, sound_line, config, alt_pressed, note_type_name, corresponding_audio_track_count)
 
     if new_sound_line:
         editor.note.fields[sound_idx] = new_sound_line
         editor.loadNote()
+        # the next press is likely another small step, render those clips while this one plays
+        manage_files.prerender_timing_variants(new_sound_line, config, alt_pressed, note_type_name,
+                                               corresponding_audio_track_count)
 
     autoplay = config["autoplay"]
     if not autoplay:
@@ -369,7 +379,7 @@ def adjust_sound_tag(editor, start_delta: int, end_delta: int):
         match = re.search(r"\[sound:(.*?)]", play_sound)
         if match:
             sound_filename = match.group(1)
-            QTimer.singleShot(50, lambda: play(sound_filename))
+            media_jobs.play_when_ready(sound_filename)
 
 
 # play sound hooks and buttons
@@ -380,10 +390,12 @@ def generate_fields_button(editor):
     sound_filename, _ = generate_and_update_fields(editor, None, False)
     if sound_filename:
         log_command(f"Playing sound filename: {sound_filename}")
-        QTimer.singleShot(50, lambda: play(sound_filename))
+        media_jobs.play_when_ready(sound_filename)
 
 # uses current fields to generate all missing fields
-def generate_and_update_fields(editor, note, should_overwrite):
+# pending_updates collects the note instead of saving it, for bulk runs that save notes in batches on the main thread
+# returns (sound filename, updated), updated is None when the fields couldn't be generated
+def generate_and_update_fields(editor, note, should_overwrite, pending_updates=None):
     ffmpeg, ffprobe = constants.get_ffmpeg_exe_path()
     if not (ffmpeg and ffprobe):
         return None, None
@@ -404,7 +416,7 @@ def generate_and_update_fields(editor, note, should_overwrite):
 
     if not fields:
         log_error(f"No fields set for the note type '{note_type_name}'.")
-        aqt.utils.showInfo(f"No fields set for the note type '{note_type_name}'.")
+        showInfo(f"No fields set for the note type '{note_type_name}'.")
         return None, None
 
     sentence_idx = fields["sentence_idx"]
@@ -414,7 +426,11 @@ def generate_and_update_fields(editor, note, should_overwrite):
     translation_sound_idx = fields["translation_sound_idx"]
     sound_line = fields["sound_line"]
 
-    modifiers = QApplication.keyboardModifiers()
+    # bulk runs fill notes off the main thread, where the keyboard can't be read
+    if pending_updates is None:
+        modifiers = QApplication.keyboardModifiers()
+    else:
+        modifiers = Qt.KeyboardModifier.NoModifier
     overwrite = bool(modifiers & Qt.KeyboardModifier.ControlModifier) or should_overwrite
     alt_pressed = bool(modifiers & Qt.KeyboardModifier.AltModifier)
 
@@ -474,12 +490,7 @@ def generate_and_update_fields(editor, note, should_overwrite):
         if not new_sound_line:
             # todo: add original and sanitized filenames to database so all filenames work
             # find invalid files
-            all_files_in_folder = {
-                os.path.join(root, f)
-                for root, dirs, files in os.walk(constants.folder)
-                if 'ignore' not in root.lower().split(os.sep)
-                for f in files
-            }
+            all_files_in_folder = {f.path for f in manage_database.get_source_snapshot().files()}
 
             bad_files = [
                 f for f in (all_files_in_folder)
@@ -488,12 +499,12 @@ def generate_and_update_fields(editor, note, should_overwrite):
             if bad_files:
                 msg = "Audio Card Suite\nPlease rename the files containing '((' or '))' inside\n" + constants.folder + ": \n" + "\n".join(os.path.basename(f) for f in bad_files)
                 log_error(msg)
-                aqt.utils.showInfo(msg)
+                showInfo(msg)
             else:
                 full_source_filename = altered_data["full_source_filename"]
                 log_error(f"Source file not found for: {full_source_filename}.")
-                aqt.utils.showInfo(f"Source file not found for: {full_source_filename}.")
-            return None, False
+                showInfo(f"Source file not found for: {full_source_filename}.")
+            return None, None
 
     if should_generate["translation_sound_line"]:
         log_filename(f"getting sound data from translation: {new_translation_sound_line}")
@@ -521,7 +532,7 @@ def generate_and_update_fields(editor, note, should_overwrite):
     filename_base = re.sub(r'^\[sound:|]$', '', new_sound_line.split("`", 1)[0].strip())
     filename_base_underscore = constants.format_anki_safe_filename(filename_base, revert=True).replace(" ", "_")
     if not filename_base_underscore:
-        return None, False
+        return None, None
 
     # Use editor.note if available, otherwise fall back to note
     target_note = editor.note if editor is not None else note
@@ -532,6 +543,8 @@ def generate_and_update_fields(editor, note, should_overwrite):
     # Only call editor.loadNote() if editor is not None
     if editor is not None:
         editor.loadNote()
+    elif pending_updates is not None:
+        pending_updates.append(current_note)
     else:
         note.col.update_note(current_note)
 
@@ -547,7 +560,8 @@ def generate_and_update_fields(editor, note, should_overwrite):
 
     if match:
         path = os.path.join(aqt.mw.col.media.dir(), match.group(1))
-        return (match.group(1), updated) if os.path.exists(path) else (None, updated)
+        # a clip still being written by a media job counts, the callers play it through play_when_ready
+        return (match.group(1), updated) if os.path.exists(path) or media_jobs.is_pending(path) else (None, updated)
     return None, updated
 
 
@@ -757,7 +771,7 @@ def get_generate_fields_sound_sentence_image_translation(note_type_name, fields,
         # return if subtitle path could not be found
         if not subtitle_path:
             log_error(f"subtitle path null1")
-            aqt.utils.showInfo(f"No subtitles found with the track '{track}', code '{code}', and base name '{full_source_filename}'.")
+            showInfo(f"No subtitles found with the track '{track}', code '{code}', and base name '{full_source_filename}'.")
             return None
 
         start_index = data["start_index"]
@@ -784,11 +798,11 @@ def get_generate_fields_sound_sentence_image_translation(note_type_name, fields,
             log_error(f"2: subtitle path null")
             if not code:
                 log_error(f"Target language code is not set.")
-                aqt.utils.showInfo(f"Target language code is not set.")
+                showInfo(f"Target language code is not set.")
             else:
                 search_text = selected_text if selected_text else sentence_line
                 log_error(f"Could not find '{search_text}' in any subtitle file in '{os.path.basename(addon_source_folder)}', or any embedded subtitle file with the code '{code}' or track '{track}'.")
-                aqt.utils.showInfo(
+                showInfo(
                     f"Could not find '{search_text}' in any subtitle file in '{os.path.basename(addon_source_folder)}', or any embedded subtitle file with the code '{code}' or track '{track}'.")
             return None
 
@@ -854,7 +868,7 @@ def get_generate_fields_sound_sentence_image_translation(note_type_name, fields,
     # get translation line
     if not new_sound_line:
         log_error(f"Target Audio not detected, cannot generate Translation or Translation Audio.")
-        aqt.utils.showInfo(f"Target Audio not detected, cannot generate Translation or Translation Audio.")
+        showInfo(f"Target Audio not detected, cannot generate Translation or Translation Audio.")
         return ""
     if should_generate_translation_line or should_generate_translation_sound_line:
         log_filename(f"calling extract sound line data 2: {new_sound_line}")
@@ -916,7 +930,7 @@ def get_generate_fields_sound_sentence_image_translation(note_type_name, fields,
 
 
 def show_info_msg(msg):
-    aqt.utils.showInfo(msg)
+    showInfo(msg)
 
 
 def get_fields_from_editor_or_note(editor_or_note):
@@ -929,7 +943,7 @@ def get_fields_from_editor_or_note(editor_or_note):
     if hasattr(note, "note_type"):
         note_type_name = note.note_type()['name']
     else:
-        aqt.utils.showInfo("Cannot determine note type.")
+        showInfo("Cannot determine note type.")
         return {}
 
     config = constants.extract_config_data()
@@ -943,7 +957,7 @@ def get_fields_from_editor_or_note(editor_or_note):
 
     mapped_fields = config[note_type_name].get("mapped_fields", {})
     if not mapped_fields:
-        # aqt.utils.showInfo(f"No fields are mapped")
+        # showInfo(f"No fields are mapped")
         return {}
 
     note = editor_or_note.note if hasattr(editor_or_note, "note") else editor_or_note
@@ -1070,7 +1084,7 @@ def get_fields_from_note(note):
     translation_line = note.fields[translation_idx] if 0 <= translation_idx < len(note.fields) else ""
 
     if not sentence_line or sentence_line == "":
-        aqt.utils.showInfo(f"Target Sentence field is empty.")
+        showInfo(f"Target Sentence field is empty.")
 
     return {
         "sound_line": sound_line,
@@ -1090,7 +1104,47 @@ def is_normalized(sound_line):
     return bool(re.search(r'`-\d+LUFS\.\w+$', sound_line))
 
 
+# sounds and images in a field, the filename is group 1 for a sound and group 2 for an image
+MEDIA_TAG_PATTERN = re.compile(r'\[sound:(.*?)]|<img src="(.*?)">')
+# (note, path) of the files watch_pending_media is already waiting on
+_watched_media = set()
+
+
+# clips and screenshots of the editor's note that media jobs are still writing
+# a screenshot is shown once it exists, either is taken out of the note again if it couldn't be written
+def watch_pending_media(editor):
+    note = editor.note
+    if note is None:
+        return
+    media_dir = aqt.mw.col.media.dir()
+    for match in MEDIA_TAG_PATTERN.finditer("\n".join(note.fields)):
+        path = os.path.join(media_dir, match.group(1) or match.group(2))
+        key = (id(note), path)
+        if key in _watched_media or not media_jobs.is_pending(path):
+            continue
+        _watched_media.add(key)
+        media_jobs.when_ready(
+            path, lambda succeeded, key=key, tag=match.group(0): on_pending_media_ready(editor, note, key, tag, succeeded)
+        )
+
+
+def on_pending_media_ready(editor, note, key, tag, succeeded):
+    _watched_media.discard(key)
+    if not succeeded:
+        log_error(f"Removing {tag} from the note, its file could not be written")
+        for idx, field in enumerate(note.fields):
+            note.fields[idx] = field.replace(tag, "")
+        # notes still being added aren't in the collection yet
+        if note.id:
+            aqt.mw.col.update_note(note)
+    elif not tag.startswith("<img"):
+        return
+    if editor.note is note:
+        editor.loadNote()
+
+
 def on_note_loaded(editor, override=False):
+    watch_pending_media(editor)
     editor.web.eval("window.getSelection().removeAllRanges();")
     av_player.stop_and_clear_queue()
 
@@ -1110,42 +1164,223 @@ def on_note_loaded(editor, override=False):
             if match:
                 filename = match.group(1)
                 log_command(f"Playing sound from field {sound_idx}: {filename}")
-                play(filename)
+                media_jobs.play_when_ready(filename)
 
 
 # bulk generation
-def suppress_showInfo(*args, **kwargs):
-    pass
+# notes resolved together, their clips are extracted while the next chunk is resolved
+BULK_CHUNK_SIZE = 50
 
+_bulk_run = None
 
-def bulk_generate(deck, note_type):
-    original_showInfo = aqt.utils.showInfo
-    aqt.utils.showInfo = suppress_showInfo
+
+# note ids an interrupted run already finished for this deck and note type
+def load_bulk_checkpoint(deck_id, note_type):
+    try:
+        with open(constants.bulk_checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if checkpoint.get("deck_id") != deck_id or checkpoint.get("note_type") != note_type:
+        return set()
+    return set(checkpoint.get("done", []))
+
+
+def save_bulk_checkpoint(deck_id, note_type, done):
+    checkpoint = {"deck_id": deck_id, "note_type": note_type, "done": sorted(done)}
+    tmp_path = constants.bulk_checkpoint_path + ".tmp"
     try:
-        current_deck_name = deck["name"]
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, constants.bulk_checkpoint_path)
+    except OSError as e:
+        log_error(f"Could not save bulk generate checkpoint: {e}")
 
-        log_command("Running bulk_generate...")
-        log_command(f"Deck: {current_deck_name}")
 
-        note_ids = aqt.mw.col.find_notes(f'deck:"{current_deck_name}"')
+def clear_bulk_checkpoint():
+    try:
+        os.remove(constants.bulk_checkpoint_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log_error(f"Could not remove bulk generate checkpoint: {e}")
+
+
+# fills notes on worker threads, extracts each chunk's clips in parallel ffmpeg runs,
+# and saves the notes in batches on the main thread so Anki stays responsive
+class BulkGenerateRun:
+    def __init__(self, deck, note_type, note_ids, done):
+        self.deck_id = deck["id"]
+        self.deck_name = deck["name"]
+        self.note_type = note_type
+        self.total = len(note_ids)
+        self.note_ids = [note_id for note_id in note_ids if note_id not in done]
+        self.done = set(done)
+        self.workers = manage_database.get_extraction_worker_count()
+        self.cancelled = threading.Event()
+        self.clips_written = 0
+        self.clips_failed = 0
+        self.notes_failed = 0
+        self.progress = None
+
+    def start(self):
+        self.progress = QProgressDialog("Generating fields...", "Cancel", 0, self.total, aqt.mw)
+        self.progress.setWindowTitle("Bulk Generate")
+        self.progress.setWindowModality(Qt.WindowModality.WindowModal)
+        self.progress.setMinimumDuration(0)
+        self.progress.setAutoClose(False)
+        self.progress.setAutoReset(False)
+        self.progress.setValue(len(self.done))
+        self.progress.canceled.connect(self.cancel)
+
+        threading.Thread(target=self.run, name="bulk_generate", daemon=True).start()
+
+    def cancel(self):
+        if not self.cancelled.is_set():
+            self.cancelled.set()
+            tooltip("Cancelling bulk generate after the current notes...")
+
+    # background thread, resolving chunk n+1 overlaps extracting chunk n
+    # dialogs opened on its threads are logged instead, the rest of Anki keeps showing them
+    def run(self):
+        constants.mark_background_worker("bulk generate")
+        resolve_pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="bulk_resolve",
+            initializer=constants.mark_background_worker, initargs=("bulk generate",)
+        )
+        extract_pool = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="bulk_extract",
+            initializer=constants.mark_background_worker, initargs=("bulk generate",)
+        )
+        pending_chunk = None
+        try:
+            for i in range(0, len(self.note_ids), BULK_CHUNK_SIZE):
+                if self.cancelled.is_set():
+                    break
+                chunk = self.note_ids[i:i + BULK_CHUNK_SIZE]
+                batch = ffmpeg_batch.FFmpegBatch()
+                pending_updates = []
+                results = list(resolve_pool.map(lambda note_id: self.resolve_note(note_id, batch, pending_updates), chunk))
+                processed = [note_id for note_id, resolved in zip(chunk, results) if resolved]
+                self.notes_failed += results.count(False)
+
+                if pending_chunk is not None:
+                    self.notes_failed += pending_chunk.result()
+                pending_chunk = extract_pool.submit(self.extract_and_apply, batch, processed, pending_updates)
+            if pending_chunk is not None:
+                self.notes_failed += pending_chunk.result()
+        except Exception as e:
+            log_error(f"Bulk generate stopped: {e}")
+            self.cancelled.set()
+        finally:
+            resolve_pool.shutdown()
+            extract_pool.shutdown()
+            aqt.mw.taskman.run_on_main(self.finish)
+
+    # worker thread, fills the note's fields and queues its clips in the chunk's batch
+    # returns True if the note is done, False if it failed and None if the run was cancelled first
+    # only done notes go in the checkpoint, so running again retries the failed ones
+    def resolve_note(self, note_id, batch, pending_updates):
+        if self.cancelled.is_set():
+            return None
+        ffmpeg_batch.set_thread_batch(batch, note_id)
+        try:
+            note = aqt.mw.col.get_note(note_id)
+            _, updated = generate_and_update_fields(None, note, False, pending_updates)
+        except Exception as e:
+            log_error(f"Bulk generate failed for note {note_id}: {e}")
+            return False
+        finally:
+            ffmpeg_batch.set_thread_batch(None)
+        if updated is None:
+            log_error(f"Bulk generate could not fill note {note_id}")
+            return False
+        return True
+
+    # a note whose clip or screenshot wasn't written is left unsaved and out of the checkpoint
+    # returns the number of those notes
+    def extract_and_apply(self, batch, processed, pending_updates):
+        batch.run(workers=self.workers)
+        self.clips_written += batch.completed
+        self.clips_failed += batch.failed
+        failed = [note_id for note_id in processed if note_id in batch.failed_owners]
+        for note_id in failed:
+            log_error(f"Bulk generate could not write the media of note {note_id}")
+        processed = [note_id for note_id in processed if note_id not in batch.failed_owners]
+        pending_updates = [note for note in pending_updates if note.id not in batch.failed_owners]
+        aqt.mw.taskman.run_on_main(lambda: self.apply_updates(processed, pending_updates))
+        return len(failed)
+
+    # main thread, saves the chunk's notes in one call and records them in the checkpoint
+    def apply_updates(self, processed, pending_updates):
+        if pending_updates:
+            try:
+                aqt.mw.col.update_notes(pending_updates)
+            except Exception as e:
+                log_error(f"Bulk generate could not save {len(pending_updates)} notes: {e}")
+                self.cancelled.set()
+                return
+        self.done.update(processed)
+        save_bulk_checkpoint(self.deck_id, self.note_type, self.done)
+        if not self.cancelled.is_set():
+            self.progress.setValue(len(self.done))
+            self.progress.setLabelText(f"Generated {len(self.done)} of {self.total} notes")
+
+    def finish(self):
+        global _bulk_run
+        self.progress.close()
+        _bulk_run = None
+        log_command(
+            f"bulk generate finished: {len(self.done)} notes, {self.notes_failed} notes failed, "
+            f"{self.clips_written} clips written, {self.clips_failed} failed"
+        )
+
+        if self.notes_failed and not self.cancelled.is_set():
+            showInfo(
+                f"Bulk generate finished. Processed {len(self.done)} of {self.total} notes, "
+                f"{self.notes_failed} couldn't be filled, see the log for why.\n"
+                f"Run it again on '{self.deck_name}' to retry them."
+            )
+        elif len(self.done) < self.total:
+            showInfo(
+                f"Bulk generate stopped. Processed {len(self.done)} of {self.total} notes.\n"
+                f"Run it again on '{self.deck_name}' to continue where it left off."
+            )
+        else:
+            clear_bulk_checkpoint()
+            showInfo(f"Bulk generate complete. Processed {self.total} notes.")
+
+
+def bulk_generate(deck, note_type):
+    global _bulk_run
+    if _bulk_run is not None:
+        tooltip("Bulk generate is already running.")
+        return
 
-        if not note_ids:
-            all_decks = [d["name"] for d in aqt.mw.col.decks.all()]
-            log_command(f"Available decks: {all_decks}")
+    current_deck_name = deck["name"]
 
-            log_command("Available decks:")
-            for deck in aqt.mw.col.decks.all():
-                log_command(f"  ID: {deck['id']}, Name: {deck['name']}")
+    log_command("Running bulk_generate...")
+    log_command(f"Deck: {current_deck_name}")
 
-            log_command("\nAvailable note types:")
-            for note_type in aqt.mw.col.note_types.all():
-                log_command(f"  Name: {note_type['name']}, ID: {note_type['id']}")
+    note_ids = aqt.mw.col.find_notes(f'deck:"{current_deck_name}"')
 
-        log_command(f"note ids: {note_ids}")
-        for note_id in note_ids:
-            note = aqt.mw.col.get_note(note_id)
-            generate_and_update_fields(None, note, False)
-            
-        original_showInfo(f"Bulk generate complete. Processed {len(note_ids)} notes.")
-    finally:
-        aqt.utils.showInfo = original_showInfo
+    if not note_ids:
+        all_decks = [d["name"] for d in aqt.mw.col.decks.all()]
+        log_command(f"Available decks: {all_decks}")
+
+        log_command("Available decks:")
+        for deck_entry in aqt.mw.col.decks.all():
+            log_command(f"  ID: {deck_entry['id']}, Name: {deck_entry['name']}")
+
+        log_command("\nAvailable note types:")
+        for note_type_entry in aqt.mw.col.note_types.all():
+            log_command(f"  Name: {note_type_entry['name']}, ID: {note_type_entry['id']}")
+
+    log_command(f"note ids: {note_ids}")
+    done = load_bulk_checkpoint(deck["id"], note_type) & set(note_ids)
+    if done:
+        log_command(f"resuming bulk generate, {len(done)} notes already done")
+        tooltip(f"Resuming bulk generate, {len(done)} of {len(note_ids)} notes already done.")
+
+    _bulk_run = BulkGenerateRun(deck, note_type, note_ids, done)
+    _bulk_run.start()
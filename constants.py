@@ -1,3 +1,4 @@
+import copy
 import json
 import re
 import os
@@ -9,7 +10,7 @@ import threading
 import time
 from datetime import datetime
 
-from aqt.utils import showInfo
+from aqt.utils import showInfo as aqt_showInfo
 import html
 
 # logging functions
@@ -29,6 +30,23 @@ config_dir = os.path.join(addon_dir, "config.json")
 database_updating = threading.Event()
 database_items_left = 0
 
+# bulk generate and the timing variant renders run on background threads, where a dialog can't be opened
+_background_worker = threading.local()
+bulk_checkpoint_path = os.path.join(addon_dir, "bulk_generate_checkpoint.json")
+
+def mark_background_worker(name):
+    _background_worker.name = name
+
+def on_background_worker():
+    return getattr(_background_worker, "name", None) is not None
+
+# showInfo that only logs when called from one of those threads
+def showInfo(message, *args, **kwargs):
+    if on_background_worker():
+        log_error(f"{_background_worker.name}: {message}")
+        return
+    aqt_showInfo(message, *args, **kwargs)
+
 
 temp_ffmpeg_folder = os.path.join(addon_dir, "ffmpeg")
 ffmpeg_exe_name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
@@ -102,6 +120,12 @@ default_settings = {
     "selected_tab_index": 0,
     "autoplay": False,
     "show_buttons": True,
+    "profiling": False,
+    "extraction_workers": 0,
+    "audio_track_cache": False,
+    "audio_track_cache_max_mb": 2048,
+    "media_job_workers": 2,
+    "fast_image_seek": False,
 }
 
 # menu
@@ -184,41 +208,73 @@ def log_database(message):
         print(msg)
         write_log(msg)
 
-last_trace_line = None
-last_trace_count = 0
-last_trace_printed = 0
-
-last_trace_line = None
-last_trace_count = 0
-last_trace_printed = 0
-
-def trace_calls(frame, event, arg):
-    global last_trace_line, last_trace_count, last_trace_printed
+# opt-in profiler, enabled with the "profiling" config key or the AUDIO_CARD_SUITE_PROFILE environment variable
+profile_stats = {}
+profile_lock = threading.Lock()
+_profile_local = threading.local()
+_profile_addon_codes = {}
+profiling_enabled = False
+
+def profile_calls(frame, event, arg):
+    if event != 'call' and event != 'return':
+        return
+    code = frame.f_code
+    is_addon_code = _profile_addon_codes.get(code)
+    if is_addon_code is None:
+        is_addon_code = _profile_addon_codes[code] = code.co_filename.startswith(addon_dir)
+    if not is_addon_code:
+        return
+
+    stack = getattr(_profile_local, "stack", None)
+    if stack is None:
+        stack = _profile_local.stack = []
     if event == 'call':
-        func = frame.f_code.co_name
-        file = os.path.basename(frame.f_code.co_filename)
-        line = frame.f_lineno
-
-        # only include calls from this addon
-        if addon_dir in frame.f_code.co_filename:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-            msg = f"[{timestamp}] {file}:{line} -> {func}()"
-            stripped = msg[27:]
-
-            # if called more than 10 times just print a summary
-            if stripped == last_trace_line:
-                last_trace_count += 1
-                if last_trace_count <= 10:
-                    write_log(msg)
-            else:
-                if last_trace_count > 10:
-                    write_log(f"  (...and {last_trace_count - 10} more)")
-                last_trace_line = stripped
-                last_trace_count = 1
-                write_log(msg)
-    return trace_calls
-
-sys.settrace(trace_calls)
+        stack.append((frame, time.perf_counter()))
+        return
+
+    # unwind past frames that left without a return event
+    while stack:
+        started_frame, started = stack.pop()
+        if started_frame is frame:
+            elapsed = time.perf_counter() - started
+            key = (os.path.basename(code.co_filename), code.co_firstlineno, code.co_name)
+            with profile_lock:
+                stats = profile_stats.get(key)
+                if stats is None:
+                    profile_stats[key] = [1, elapsed]
+                else:
+                    stats[0] += 1
+                    stats[1] += elapsed
+            return
+
+def start_profiling():
+    global profiling_enabled
+    if profiling_enabled:
+        return
+    profiling_enabled = True
+    threading.setprofile(profile_calls)
+    sys.setprofile(profile_calls)
+
+def stop_profiling():
+    global profiling_enabled
+    profiling_enabled = False
+    threading.setprofile(None)
+    sys.setprofile(None)
+
+def reset_profile_stats():
+    with profile_lock:
+        profile_stats.clear()
+
+# writes the functions with the most cumulative time to the log and returns the summary
+def dump_profile_summary(limit=40):
+    with profile_lock:
+        rows = sorted(profile_stats.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    lines = [f"{'calls':>9} {'cumulative s':>13} {'per call ms':>12}  function"]
+    for (file, line, func), (calls, total) in rows:
+        lines.append(f"{calls:>9} {total:>13.4f} {total / calls * 1000:>12.3f}  {file}:{line}({func})")
+    summary = "\n".join(lines)
+    write_log(f"[profile]\n{summary}\n")
+    return summary
 
 def get_ffmpeg_exe_path(background_thread=False):
     exe_path = shutil.which("ffmpeg")
@@ -243,90 +299,79 @@ def normalize_text(s):
     s = re.sub(r'[‐‑‒–—―─]+', '-', s)
     return s.strip()
 
-def get_audio_start_time_ms_for_track(source_path, audio_stream_index):
-    try:
-        ffmpeg_path, ffprobe_path = get_ffmpeg_exe_path()
-
-        cmd = [
-            ffprobe_path,
-            "-v", "error",
-            "-select_streams", f"a:{audio_stream_index}",
-            "-show_entries", "stream=start_time",
-            "-of", "json",
-            source_path
-        ]
-        result = silent_run(cmd, capture_output=True, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-
-        info = json.loads(result.stdout)
+# process wide config, reloaded only when config.json changes on disk
+_config_lock = threading.Lock()
+_config_cache = None
+_config_signature = None
 
-        streams = info.get("streams", [])
-        if not streams:
-            return 0
-
-        start_time_str = streams[0].get("start_time", "0")
-        start_time_sec = float(start_time_str)
-        delay_ms = int(start_time_sec * 1000)
-
-        return max(delay_ms, 0)
-
-    except Exception as e:
-        log_error(f"Failed to get audio start time for track {audio_stream_index} in {source_path}: {e}")
-        return 0
-
-def extract_config_data():
-    config_path = os.path.join(os.path.dirname(__file__), "config.json")
-
-    if not os.path.exists(config_path):
-        with open(config_path, "w", encoding="utf-8") as f:
-            json.dump(default_settings, f, indent=2)
-        config = default_settings.copy()
-    else:
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-
-    # Fill in any missing keys with defaults
-    for key, value in default_settings.items():
-        if key not in config:
-            config[key] = value
+def get_config_file_signature():
+    try:
+        stat = os.stat(config_dir)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
 
-    # Save back any missing defaults to file
-    with open(config_path, "w", encoding="utf-8") as f:
+def write_config_file(config):
+    global _config_signature
+    temp_path = config_dir + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
         json.dump(config, f, indent=2)
-
-    return config
+    os.replace(temp_path, config_dir)
+    _config_signature = get_config_file_signature()
+
+# returns the shared config dict, callers that change it should use extract_config_data instead
+def load_config():
+    global _config_cache, _config_signature
+    with _config_lock:
+        signature = get_config_file_signature()
+        if _config_cache is not None and signature == _config_signature:
+            return _config_cache
+
+        config = {}
+        if signature is not None:
+            try:
+                with open(config_dir, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+            except (OSError, ValueError) as e:
+                # keep the last good config rather than overwrite a file that's mid edit
+                log_error(f"Invalid config.json, using last loaded settings: {e}")
+                if _config_cache is not None:
+                    return _config_cache
+                return copy.deepcopy(default_settings)
+
+        # Fill in any missing keys with defaults, only writing back if something was added
+        missing = [key for key in default_settings if key not in config]
+        for key in missing:
+            config[key] = copy.deepcopy(default_settings[key])
+        if missing or signature is None:
+            write_config_file(config)
+        else:
+            _config_signature = signature
+
+        _config_cache = config
+        return config
+
+# returns a copy of the config that is safe to change and pass to save_config_data
+def extract_config_data():
+    return copy.deepcopy(load_config())
+
+# writes the config to disk only if it differs from what is already there
+def save_config_data(config):
+    global _config_cache
+    load_config()
+    with _config_lock:
+        if config == _config_cache:
+            return False
+        write_config_file(config)
+        _config_cache = copy.deepcopy(config)
+        return True
 
 config = extract_config_data()
 addon_source_folder = config["source_folder"]
+if config.get("profiling") or os.environ.get("AUDIO_CARD_SUITE_PROFILE"):
+    start_profiling()
 folder = os.path.join(addon_dir, addon_source_folder)
 
-def format_subtitle_block(subtitle_block):
-    if not subtitle_block:
-        log_error("No subtitle block")
-        return []
-    lines = subtitle_block.strip().splitlines()
-
-    if len(lines) < 3:
-        return []
-
-    subtitle_index = lines[0]
-    time_range = lines[1]
-
-    if '-->' not in time_range:
-        log_error(f"Invalid time range in subtitle block: {time_range}")
-        return None
-
-    subtitle_text = "\n".join(line.strip() for line in lines[2:])
-
-    start_srt, end_srt = [t.strip() for t in time_range.split('-->')]
-    start_time = format_timestamp_for_filename(start_srt)
-    end_time = format_timestamp_for_filename(end_srt)
-
-    return [subtitle_index, start_time, end_time, subtitle_text]
-
-def format_timestamp_for_filename(timestamp: str) -> str:
-    return timestamp.replace(':', '.').replace(',', '.')
-
-
 def silent_run(*args, **kwargs):
     log_command(f"silent_run called with: {args[0]}")
     if sys.platform.startswith("win"):
@@ -336,6 +381,15 @@ def silent_run(*args, **kwargs):
     kwargs.setdefault("errors", "replace")
     return subprocess.run(*args, **kwargs)
 
+# like silent_run for a process whose output is read while it runs
+def silent_popen(*args, **kwargs):
+    log_command(f"silent_popen called with: {args[0]}")
+    if sys.platform.startswith("win"):
+        kwargs.setdefault("creationflags", subprocess.CREATE_NO_WINDOW)
+    kwargs.setdefault("encoding", "utf-8")
+    kwargs.setdefault("errors", "replace")
+    return subprocess.Popen(*args, **kwargs)
+
 def timed_call(func, *args, **kwargs):
     start = time.perf_counter()
     result = func(*args, **kwargs)
@@ -0,0 +1,318 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import constants
+from .constants import log_command, log_error
+
+# the most clips one ffmpeg process opens at once, each clip is a separately seeked input of the same file
+MAX_INPUTS_PER_RUN = 16
+# clips this close together are cut from one decode of the stretch between them with asplit and atrim
+TRIM_SPAN_SECONDS = 60
+MAX_TRIM_OUTPUTS = 32
+# queued clips before the batch is run early, so a big deck doesn't wait until the end for every file
+MAX_PENDING_JOBS = 200
+# screenshots this close together are cut from one decode of the stretch between them with a select filter
+SELECT_SPAN_SECONDS = 60
+MAX_SELECT_OUTPUTS = 32
+
+# batch for the current thread only, so bulk workers queue clips without catching editor button presses
+_thread_batch = threading.local()
+
+
+# one queued single-file command, split into the input part and the output part
+class BatchJob:
+    def __init__(self, cmd, source_path, output_path, on_done=(), owners=()):
+        input_position = cmd.index("-i")
+        self.cmd = cmd
+        self.source_path = source_path
+        self.output_path = output_path
+        # on_done(succeeded) of everything that queued the output, in the order it was queued
+        self.on_done = list(on_done)
+        # whatever queued the output, a bulk run's note ids
+        self.owners = set(owners)
+        self.input_args = [arg for arg in cmd[1:input_position + 2] if arg != "-y"]
+        self.output_args = cmd[input_position + 2:]
+        self.input_key = self.get_input_key()
+        self.frame_time = self.get_frame_time()
+        self.clip_time = self.get_clip_time()
+
+    # input args without the seek, jobs with the same key read the same file the same way
+    def get_input_key(self):
+        args = list(self.input_args)
+        if "-ss" in args:
+            seek_position = args.index("-ss")
+            del args[seek_position:seek_position + 2]
+        return tuple(args)
+
+    # value of an output option, None if the command doesn't set it
+    def get_output_arg(self, option):
+        if option not in self.output_args:
+            return None
+        return self.output_args[self.output_args.index(option) + 1]
+
+    # seconds into the source of an exact single frame screenshot, None for clips and keyframe screenshots
+    def get_frame_time(self):
+        if "-frames:v" not in self.output_args or "-vf" not in self.output_args:
+            return None
+        if "-ss" not in self.input_args or "-noaccurate_seek" in self.input_args:
+            return None
+        return parse_time(self.input_args[self.input_args.index("-ss") + 1])
+
+    # seconds into the source of a re-encoded clip, None for screenshots and clips that copy the stream
+    def get_clip_time(self):
+        if "-ss" not in self.input_args or self.get_output_arg("-t") is None or self.get_output_arg("-map") is None:
+            return None
+        if self.get_output_arg("-c:a") in (None, "copy"):
+            return None
+        return parse_time(self.input_args[self.input_args.index("-ss") + 1])
+
+    # output args for branch n of a filter graph, without the options the graph already applies
+    def output_args_for_branch(self, n, skipped):
+        args = ["-map", f"[o{n}]"]
+        skip = False
+        for arg in self.output_args:
+            if skip:
+                skip = False
+                continue
+            if arg in skipped:
+                skip = True
+                continue
+            args.append(arg)
+        return args
+
+    # output args with stream maps pointed at input n, images get an explicit map so they don't pick another input
+    def output_args_for_input(self, n):
+        args = []
+        has_map = False
+        previous = None
+        for arg in self.output_args:
+            if previous == "-map":
+                arg = re.sub(r"^0:", f"{n}:", arg)
+                has_map = True
+            args.append(arg)
+            previous = arg
+        if not has_map:
+            args = ["-map", f"{n}:v:0"] + args
+        return args
+
+
+# clips queued by source file while a bulk run is active, run with one ffmpeg per source
+class FFmpegBatch:
+    def __init__(self):
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        # owners of the jobs that failed
+        self.failed_owners = set()
+
+    # counts the job and calls each of its on_done(succeeded)
+    def finish_job(self, job, succeeded):
+        with self.lock:
+            if succeeded:
+                self.completed += 1
+            else:
+                self.failed += 1
+                self.failed_owners.update(job.owners)
+        for on_done in job.on_done:
+            try:
+                on_done(succeeded)
+            except Exception as e:
+                log_error(f"Batch callback for {job.output_path} failed: {e}")
+
+    def add(self, cmd, source_path, output_path, on_done=None, owner=None):
+        owners = {owner} if owner is not None else set()
+        callbacks = [on_done] if on_done is not None else []
+        with self.lock:
+            # the same output queued twice only needs to be written once, for everything that queued it
+            replaced = self.jobs.pop(output_path, None)
+            if replaced is not None:
+                owners |= replaced.owners
+                callbacks = replaced.on_done + callbacks
+            self.jobs[output_path] = BatchJob(cmd, source_path, output_path, callbacks, owners)
+            pending = len(self.jobs)
+        if pending >= MAX_PENDING_JOBS:
+            self.run()
+
+    # workers > 1 runs different source files at the same time, each chunk is still one ffmpeg process
+    def run(self, workers=1):
+        with self.lock:
+            jobs = list(self.jobs.values())
+            self.jobs.clear()
+        if not jobs:
+            return
+
+        by_source = OrderedDict()
+        for job in jobs:
+            by_source.setdefault(job.source_path, []).append(job)
+
+        chunks = []
+        for source_jobs in by_source.values():
+            select_groups, other_jobs = group_nearby_jobs(
+                source_jobs, lambda job: job.frame_time, SELECT_SPAN_SECONDS, MAX_SELECT_OUTPUTS
+            )
+            trim_groups, other_jobs = group_nearby_jobs(
+                other_jobs, lambda job: job.clip_time, TRIM_SPAN_SECONDS, MAX_TRIM_OUTPUTS
+            )
+            chunks += [(self.run_select_jobs, group) for group in select_groups]
+            chunks += [(self.run_trim_jobs, group) for group in trim_groups]
+            for i in range(0, len(other_jobs), MAX_INPUTS_PER_RUN):
+                chunks.append((self.run_source_jobs, other_jobs[i:i + MAX_INPUTS_PER_RUN]))
+
+        log_command(f"running {len(jobs)} batched clips from {len(by_source)} source files")
+        if workers <= 1 or len(chunks) == 1:
+            for run_chunk, chunk in chunks:
+                run_chunk(chunk)
+            return
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            for future in [pool.submit(run_chunk, chunk) for run_chunk, chunk in chunks]:
+                future.result()
+
+    # screenshots sorted by time, seeked to the first one and split into a select branch per screenshot
+    def run_select_jobs(self, jobs):
+        start = jobs[0].frame_time
+        branches = "".join(f"[v{n}]" for n in range(len(jobs)))
+        graph = [f"[0:v]split={len(jobs)}{branches}"]
+        for n, job in enumerate(jobs):
+            scale = job.output_args[job.output_args.index("-vf") + 1]
+            graph.append(f"[v{n}]select=gte(t\\,{job.frame_time - start:.3f}),{scale}[o{n}]")
+
+        cmd = [jobs[0].cmd[0], "-y", "-loglevel", "error"] + jobs[0].input_args
+        cmd += ["-filter_complex", ";".join(graph)]
+        for n, job in enumerate(jobs):
+            cmd += job.output_args_for_branch(n, ("-vf",))
+
+        log_command(f"[FFmpeg select batch command]\n{' '.join(cmd)}")
+        try:
+            result = constants.silent_run(cmd, capture_output=True, text=True)
+            if result.returncode == 0 and all(os.path.exists(job.output_path) for job in jobs):
+                for job in jobs:
+                    self.finish_job(job, True)
+                return
+            log_error(f"FFmpeg select batch failed, seeking each screenshot instead:\n{result.stderr}")
+        except Exception as e:
+            log_error(f"FFmpeg select batch error, seeking each screenshot instead: {e}")
+        self.run_source_jobs(jobs)
+
+    # clips sorted by time, seeked to the first one, each audio stream decoded once and split into an atrim branch per clip
+    def run_trim_jobs(self, jobs):
+        start = jobs[0].clip_time
+        by_stream = OrderedDict()
+        for n, job in enumerate(jobs):
+            by_stream.setdefault(job.get_output_arg("-map"), []).append(n)
+
+        graph = []
+        for stream, numbers in by_stream.items():
+            graph.append(f"[{stream}]asplit={len(numbers)}" + "".join(f"[a{n}]" for n in numbers))
+        for n, job in enumerate(jobs):
+            filters = [f"atrim=start={job.clip_time - start:.3f}:duration={job.get_output_arg('-t')}", "asetpts=PTS-STARTPTS"]
+            if job.get_output_arg("-af"):
+                filters.append(job.get_output_arg("-af"))
+            graph.append(f"[a{n}]{','.join(filters)}[o{n}]")
+
+        cmd = [jobs[0].cmd[0], "-y", "-loglevel", "error"] + jobs[0].input_args
+        cmd += ["-filter_complex", ";".join(graph)]
+        for n, job in enumerate(jobs):
+            cmd += job.output_args_for_branch(n, ("-map", "-t", "-af"))
+
+        log_command(f"[FFmpeg trim batch command]\n{' '.join(cmd)}")
+        try:
+            result = constants.silent_run(cmd, capture_output=True, text=True)
+            if result.returncode == 0 and all(os.path.exists(job.output_path) for job in jobs):
+                for job in jobs:
+                    self.finish_job(job, True)
+                return
+            log_error(f"FFmpeg trim batch failed, seeking each clip instead:\n{result.stderr}")
+        except Exception as e:
+            log_error(f"FFmpeg trim batch error, seeking each clip instead: {e}")
+        self.run_source_jobs(jobs)
+
+    def run_source_jobs(self, jobs):
+        ffmpeg_path = jobs[0].cmd[0]
+        cmd = [ffmpeg_path, "-y", "-loglevel", "error"]
+        for job in jobs:
+            cmd += job.input_args
+        for n, job in enumerate(jobs):
+            cmd += job.output_args_for_input(n)
+
+        log_command(f"[FFmpeg batch command]\n{' '.join(cmd)}")
+        try:
+            result = constants.silent_run(cmd, capture_output=True, text=True)
+            succeeded = result.returncode == 0
+            if not succeeded:
+                log_error(f"FFmpeg batch failed, running clips one by one:\n{result.stderr}")
+        except Exception as e:
+            log_error(f"FFmpeg batch error, running clips one by one: {e}")
+            succeeded = False
+
+        if succeeded and all(os.path.exists(job.output_path) for job in jobs):
+            for job in jobs:
+                self.finish_job(job, True)
+            return
+
+        # one bad clip fails the whole run, find it by running each clip on its own
+        for job in jobs:
+            if os.path.exists(job.output_path) and succeeded:
+                self.finish_job(job, True)
+                continue
+            result = constants.silent_run(job.cmd, capture_output=True, text=True)
+            if result.returncode == 0 and os.path.exists(job.output_path):
+                self.finish_job(job, True)
+            else:
+                self.finish_job(job, False)
+                log_error(f"FFmpeg failed for {job.output_path}:\n{result.stderr}")
+
+
+# seconds from an ffmpeg time, either HH:MM:SS.mmm or plain seconds
+def parse_time(value):
+    try:
+        seconds = 0.0
+        for part in str(value).split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+# splits jobs into runs that read the same input within span seconds of each other, and everything else
+# get_time is the job's seconds into the source, None for jobs that can't share a decode
+def group_nearby_jobs(jobs, get_time, span, max_outputs):
+    by_input = OrderedDict()
+    for job in sorted((job for job in jobs if get_time(job) is not None), key=get_time):
+        by_input.setdefault(job.input_key, []).append(job)
+
+    groups = []
+    for input_jobs in by_input.values():
+        current = []
+        for job in input_jobs:
+            if current and (get_time(job) - get_time(current[0]) > span or len(current) >= max_outputs):
+                groups.append(current)
+                current = []
+            current.append(job)
+        if current:
+            groups.append(current)
+
+    # a lone job is cheaper as a seeked input of a multi-input run
+    groups = [group for group in groups if len(group) > 1]
+    grouped = {id(job) for group in groups for job in group}
+    return groups, [job for job in jobs if id(job) not in grouped]
+
+
+# returns True if the command was queued in this thread's batch, False if the caller should run it now
+# on_done(succeeded) is called from the thread running the batch once the output is written
+def queue_command(cmd, source_path, output_path, on_done=None):
+    batch = getattr(_thread_batch, "batch", None)
+    if batch is None:
+        return False
+    batch.add(cmd, source_path, output_path, on_done, getattr(_thread_batch, "owner", None))
+    return True
+
+
+# queues commands made on this thread in batch, None goes back to running them immediately
+# owner is recorded in batch.failed_owners when one of those commands fails
+def set_thread_batch(batch, owner=None):
+    _thread_batch.batch = batch
+    _thread_batch.owner = owner
@@ -11,45 +11,621 @@ from aqt.utils import tooltip
 
 import sqlite3
 import json
-import tempfile
-import shutil
 import re
-from collections import Counter
+import hashlib
+from array import array
+from bisect import bisect_right
+from collections import Counter, OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
 
 from . import constants
+from . import subtitle_parser
 from .constants import log_error, ffmpeg_exe_name
 from .constants import log_database
 from .constants import folder
+from .subtitle_parser import SubtitleBlock, milliseconds_to_srt_time, remove_subtitle_formatting
 
 # global variables
 conn = None
+SourceFile = namedtuple("SourceFile", ["path", "size", "mtime_ns"])
+_source_snapshot = None
+_source_snapshot_lock = threading.Lock()
 audio_exts = constants.audio_extensions
 video_exts = constants.video_extensions
 media_exts = audio_exts + video_exts
 ffmpeg_path, ffprobe_path = constants.get_ffmpeg_exe_path(True)
 _thread_local = threading.local()
+search_index_available = True
+# characters of the sentence looked up in the search index, each block's search text reaches this far minus one into the next blocks
+SEARCH_PROBE_LENGTH = 4
+db_path = os.path.join(constants.addon_dir, 'subtitles_index.db')
+# bumped when the index file is deleted, connections from an older generation are reopened
+_database_generation = 0
+# generation whose file the writer has created the tables in
+_schema_generation = None
+# every open connection and the thread it belongs to, deleting the index closes the ones other threads hold
+# so the file can be removed, and the connections of threads that have ended are closed when the next one opens
+_connections = {}
+_connections_lock = threading.Lock()
+
+# sources used since the last flush to subtitle_access, filename -> utc timestamp
+ACCESS_FLUSH_SECONDS = 30
+_pending_access = {}
+_pending_access_lock = threading.Lock()
+_access_flush_timer = None
+
+# page cache per connection and how much of the file readers map into memory
+DATABASE_CACHE_KB = 32 * 1024
+DATABASE_MMAP_BYTES = 256 * 1024 * 1024
+# pages freed by deletions are handed back a bounded number at a time after an update
+# a full vacuum only runs once this much of the file is free pages
+INCREMENTAL_VACUUM_PAGES = 2048
+FULL_VACUUM_FREE_RATIO = 0.25
+
+LOUDNORM_JSON_PATTERN = re.compile(r"\{[^{}]*\"input_i\"[^{}]*\}")
+
+# whole-track loudness analysis runs one file at a time in the background
+_loudness_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="loudness")
+_loudness_pending = set()
+_loudness_pending_lock = threading.Lock()
+
+# loaded tracks keyed by (filename, track, language), least recently used first
+TRACK_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_track_cache = OrderedDict()
+_track_cache_lock = threading.Lock()
+_track_cache_bytes = 0
+# bumped on every invalidation, a read that saw it change may hold rows from before a write and isn't cached
+_track_cache_generation = 0
+track_cache_hits = 0
+track_cache_misses = 0
 
 def get_database():
-    if not hasattr(_thread_local, "conn") or _thread_local.conn is None:
-        db_path = os.path.join(constants.addon_dir, 'subtitles_index.db')
-        _thread_local.conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
-        _thread_local.conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS subtitles USING fts5(filename, language, auto_language_code, track, content)')
-        _thread_local.conn.execute('CREATE TABLE IF NOT EXISTS media_tracks (filename TEXT, track INTEGER, language TEXT, type TEXT, PRIMARY KEY(filename, track, type))')
-        _thread_local.conn.execute('''
-        CREATE TABLE IF NOT EXISTS media_audio_start_times (
-            filename TEXT,
-            audio_track INTEGER,
-            delay_ms INTEGER,
-            PRIMARY KEY (filename, audio_track)
-        )
-        ''')
-        _thread_local.conn.execute('''
-        CREATE TABLE IF NOT EXISTS subtitle_access (
-            filename TEXT PRIMARY KEY,
-            last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP
+    conn = getattr(_thread_local, "conn", None)
+    if conn is not None and getattr(_thread_local, "generation", None) == _database_generation:
+        return conn
+    close_thread_connection()
+    # the tables are only created and migrated on the writer's connection, readers wait until it has
+    if not on_writer_thread() and _schema_generation != _database_generation:
+        run_write(lambda _: None, transaction=False)
+    with _connections_lock:
+        finished = [conn for conn, thread in _connections.items() if not thread.is_alive()]
+        for conn in finished:
+            del _connections[conn]
+            conn.close()
+        conn = sqlite3.connect(db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        _connections[conn] = threading.current_thread()
+        _thread_local.conn = conn
+        _thread_local.generation = _database_generation
+    if on_writer_thread():
+        create_database_file(conn)
+    configure_connection(conn)
+    return conn
+
+# settings stored in the file itself and the tables, set once per file by the writer
+def create_database_file(conn):
+    global _schema_generation
+    # only takes effect on a new file, an existing index is switched over by compact_database
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    try:
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode.lower() != "wal":
+            log_error(f"Could not switch the subtitle index to wal, journal mode is {mode}")
+    except sqlite3.OperationalError as e:
+        log_error(f"Could not switch the subtitle index to wal: {e}")
+    create_tables(conn)
+    _schema_generation = _thread_local.generation
+
+# in wal mode readers keep working from the last commit while the writer appends, so indexing never blocks the editor
+def configure_connection(conn):
+    # with wal, NORMAL can lose the last commits on power loss but never corrupts the file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DATABASE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DATABASE_MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def mark_writer_thread():
+    _thread_local.is_writer = True
+
+# every write to the index runs in order on this one thread and its connection
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database_writer", initializer=mark_writer_thread)
+
+def on_writer_thread():
+    return getattr(_thread_local, "is_writer", False)
+
+def run_in_transaction(function, args, transaction):
+    conn = get_database()
+    if not transaction or conn.in_transaction:
+        return function(conn, *args)
+    conn.execute("BEGIN IMMEDIATE")
+    _thread_local.changed_tracks = set()
+    try:
+        result = function(conn, *args)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        # readers could cache a changed track's old rows until the commit, drop them again now
+        changed_tracks, _thread_local.changed_tracks = _thread_local.changed_tracks, None
+        for key in changed_tracks:
+            invalidate_track_cache(*key)
+    return result
+
+# runs function(conn, *args) on the writer thread and returns its result, in one transaction unless transaction is False
+def run_write(function, *args, transaction=True):
+    if on_writer_thread():
+        return run_in_transaction(function, args, transaction)
+    return _writer.submit(run_in_transaction, function, args, transaction).result()
+
+# queues function(conn, *args) on the writer thread without waiting for it
+def queue_write(function, *args):
+    future = _writer.submit(run_in_transaction, function, args, True)
+    future.add_done_callback(log_write_error)
+
+def log_write_error(future):
+    error = future.exception()
+    if error is not None:
+        log_error(f"Database write failed: {error}")
+
+def upsert_subtitle_access(conn, filename):
+    conn.execute('''
+    INSERT INTO subtitle_access(filename, last_accessed)
+    VALUES (?, CURRENT_TIMESTAMP)
+    ON CONFLICT(filename) DO UPDATE SET last_accessed = CURRENT_TIMESTAMP
+    ''', (filename,))
+
+# marks a source as just used, searches try the most recently used sources first
+# the time is kept in memory and written with the others on a timer, lookups don't write to the index
+def touch_subtitle_access(filename):
+    global _access_flush_timer
+    # same format as CURRENT_TIMESTAMP with milliseconds, so it compares as text against stored values
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+    with _pending_access_lock:
+        _pending_access[filename] = now
+        if _access_flush_timer is None:
+            _access_flush_timer = threading.Timer(ACCESS_FLUSH_SECONDS, flush_subtitle_access)
+            _access_flush_timer.daemon = True
+            _access_flush_timer.start()
+
+# writes every pending access time in one transaction, wait is for shutdown when the writer has to finish first
+def flush_subtitle_access(wait=False):
+    global _access_flush_timer
+    with _pending_access_lock:
+        if _access_flush_timer is not None:
+            _access_flush_timer.cancel()
+            _access_flush_timer = None
+        rows = list(_pending_access.items())
+    if not rows:
+        return
+    try:
+        if wait:
+            run_write(store_subtitle_access, rows)
+        else:
+            queue_write(store_subtitle_access, rows)
+    except Exception as e:
+        log_error(f"Could not write subtitle access times: {e}")
+
+def store_subtitle_access(conn, rows):
+    conn.executemany('''
+    INSERT INTO subtitle_access(filename, last_accessed)
+    VALUES (?, ?)
+    ON CONFLICT(filename) DO UPDATE SET last_accessed = MAX(last_accessed, excluded.last_accessed)
+    ''', rows)
+    # a source used again while this was queued keeps its newer time
+    with _pending_access_lock:
+        for filename, accessed in rows:
+            if _pending_access.get(filename) == accessed:
+                del _pending_access[filename]
+    log_database(f"wrote {len(rows)} subtitle access times")
+
+# last use of a source, the pending time if it was used since the last flush
+def get_last_accessed(filename, stored=None):
+    with _pending_access_lock:
+        pending = _pending_access.get(filename)
+    return max(pending or "", stored or "")
+
+# rows with the filename first and subtitle_access.last_accessed at accessed_column, most recently used first
+# sorting is stable, so rows used at the same time keep the query's order
+def sort_by_last_accessed(rows, accessed_column=-1):
+    return sorted(rows, key=lambda row: get_last_accessed(row[0], row[accessed_column]), reverse=True)
+
+def close_thread_connection():
+    conn = getattr(_thread_local, "conn", None)
+    if conn is not None:
+        with _connections_lock:
+            _connections.pop(conn, None)
+        conn.close()
+        _thread_local.conn = None
+
+# deletes the index so the next update rebuilds it, raises PermissionError if another program holds the file
+def delete_database():
+    run_write(remove_database_files, transaction=False)
+
+# runs on the writer after the writes queued before it, so nothing writes to the file while it's removed
+def remove_database_files(_):
+    global _database_generation
+    with _connections_lock:
+        _database_generation += 1
+        connections = list(_connections)
+        _connections.clear()
+    # every thread reopens on its next get_database, a read running on another thread right now fails
+    for conn in connections:
+        conn.close()
+    invalidate_track_cache()
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(db_path + suffix)
+        except FileNotFoundError:
+            pass
+
+# runs for every new writer connection, "Reload Database" can delete the file while the add-on is running
+def create_tables(conn):
+    # the subtitles table was an fts5 table holding each track as a json blob, move it to one row per block
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='subtitles'").fetchone()
+    legacy_subtitles = bool(row and "fts5" in row[0].lower())
+    if legacy_subtitles:
+        conn.execute("ALTER TABLE subtitles RENAME TO subtitles_legacy")
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS subtitles (
+        filename TEXT,
+        language TEXT,
+        auto_language_code TEXT,
+        track TEXT,
+        PRIMARY KEY (filename, track, language)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS subtitle_blocks (
+        id INTEGER PRIMARY KEY,
+        filename TEXT,
+        track TEXT,
+        language TEXT,
+        idx INTEGER,
+        start_ms INTEGER,
+        end_ms INTEGER,
+        text TEXT,
+        normalized_text TEXT,
+        search_text TEXT
+    )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS subtitle_blocks_position ON subtitle_blocks (filename, track, language, idx)')
+    block_columns = {row[1] for row in conn.execute("PRAGMA table_info(subtitle_blocks)")}
+    if "search_text" not in block_columns:
+        add_block_search_text(conn)
+
+    # ffprobe results, media_tracks holds one row per stream, media_probes what file they came from
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='media_tracks'").fetchone()
+    if row and "stream_index" not in row[0]:
+        conn.execute("DROP TABLE media_tracks")
+    conn.execute("DROP TABLE IF EXISTS media_audio_start_times")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS media_tracks (
+        filename TEXT,
+        track INTEGER,
+        language TEXT,
+        type TEXT,
+        stream_index INTEGER,
+        codec TEXT,
+        start_ms INTEGER,
+        PRIMARY KEY(filename, track, type)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS media_probes (
+        filename TEXT PRIMARY KEY,
+        path TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        duration_ms INTEGER
+    )
+    ''')
+    # loudnorm analysis of whole audio streams, measured once per file version
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS media_loudness (
+        filename TEXT,
+        stream_index INTEGER,
+        size INTEGER,
+        mtime_ns INTEGER,
+        integrated REAL,
+        true_peak REAL,
+        lra REAL,
+        threshold REAL,
+        PRIMARY KEY(filename, stream_index)
+    )
+    ''')
+    # clips and images written to the collection, with a hash of everything that decided their contents
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS generated_media (
+        filename TEXT PRIMARY KEY,
+        params_hash TEXT,
+        size INTEGER,
+        mtime_ns INTEGER
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS subtitle_access (
+        filename TEXT PRIMARY KEY,
+        last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS media_files (
+        path TEXT PRIMARY KEY,
+        filename TEXT,
+        size INTEGER,
+        mtime_ns INTEGER,
+        partial_hash TEXT
+    )
+    ''')
+    create_subtitle_search_table(conn)
+
+    if legacy_subtitles:
+        migrate_legacy_subtitles(conn)
+
+# trigram index over the search text of every subtitle block, used to narrow sentence lookups
+# it's an external content table, triggers keep it in sync with subtitle_blocks
+def create_subtitle_search_table(conn):
+    global search_index_available
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='subtitle_search'").fetchone()
+    if row and ("content=" not in row[0] or "search_text" not in row[0]):
+        log_database("dropping old subtitle search table, rebuilding from subtitle_blocks")
+        conn.execute("DROP TRIGGER IF EXISTS subtitle_blocks_search_insert")
+        conn.execute("DROP TRIGGER IF EXISTS subtitle_blocks_search_delete")
+        conn.execute("DROP TABLE subtitle_search")
+        row = None
+
+    try:
+        conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS subtitle_search USING fts5(
+            search_text,
+            content='subtitle_blocks',
+            content_rowid='id',
+            tokenize='trigram'
         )
         ''')
-    return _thread_local.conn
+    except sqlite3.OperationalError as e:
+        log_database(f"trigram search index unavailable, sentence lookups will scan every subtitle: {e}")
+        search_index_available = False
+        return
+
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS subtitle_blocks_search_insert AFTER INSERT ON subtitle_blocks BEGIN
+        INSERT INTO subtitle_search(rowid, search_text) VALUES (new.id, new.search_text);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS subtitle_blocks_search_delete AFTER DELETE ON subtitle_blocks BEGIN
+        INSERT INTO subtitle_search(subtitle_search, rowid, search_text) VALUES ('delete', old.id, old.search_text);
+    END
+    ''')
+
+    if row is None:
+        conn.execute("INSERT INTO subtitle_search(subtitle_search) VALUES ('rebuild')")
+
+# a block's normalized text followed by the next SEARCH_PROBE_LENGTH - 1 characters of the track
+# so the start of any match, even one that crosses into the next blocks, is found in the block it starts in
+def get_block_search_texts(normalized_lines):
+    search_texts = [""] * len(normalized_lines)
+    following = ""
+    for i in range(len(normalized_lines) - 1, -1, -1):
+        search_texts[i] = normalized_lines[i] + following
+        following = search_texts[i][:SEARCH_PROBE_LENGTH - 1]
+    return search_texts
+
+# search_text was added to an index that already had blocks, fills it in for every track
+def add_block_search_text(conn):
+    log_database("adding search text to the subtitle blocks")
+    conn.execute("BEGIN")
+    try:
+        conn.execute("ALTER TABLE subtitle_blocks ADD COLUMN search_text TEXT")
+        tracks = conn.execute("SELECT DISTINCT filename, track, language FROM subtitle_blocks").fetchall()
+        for filename, track, language in tracks:
+            rows = conn.execute(
+                "SELECT id, normalized_text FROM subtitle_blocks WHERE filename=? AND track=? AND language=? ORDER BY idx",
+                (filename, track, language)
+            ).fetchall()
+            search_texts = get_block_search_texts([row[1] for row in rows])
+            conn.executemany(
+                "UPDATE subtitle_blocks SET search_text=? WHERE id=?",
+                [(search_text, row[0]) for search_text, row in zip(search_texts, rows)]
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+# moves every json blob from the old fts5 subtitles table into subtitle_blocks
+def migrate_legacy_subtitles(conn):
+    log_database("migrating subtitles to one row per block")
+    rows = conn.execute("SELECT filename, language, auto_language_code, track, content FROM subtitles_legacy").fetchall()
+
+    conn.execute("BEGIN")
+    try:
+        for filename, language, auto_language_code, track, content in rows:
+            blocks = parse_subtitle_content(content)
+            store_subtitle_track(conn, filename, language, auto_language_code, track, blocks)
+            log_database(f"Migrated {len(blocks)} blocks: file={filename}, track={track}, lang={language}")
+        conn.execute("DROP TABLE subtitles_legacy")
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        log_error(f"Subtitle migration failed, reload the database to rebuild it: {e}")
+        raise
+
+# one scan of the source folder shared by everything that needs its file list
+# a refresh builds new dicts and swaps them in, so other threads can read them without the lock
+class SourceFolderSnapshot:
+    def __init__(self, root):
+        self.root = root
+        # directory path -> {filename: SourceFile}, directories in top down scan order
+        self.directories = {}
+        self.directory_mtimes = {}
+        # filename -> path, the first directory in scan order wins
+        self.names = {}
+        self.scan(root, self.directories, self.directory_mtimes)
+        self.index_names()
+
+    # skips folders named "ignore" at any depth, subfolders are scanned in name order
+    def scan(self, directory, directories, directory_mtimes):
+        files = {}
+        subdirectories = []
+        try:
+            directory_mtimes[directory] = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if entry.name.lower() != "ignore":
+                                subdirectories.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            files[entry.name] = SourceFile(entry.path, stat.st_size, stat.st_mtime_ns)
+                    except OSError as e:
+                        log_error(f"Failed to read {entry.path}: {e}")
+        except OSError as e:
+            log_error(f"Failed to scan {directory}: {e}")
+        directories[directory] = files
+        for subdirectory in sorted(subdirectories):
+            self.scan(subdirectory, directories, directory_mtimes)
+
+    # sorts a directory where scan reaches it, after its parent and the earlier named folders beside it
+    def scan_order(self, directory):
+        relative_path = os.path.relpath(directory, self.root)
+        return [] if relative_path == os.curdir else relative_path.split(os.sep)
+
+    def index_names(self):
+        names = {}
+        for files in self.directories.values():
+            for name, source_file in files.items():
+                names.setdefault(name, source_file.path)
+        self.names = names
+
+    # rescans only the directories whose mtime changed, returns True if any did
+    def refresh(self):
+        changed = []
+        for directory, mtime in self.directory_mtimes.items():
+            try:
+                current_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                current_mtime = None
+            if current_mtime != mtime:
+                changed.append(directory)
+        if not changed:
+            return False
+
+        directories = dict(self.directories)
+        directory_mtimes = dict(self.directory_mtimes)
+        rescanned = []
+        for directory in sorted(changed):
+            if any(directory.startswith(parent + os.sep) for parent in rescanned):
+                continue
+            # drop the directory and everything under it, then scan it again if it's still there
+            for known in list(directories):
+                if known == directory or known.startswith(directory + os.sep):
+                    del directories[known]
+                    directory_mtimes.pop(known, None)
+            if os.path.isdir(directory):
+                self.scan(directory, directories, directory_mtimes)
+            rescanned.append(directory)
+
+        # rescanned directories go back to their place in scan order, so the same file still wins a name
+        self.directories = dict(sorted(directories.items(), key=lambda item: self.scan_order(item[0])))
+        self.directory_mtimes = directory_mtimes
+        self.index_names()
+        log_database(f"rescanned changed source folders: {rescanned}")
+        return True
+
+    def files(self, extensions=None):
+        return [
+            source_file
+            for files in self.directories.values()
+            for name, source_file in files.items()
+            if extensions is None or os.path.splitext(name)[1].lower() in extensions
+        ]
+
+    def media_files(self):
+        return self.files(media_exts)
+
+    def subtitle_files(self):
+        return self.files(constants.subtitle_extensions)
+
+# returns the last scan of the source folder, scanning it again if asked or if there isn't one yet
+def get_source_snapshot(refresh=False):
+    global _source_snapshot
+    with _source_snapshot_lock:
+        if refresh or _source_snapshot is None or _source_snapshot.root != folder:
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            _source_snapshot = SourceFolderSnapshot(folder)
+            log_database(f"scanned source folder: {len(_source_snapshot.names)} files")
+        return _source_snapshot
+
+# returns the path of the first candidate filename found in the source folder, or None
+# hits are plain dict lookups, directory mtimes are only checked when a lookup misses
+def find_source_file(candidate_names):
+    snapshot = get_source_snapshot()
+    for attempt in range(2):
+        for name in candidate_names:
+            path = snapshot.names.get(name)
+            if path and os.path.exists(path):
+                return path
+        with _source_snapshot_lock:
+            if attempt or not snapshot.refresh():
+                return None
+    return None
+
+# hash of the size plus the first and last MB, enough to tell a replaced release from the old one
+def get_partial_file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.blake2b(digest_size=16)
+    size = os.path.getsize(path)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f:
+        digest.update(f.read(chunk_size))
+        if size > chunk_size:
+            f.seek(max(chunk_size, size - chunk_size))
+            digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+# compares source files from the snapshot to the media_files table
+# returns (changed, unchanged, vanished) relative paths and the rows to record once they're indexed
+def get_media_file_changes(conn, source_files):
+    known = {
+        row[0]: row[1:]
+        for row in conn.execute("SELECT path, size, mtime_ns, partial_hash FROM media_files")
+    }
+    changed, unchanged, rows = set(), set(), []
+    for source_file in source_files:
+        relative_path = os.path.relpath(source_file.path, folder)
+        previous = known.get(relative_path)
+        if previous and previous[0] == source_file.size and previous[1] == source_file.mtime_ns:
+            unchanged.add(relative_path)
+            continue
+
+        try:
+            partial_hash = get_partial_file_hash(source_file.path)
+        except OSError as e:
+            log_error(f"Failed to hash {source_file.path}: {e}")
+            continue
+
+        # only the mtime moved, nothing to redo
+        if previous and previous[0] == source_file.size and previous[2] == partial_hash:
+            unchanged.add(relative_path)
+        elif previous:
+            log_database(f"file changed since last index: {relative_path}")
+            changed.add(relative_path)
+        rows.append((relative_path, os.path.basename(source_file.path), source_file.size, source_file.mtime_ns, partial_hash))
+
+    vanished = set(known) - {os.path.relpath(source_file.path, folder) for source_file in source_files}
+    return changed, unchanged, vanished, rows
+
+def record_media_files(conn, rows, vanished):
+    conn.executemany(
+        "INSERT OR REPLACE INTO media_files (path, filename, size, mtime_ns, partial_hash) VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.executemany("DELETE FROM media_files WHERE path=?", [(path,) for path in vanished])
 
 def close_database():
     global conn
@@ -68,6 +644,7 @@ def run_ffprobe(file_path):
         "-v", "error",
         "-print_format", "json",
         "-show_streams",
+        "-show_format",
         file_path
     ]
     result = constants.silent_run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
@@ -79,16 +656,241 @@ def run_ffprobe(file_path):
 
     return json.loads(result.stdout)
 
-def remove_subtitle_formatting(text: str) -> str:
-    if '\\p' in text or '{\\p' in text:
-        return ''
+def seconds_to_milliseconds(value):
+    try:
+        return max(int(float(value) * 1000), 0)
+    except (TypeError, ValueError):
+        return 0
+
+# replaces the cached streams of a file with the result of a full ffprobe
+# media_tracks rows for an ffprobe result, (filename, track, language, type, stream_index, codec, start_ms)
+def media_stream_rows(filename, info):
+    rows = []
+    type_counts = Counter()
+    for stream in info.get("streams", []):
+        stream_type = stream.get("codec_type")
+        type_counts[stream_type] += 1
+        rows.append((
+            filename,
+            type_counts[stream_type],
+            stream.get("tags", {}).get("language", ""),
+            stream_type,
+            stream.get("index"),
+            stream.get("codec_name"),
+            seconds_to_milliseconds(stream.get("start_time", 0)),
+        ))
+    return rows
+
+def store_media_streams(conn, filename, path, stat, info):
+    rows = media_stream_rows(filename, info)
+    duration_ms = seconds_to_milliseconds(info.get("format", {}).get("duration", 0))
+
+    started = not conn.in_transaction
+    if started:
+        conn.execute("BEGIN")
+    try:
+        conn.execute("DELETE FROM media_tracks WHERE filename=?", (filename,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO media_tracks (filename, track, language, type, stream_index, codec, start_ms) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO media_probes (filename, path, size, mtime_ns, duration_ms) VALUES (?, ?, ?, ?, ?)",
+            (filename, path, stat.st_size, stat.st_mtime_ns, duration_ms)
+        )
+        if started:
+            conn.execute("COMMIT")
+    except Exception:
+        if started:
+            conn.execute("ROLLBACK")
+        raise
+
+# returns the streams of a media file as dicts, optionally only one codec_type ("audio", "subtitle", ...)
+# the file is probed once and answered from media_tracks until its path, size or mtime changes
+# a fresh probe is answered from ffprobe's output and stored in the background
+def get_media_streams(source_path, stream_type=None):
+    path = os.path.abspath(source_path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        log_error(f"Cannot probe missing file {source_path}: {e}")
+        return None
+
+    filename = os.path.basename(path)
+    conn = get_database()
+    row = conn.execute("SELECT path, size, mtime_ns FROM media_probes WHERE filename=?", (filename,)).fetchone()
+    if row != (path, stat.st_size, stat.st_mtime_ns):
+        info = run_ffprobe(path)
+        if info is None:
+            return None
+        queue_write(store_media_streams, filename, path, stat, info)
+        log_database(f"probed {filename}: {len(info.get('streams', []))} streams")
+        return [
+            {"index": index, "type": type_, "track": track, "language": language, "codec": codec, "start_ms": start_ms}
+            for _, track, language, type_, index, codec, start_ms in sorted(
+                media_stream_rows(filename, info), key=lambda row: row[4]
+            )
+            if stream_type is None or type_ == stream_type
+        ]
+
+    query = "SELECT stream_index, type, track, language, codec, start_ms FROM media_tracks WHERE filename=?"
+    params = [filename]
+    if stream_type is not None:
+        query += " AND type=?"
+        params.append(stream_type)
+    query += " ORDER BY stream_index"
+    return [
+        {"index": index, "type": type_, "track": track, "language": language, "codec": codec, "start_ms": start_ms}
+        for index, type_, track, language, codec, start_ms in conn.execute(query, params)
+    ]
+
+# runs loudnorm's analysis pass over an audio stream, returns integrated loudness, true peak, lra and threshold
+def measure_loudness(source_path, stream_index=None):
+    if not ffmpeg_path:
+        log_error(f"ffmpeg not found, can't measure {source_path}")
+        return None
+
+    stream = f"0:{stream_index}" if stream_index is not None else "0:a:0"
+    cmd = [
+        ffmpeg_path, "-hide_banner", "-nostats",
+        "-i", source_path,
+        "-map", stream,
+        "-af", "loudnorm=I=-16:TP=-1.5:LRA=11:print_format=json",
+        "-f", "null", "-"
+    ]
+    result = constants.silent_run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if result is None or result.returncode != 0:
+        err = result.stderr.strip() if result and result.stderr else "(no error output)"
+        log_error(f"loudness measurement failed on {source_path}: {err}")
+        return None
+
+    matches = LOUDNORM_JSON_PATTERN.findall(result.stderr)
+    if not matches:
+        log_error(f"no loudnorm measurement in ffmpeg output for {source_path}")
+        return None
+    try:
+        values = json.loads(matches[-1])
+        measured = {
+            "integrated": float(values["input_i"]),
+            "true_peak": float(values["input_tp"]),
+            "lra": float(values["input_lra"]),
+            "threshold": float(values["input_thresh"]),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        log_error(f"could not read loudnorm measurement for {source_path}: {e}")
+        return None
+
+    # silent streams measure as -inf, there's nothing to normalize against
+    if not all(-200 < value < 200 for value in measured.values()):
+        log_database(f"{os.path.basename(source_path)} stream {stream_index} has no measurable loudness")
+        return None
+    return measured
 
-    text = re.sub(r'<[^>]+>', '', text)
-    text = re.sub(r'{[^{}]*}', '', text)
-    text = re.sub(r'[\[\(].*?[\]\)]', '', text)
-    text = text.strip()
+# returns the stored measurement of a stream, None if it was never measured or the file has changed since
+def get_stored_loudness(source_path, stream_index):
+    path = os.path.abspath(source_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
 
-    return text
+    row = get_database().execute(
+        "SELECT size, mtime_ns, integrated, true_peak, lra, threshold FROM media_loudness WHERE filename=? AND stream_index=?",
+        (os.path.basename(path), stream_index)
+    ).fetchone()
+    if row is None or row[:2] != (stat.st_size, stat.st_mtime_ns):
+        return None
+    integrated, true_peak, lra, threshold = row[2:]
+    return {"integrated": integrated, "true_peak": true_peak, "lra": lra, "threshold": threshold}
+
+# stream indexes of the file with a stored measurement for its current version
+def get_measured_streams(source_path):
+    path = os.path.abspath(source_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return []
+    rows = get_database().execute(
+        "SELECT stream_index FROM media_loudness WHERE filename=? AND size=? AND mtime_ns=? ORDER BY stream_index",
+        (os.path.basename(path), stat.st_size, stat.st_mtime_ns)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def measure_and_store_loudness(source_path, stream_index):
+    path = os.path.abspath(source_path)
+    try:
+        if get_stored_loudness(path, stream_index) is not None:
+            return
+        stat = os.stat(path)
+        measured = measure_loudness(path, stream_index)
+        if measured is None:
+            return
+        run_write(store_loudness, os.path.basename(path), stream_index, stat, measured)
+        log_database(f"measured {os.path.basename(path)} stream {stream_index}: {measured}")
+    except Exception as e:
+        log_error(f"Error measuring loudness of {source_path}: {e}")
+    finally:
+        with _loudness_pending_lock:
+            _loudness_pending.discard((path, stream_index))
+
+def store_loudness(conn, filename, stream_index, stat, measured):
+    conn.execute(
+        "INSERT OR REPLACE INTO media_loudness (filename, stream_index, size, mtime_ns, integrated, true_peak, lra, threshold) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (filename, stream_index, stat.st_size, stat.st_mtime_ns,
+         measured["integrated"], measured["true_peak"], measured["lra"], measured["threshold"])
+    )
+
+# stored measurement of a stream, or None after queueing the measurement so later clips can use it
+def get_or_request_loudness(source_path, stream_index):
+    measured = get_stored_loudness(source_path, stream_index)
+    if measured is not None:
+        return measured
+
+    key = (os.path.abspath(source_path), stream_index)
+    with _loudness_pending_lock:
+        if key in _loudness_pending:
+            return None
+        _loudness_pending.add(key)
+    log_database(f"queued loudness measurement for {os.path.basename(source_path)} stream {stream_index}")
+    _loudness_executor.submit(measure_and_store_loudness, *key)
+    return None
+
+# hash of a generated file's parameters, the source's size and mtime are included so a changed source regenerates
+def hash_media_params(source_path, params):
+    path = os.path.abspath(source_path)
+    try:
+        stat = os.stat(path)
+        source = [path, stat.st_size, stat.st_mtime_ns]
+    except OSError:
+        source = [path, None, None]
+    key = json.dumps(source + list(params), default=str)
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+# True if output_path was generated with params_hash and hasn't been replaced or removed since
+def is_generated_media_current(output_path, params_hash):
+    try:
+        stat = os.stat(output_path)
+    except OSError:
+        return False
+    row = get_database().execute(
+        "SELECT params_hash, size, mtime_ns FROM generated_media WHERE filename=?",
+        (os.path.basename(output_path),)
+    ).fetchone()
+    return row == (params_hash, stat.st_size, stat.st_mtime_ns)
+
+def record_generated_media(output_path, params_hash):
+    try:
+        stat = os.stat(output_path)
+    except OSError as e:
+        log_error(f"Generated file is missing, not recording it: {e}")
+        return
+    queue_write(store_generated_media, os.path.basename(output_path), params_hash, stat)
+
+def store_generated_media(conn, filename, params_hash, stat):
+    conn.execute(
+        "INSERT OR REPLACE INTO generated_media (filename, params_hash, size, mtime_ns) VALUES (?, ?, ?, ?)",
+        (filename, params_hash, stat.st_size, stat.st_mtime_ns)
+    )
 
 def filter_subtitles(subtitles):
     timing_counts = Counter((sub[0], sub[1]) for sub in subtitles)
@@ -120,75 +922,216 @@ def check_already_indexed(conn, media_file, track, lang=None):
     cursor = conn.execute(query, params)
     return cursor.fetchone() is not None
 
-def get_srt_converted_subtitle_from_path(subtitle_path):
+# decodes the json content of a legacy subtitles row into blocks
+def parse_subtitle_content(content_json):
     try:
-        if not ffmpeg_path:
-            log_database(f"FFmpeg not found, cannot convert {subtitle_path}")
-            return None
+        raw_blocks = json.loads(content_json)
+    except Exception as e:
+        log_error(f"Failed to parse subtitle content: {e}")
+        return []
 
-        # use ffmpeg to convert subtitle to SRT and output to stdout
-        cmd = [
-            ffmpeg_path,
-            '-i', subtitle_path,
-            '-c:s', 'srt',
-            '-f', 'srt',  # force SRT format
-            'pipe:1'  # output to stdout
-        ]
+    usable_blocks = []
+    for raw_block in raw_blocks:
+        if isinstance(raw_block, str):
+            usable_blocks += subtitle_parser.iter_srt_blocks(raw_block.splitlines())
+        elif isinstance(raw_block, list) and len(raw_block) == 4:
+            start_ms = subtitle_parser.time_to_milliseconds(raw_block[1])
+            end_ms = subtitle_parser.time_to_milliseconds(raw_block[2])
+            if start_ms is None or end_ms is None:
+                log_error(f"Unrecognized timestamp format: {raw_block}")
+                continue
+            usable_blocks.append(SubtitleBlock(raw_block[0], start_ms, end_ms, raw_block[3]))
+    return usable_blocks
+
+# replaces a track with the given SubtitleBlocks, block idx is the 1 based position in the track
+def store_subtitle_track(conn, filename, language, auto_language_code, track, blocks):
+    track = str(track)
+    normalized_lines = [constants.normalize_text(block.text) for block in blocks]
+    rows = [
+        (filename, track, language, position, block.start_ms, block.end_ms, block.text, normalized, search_text)
+        for position, (block, normalized, search_text)
+        in enumerate(zip(blocks, normalized_lines, get_block_search_texts(normalized_lines)), 1)
+    ]
 
-        # only use create no window on windows
-        creationflags = 0
-        if os.name == "nt":
-            creationflags = subprocess.CREATE_NO_WINDOW
-
-        result = constants.silent_run(
-            cmd,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            creationflags=creationflags
+    started = not conn.in_transaction
+    if started:
+        conn.execute("BEGIN")
+    try:
+        delete_subtitle_track(conn, filename, language, track)
+        conn.execute(
+            'INSERT INTO subtitles (filename, language, auto_language_code, track) VALUES (?, ?, ?, ?)',
+            (filename, language, auto_language_code, track)
         )
+        conn.executemany(
+            'INSERT INTO subtitle_blocks (filename, track, language, idx, start_ms, end_ms, text, normalized_text, search_text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        if started:
+            conn.execute("COMMIT")
+    except Exception:
+        if started:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        # a reader may have cached the old blocks before the commit
+        invalidate_track_cache(filename, track, language)
+    return len(rows)
+
+def delete_subtitle_track(conn, filename, language, track):
+    invalidate_track_cache(filename, track, language)
+    conn.execute(
+        "DELETE FROM subtitles WHERE filename=? AND language=? AND track=?",
+        (filename, language, str(track)),
+    )
+    conn.execute(
+        "DELETE FROM subtitle_blocks WHERE filename=? AND track=? AND language=?",
+        (filename, str(track), language),
+    )
 
-        if result.returncode != 0:
-            log_database(f"ffmpeg conversion failed for {subtitle_path}: {result.stderr}")
-            return None
-
-        # Parse the SRT content directly from stdout
-        return parse_srt_from_text(result.stdout)
+# returns [index, start, end, text] blocks of a track ordered by position, optionally limited to an index range
+def get_subtitle_blocks(conn, filename, track, language, start_index=None, end_index=None):
+    return [block_from_row(row) for row in get_subtitle_block_rows(conn, filename, track, language, start_index, end_index)]
+
+# returns (idx, start_ms, end_ms, text, normalized_text) rows of a track ordered by position
+def get_subtitle_block_rows(conn, filename, track, language, start_index=None, end_index=None):
+    query = "SELECT idx, start_ms, end_ms, text, normalized_text FROM subtitle_blocks WHERE filename=? AND track=? AND language=?"
+    params = [filename, str(track), language]
+    if start_index is not None:
+        query += " AND idx >= ?"
+        params.append(start_index)
+    if end_index is not None:
+        query += " AND idx <= ?"
+        params.append(end_index)
+    query += " ORDER BY idx"
+    return conn.execute(query, params).fetchall()
+
+def block_from_row(row):
+    return [str(row[0]), milliseconds_to_srt_time(row[1]), milliseconds_to_srt_time(row[2]), row[3]]
+
+# a track loaded into memory with its timings as integer arrays, so overlap lookups are binary searches
+class LoadedSubtitleTrack:
+    def __init__(self, rows):
+        self.blocks = [block_from_row(row) for row in rows]
+        self.normalized_lines = [row[4] for row in rows]
+        # rough size used to cap the track cache
+        self.size = sum(200 + 2 * (len(row[3]) + len(row[4])) for row in rows)
+        self.starts = array('i', (row[1] for row in rows))
+        self.ends = array('i', (row[2] for row in rows))
+
+        # running maximums stay sorted even when blocks overlap or are out of order
+        self.max_starts = array('i')
+        self.max_ends = array('i')
+        max_start = max_end = -1
+        for start_ms, end_ms in zip(self.starts, self.ends):
+            max_start = max(max_start, start_ms)
+            max_end = max(max_end, end_ms)
+            self.max_starts.append(max_start)
+            self.max_ends.append(max_end)
+
+    # returns copies of the blocks overlapping start_ms to end_ms, stopping at the first block starting after end_ms
+    def get_overlapping_blocks(self, start_ms, end_ms):
+        # nothing before first can end after start_ms, nothing from last on starts before end_ms
+        first = bisect_right(self.max_ends, start_ms)
+        last = bisect_right(self.max_starts, end_ms)
+        return [
+            list(self.blocks[i])
+            for i in range(first, last)
+            if self.starts[i] < end_ms and self.ends[i] > start_ms
+        ]
 
-    except Exception as e:
-        log_database(f"Failed to convert subtitle with ffmpeg: {e}, trying manual SRT parsing")
+    # returns copies of the blocks from start_index to end_index, both 1 based and inclusive
+    def get_blocks(self, start_index, end_index):
+        return [list(block) for block in self.blocks[start_index - 1:end_index]]
+
+# returns the loaded track from the cache, reading it from the database on a miss
+def load_subtitle_track(conn, filename, track, language):
+    global _track_cache_bytes, track_cache_hits, track_cache_misses
+    key = (filename, str(track), language)
+    with _track_cache_lock:
+        loaded_track = _track_cache.get(key)
+        if loaded_track is not None:
+            _track_cache.move_to_end(key)
+            track_cache_hits += 1
+            return loaded_track
+        track_cache_misses += 1
+        generation = _track_cache_generation
+
+    rows = get_subtitle_block_rows(conn, filename, track, language)
+    if not rows:
+        return None
+    loaded_track = LoadedSubtitleTrack(rows)
+    if loaded_track.size > TRACK_CACHE_MAX_BYTES:
+        return loaded_track
+
+    with _track_cache_lock:
+        # the track was written while it was read
+        if generation != _track_cache_generation:
+            return loaded_track
+        previous = _track_cache.pop(key, None)
+        if previous is not None:
+            _track_cache_bytes -= previous.size
+        _track_cache[key] = loaded_track
+        _track_cache_bytes += loaded_track.size
+        while _track_cache_bytes > TRACK_CACHE_MAX_BYTES:
+            _, evicted = _track_cache.popitem(last=False)
+            _track_cache_bytes -= evicted.size
+    return loaded_track
+
+# drops one track from the cache, or every track if no key is given
+# inside a write transaction the track is dropped again once it commits
+def invalidate_track_cache(filename=None, track=None, language=None):
+    global _track_cache_bytes, _track_cache_generation
+    changed_tracks = getattr(_thread_local, "changed_tracks", None)
+    if changed_tracks is not None:
+        changed_tracks.add((filename, track, language))
+    with _track_cache_lock:
+        _track_cache_generation += 1
+        if filename is None:
+            _track_cache.clear()
+            _track_cache_bytes = 0
+            return
+        loaded_track = _track_cache.pop((filename, str(track), language), None)
+        if loaded_track is not None:
+            _track_cache_bytes -= loaded_track.size
+
+def get_track_cache_stats():
+    with _track_cache_lock:
+        return {
+            "hits": track_cache_hits,
+            "misses": track_cache_misses,
+            "tracks": len(_track_cache),
+            "bytes": _track_cache_bytes,
+            "max_bytes": TRACK_CACHE_MAX_BYTES,
+        }
+
+# returns the block idx of every block a match for the sentence could start in, grouped by (filename, language, track)
+# a track without any can't contain the sentence, so skipping it gives the same result as scanning it
+# returns None if the index can't narrow the search, meaning every subtitle has to be scanned
+def get_sentence_candidate_blocks(normalized_sentence):
+    if not search_index_available or len(normalized_sentence) < 3:
         return None
 
-def parse_srt_from_text(srt_text):
-    try:
-        blocks = srt_text.strip().split("\n\n")
-        parsed = []
-        for blk in blocks:
-            lines = blk.strip().split("\n")
-            if len(lines) < 3:
-                continue
-            idx = lines[0]
-            m = re.match(
-                r'(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})',
-                lines[1]
-            )
-            if not m:
-                continue
-            start, end = m.groups()
-            content = ' '.join(lines[2:]).strip()
-
-            # Apply the same formatting removal as the main extraction function
-            content = remove_subtitle_formatting(content)
-            if not content:
-                continue
+    # the search text of the block a match starts in holds the first characters of the sentence,
+    # even when the match crosses into the next blocks right away
+    probe = normalized_sentence[:SEARCH_PROBE_LENGTH]
+    match_expression = '"' + probe.replace('"', '""') + '"'
 
-            # Use the same format: [index, start, end, content]
-            parsed.append([idx, start, end, content])
+    conn = get_database()
+    try:
+        cursor = conn.execute('''
+            SELECT b.filename, b.language, b.track, b.idx
+            FROM subtitle_search
+                JOIN subtitle_blocks b ON b.id = subtitle_search.rowid
+            WHERE subtitle_search MATCH ?
+            ''', (match_expression,))
+    except sqlite3.OperationalError as e:
+        log_error(f"Search index query failed for '{match_expression}': {e}")
+        return None
 
-        return parsed
-    except Exception as e:
-        log_database(f"Failed to parse SRT text: {e}")
-        return []
+    candidates = {}
+    for filename, language, track, idx in cursor:
+        candidates.setdefault((filename, language, str(track)), set()).add(idx)
+    return candidates
 
 def extract_subtitle_file_data(subtitle_filename):
     # Remove the subtitle extension (.srt, .ass, etc.)
@@ -211,6 +1154,14 @@ def extract_subtitle_file_data(subtitle_filename):
         'base_name': base_name,
     }
 
+# splits "name.jpn.srt" into ("name", "jpn"), the language is "und" if there's no code
+def get_subtitle_file_base_name_and_language(filename):
+    name_no_ext, ext = os.path.splitext(filename)
+    parts = name_no_ext.rsplit('.', 1)
+    if len(parts) == 2 and re.fullmatch(r'[a-zA-Z]{2,3}', parts[1]):
+        return parts[0], parts[1].lower()
+    return name_no_ext, "und"
+
 def update_database():
     constants.database_updating.set()
     log_database(f"update database called")
@@ -218,49 +1169,23 @@ def update_database():
     close_database()
     conn = get_database()
 
-    # create tables
-    conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS subtitles USING fts5(filename, language, auto_language_code, track, content)')
-    conn.execute('''
-    CREATE TABLE IF NOT EXISTS media_audio_start_times (
-        filename TEXT,
-        audio_track INTEGER,
-        delay_ms INTEGER,
-        PRIMARY KEY (filename, audio_track)
-    )
-    ''')
-
-    conn.execute('''
-    CREATE TABLE IF NOT EXISTS subtitle_access (
-        filename TEXT PRIMARY KEY,
-        last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-
-
-    # recursively get all media files, except "ignore" folder
+    # one scan of the folder for media and subtitles, "ignore" folders are skipped
     log_database(f"folder: {folder}")
-    media_paths_in_folder = {
-        os.path.join(root, f)
-        for root, dirs, files in os.walk(folder)
-        if 'ignore' not in root.lower().split(os.sep)
-        for f in files
-        if os.path.splitext(f)[1].lower() in media_exts
-    }
+    snapshot = get_source_snapshot(refresh=True)
+    media_files_in_folder = snapshot.media_files()
+    subtitle_files_in_folder = snapshot.subtitle_files()
+    media_paths_in_folder = {f.path for f in media_files_in_folder}
     current_media = {os.path.basename(p) for p in media_paths_in_folder}
 
-    subtitle_extensions = constants.subtitle_extensions
-    subtitle_paths_in_folder = {
-        os.path.join(root, f)
-        for root, dirs, files in os.walk(folder)
-        if 'ignore' not in root.lower().split(os.sep)
-        for f in files
-        if os.path.splitext(f)[1].lower() in subtitle_extensions
-    }
+    subtitle_paths_in_folder = {f.path for f in subtitle_files_in_folder}
     subtitles_in_folder = {os.path.basename(p) for p in subtitle_paths_in_folder}
 
+    # only files that are new or changed since the last update get indexed again
+    changed_files, unchanged_files, vanished_files, media_file_rows = get_media_file_changes(
+        conn, media_files_in_folder + subtitle_files_in_folder
+    )
+    run_write(remove_changed_files, changed_files)
+
     # collect orphaned subtitles
     cursor = conn.execute('SELECT filename, language, track FROM subtitles')
     indexed_subs = {f"{r[0]}`track_{r[2]}`{r[1]}.srt" for r in cursor}
@@ -278,293 +1203,317 @@ def update_database():
     constants.database_items_left = len(current_media) + len(subtitles_in_folder) + len(to_delete)
 
     # log and delete them
-    for basename, lang, track in to_delete:
-        conn.execute(
-            "DELETE FROM subtitles WHERE filename=? AND language=? AND track=?",
-            (basename, lang, track),
-        )
-        conn.execute(
-            "DELETE FROM subtitle_access WHERE filename=?",
-            (basename,)
-        )
-        log_database(f"Removed subtitle: file={basename}, track={track}, lang={lang}")
-        constants.database_items_left -= 1
+    run_write(remove_subtitle_tracks, to_delete)
 
     # get current media basenames (without extension)
     media_basenames = {os.path.splitext(f)[0] for f in current_media}
 
     cursor = conn.execute(
-        "SELECT DISTINCT filename FROM subtitles WHERE track = '-1'"
+        "SELECT DISTINCT filename, language FROM subtitles WHERE track = '-1'"
     )
-    indexed_subtitle_files = {row[0] for row in cursor}
-
-    indexed_subtitle_basenames = {os.path.splitext(f)[0] for f in indexed_subtitle_files}
+    indexed_subtitle_files = {(os.path.splitext(row[0])[0], row[1]) for row in cursor}
 
     log_database(f"current subtitles in folder: {subtitles_in_folder}")
+    # subtitle files that couldn't be read aren't recorded, so the next update tries them again
+    unfinished_subtitles = set()
     for subtitle_path in subtitle_paths_in_folder:
         filename = os.path.basename(subtitle_path)
 
-        name_no_ext, ext = os.path.splitext(filename)
-
-        parts = name_no_ext.rsplit('.', 1)
-        if len(parts) == 2 and re.fullmatch(r'[a-zA-Z]{2,3}', parts[1]):
-            base_name = parts[0]
-            lang_code = parts[1].lower()
-        else:
-            base_name = name_no_ext
-            lang_code = "und"
+        base_name, lang_code = get_subtitle_file_base_name_and_language(filename)
 
-        if base_name not in indexed_subtitle_basenames:
+        if (base_name, lang_code) not in indexed_subtitle_files:
             if base_name in media_basenames:
                 for media_file in (m for m in current_media if os.path.splitext(m)[0] == base_name):
                     try:
-                        parsed = get_srt_converted_subtitle_from_path(subtitle_path)
+                        parsed = subtitle_parser.parse_subtitle_file(subtitle_path)
                         if not parsed:
                             log_database(f"No valid subtitle content found in {subtitle_path}")
+                            unfinished_subtitles.add(os.path.relpath(subtitle_path, folder))
                             continue
 
-                        conn.execute(
-                            'INSERT INTO subtitles (filename, language, auto_language_code, track, content) VALUES (?, ?, ?, ?, ?)',
-                            (media_file, lang_code, lang_code, "-1", json.dumps(parsed, ensure_ascii=False))
-                        )
-
-                        conn.execute('''
-                        INSERT INTO subtitle_access(filename, last_accessed)
-                        VALUES (?, CURRENT_TIMESTAMP)
-                        ON CONFLICT(filename) DO UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                        ''', (media_file,))
+                        run_write(store_user_subtitle_track, media_file, lang_code, parsed)
 
                         log_database(f"Added subtitle content for {subtitle_path} linked to media {media_file} ({len(parsed)} entries)")
                     except Exception as e:
                         log_database(f"Failed to add subtitle content from {subtitle_path}: {e}")
+                        unfinished_subtitles.add(os.path.relpath(subtitle_path, folder))
             else:
                 log_database(f"no media basename found for {base_name}")
 
             constants.database_items_left -= 1
 
     # Extract subtitles from all source files
-    extract_all_subtitle_tracks_and_update_db(conn)
+    unfinished_media = extract_all_subtitle_tracks_and_update_db(conn, unchanged_files, snapshot)
+    # a file is only recorded as indexed once its subtitles were extracted
+    media_file_rows = [
+        row for row in media_file_rows
+        if row[0] not in unfinished_media and row[0] not in unfinished_subtitles
+    ]
 
     # Remove missing media entries
     cursor = conn.execute("SELECT DISTINCT filename FROM media_tracks")
     indexed_media = {r[0] for r in cursor}
-    for mf in sorted(indexed_media - current_media):
-        conn.execute("DELETE FROM media_tracks WHERE filename=?", (mf,))
-        conn.execute("DELETE FROM media_audio_start_times WHERE filename=?", (mf,))
-        conn.execute("DELETE FROM subtitle_access WHERE filename=?", (mf,))
-        log_database(f"Removed media entries for: {mf}")
+    run_write(remove_media_entries, sorted(indexed_media - current_media))
 
     # Remove orphaned user-placed subtitle entries (track = -1) whose source files no longer exist
     # Recompute current subtitle base_names in folder (same logic as above)
-    present_subtitle_basenames = set()
-    for subtitle_file in subtitles_in_folder:
-        base_name = os.path.splitext(subtitle_file)[0]  # just strip extension
-        present_subtitle_basenames.add(base_name)
+    present_subtitle_files = {get_subtitle_file_base_name_and_language(f) for f in subtitles_in_folder}
 
-    cursor = conn.execute("SELECT filename, language, track FROM subtitles WHERE track = '-1'")
-    for filename, language, track in cursor:
+    rows = conn.execute("SELECT filename, language, track FROM subtitles WHERE track = '-1'").fetchall()
+    orphaned = []
+    for filename, language, track in rows:
         base_name = os.path.splitext(filename)[0]
-        if base_name not in present_subtitle_basenames:
-            conn.execute(
-                "DELETE FROM subtitles WHERE filename=? AND language=? AND track=?",
-                (filename, language, track),
-            )
-            conn.execute(
-                "DELETE FROM subtitle_access WHERE filename=?",
-                (filename,)
-            )
-            log_database(f"Removed orphaned user subtitle: file={filename}, lang={language}, track={track}\n"
-                         f"base name: {base_name} not in present sub basenames: {present_subtitle_basenames}")
+        if (base_name, language) not in present_subtitle_files:
+            log_database(f"Orphaned user subtitle: file={filename}, lang={language}, track={track}\n"
+                         f"base name: {base_name} not in present subs: {present_subtitle_files}")
+            orphaned.append((filename, language, track))
+    run_write(remove_subtitle_tracks, orphaned, False)
 
-    conn.commit()
-    conn.execute("VACUUM;")
+    run_write(record_media_files, media_file_rows, vanished_files)
+
+    invalidate_track_cache()
+    run_write(compact_database, transaction=False)
     constants.database_updating.clear()
     constants.database_items_left = 0
     return conn
 
 
-def extract_all_subtitle_tracks_and_update_db(conn):
-    folder = os.path.join(constants.addon_dir, constants.addon_source_folder)
+# returns space freed by the update to the filesystem, the rewrite of a full vacuum is only done when it's worth it
+def compact_database(conn):
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    free_ratio = free_pages / page_count if page_count else 0
+    pages = f"{free_pages}/{page_count} pages free"
+
+    # indexes created before incremental auto_vacuum need one full vacuum to switch
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        action = f"full vacuum to enable incremental auto_vacuum ({pages})"
+    elif free_ratio >= FULL_VACUUM_FREE_RATIO:
+        action = f"full vacuum, {free_ratio:.0%} of the file is free ({pages})"
+    elif free_pages:
+        conn.execute(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})").fetchall()
+        log_database(f"database compaction: incremental vacuum of up to {INCREMENTAL_VACUUM_PAGES} pages ({pages})")
+        return
+    else:
+        log_database(f"database compaction: skipped, no free pages ({page_count} pages)")
+        return
+
+    conn.execute("VACUUM")
+    # the vacuum went through the wal, which would otherwise stay the size of the whole index
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    log_database(f"database compaction: {action}")
+
+# drops what was indexed from files that changed since the last update, so they're indexed again
+def remove_changed_files(conn, changed_files):
+    for relative_path in sorted(changed_files):
+        filename = os.path.basename(relative_path)
+        name_no_ext, ext = os.path.splitext(filename)
+        if ext.lower() in media_exts:
+            rows = conn.execute("SELECT language, track FROM subtitles WHERE filename=? AND track != '-1'", (filename,)).fetchall()
+            for language, track in rows:
+                delete_subtitle_track(conn, filename, language, track)
+            conn.execute("DELETE FROM media_tracks WHERE filename=?", (filename,))
+            conn.execute("DELETE FROM media_probes WHERE filename=?", (filename,))
+            conn.execute("DELETE FROM media_loudness WHERE filename=?", (filename,))
+        else:
+            base_name, lang_code = get_subtitle_file_base_name_and_language(filename)
+            rows = conn.execute("SELECT filename, language FROM subtitles WHERE track = '-1' AND language=?", (lang_code,)).fetchall()
+            for media_filename, language in rows:
+                if os.path.splitext(media_filename)[0] == base_name:
+                    delete_subtitle_track(conn, media_filename, language, "-1")
+
+# tracks is a list of (filename, language, track)
+def remove_subtitle_tracks(conn, tracks, count_progress=True):
+    for filename, language, track in tracks:
+        delete_subtitle_track(conn, filename, language, track)
+        conn.execute("DELETE FROM subtitle_access WHERE filename=?", (filename,))
+        log_database(f"Removed subtitle: file={filename}, track={track}, lang={language}")
+        if count_progress:
+            constants.database_items_left -= 1
 
-    if not ffmpeg_path or not ffprobe_path:
-        log_error("ffmpeg/ffprobe not found, skipping subtitle extraction")
-        return conn
+def store_user_subtitle_track(conn, media_file, lang_code, parsed):
+    store_subtitle_track(conn, media_file, lang_code, lang_code, "-1", parsed)
+    upsert_subtitle_access(conn, media_file)
+
+def remove_media_entries(conn, filenames):
+    for filename in filenames:
+        conn.execute("DELETE FROM media_tracks WHERE filename=?", (filename,))
+        conn.execute("DELETE FROM media_probes WHERE filename=?", (filename,))
+        conn.execute("DELETE FROM media_loudness WHERE filename=?", (filename,))
+        conn.execute("DELETE FROM subtitle_access WHERE filename=?", (filename,))
+        log_database(f"Removed media entries for: {filename}")
+
+# unchanged_media holds relative paths that were already processed and haven't changed since
+# returns the relative paths that couldn't be probed or extracted, they aren't recorded so the next update tries again
+def extract_all_subtitle_tracks_and_update_db(conn, unchanged_media=(), snapshot=None):
+    folder = os.path.join(constants.addon_dir, constants.addon_source_folder)
 
-    def run_ffprobe(path):
-        cmd = [
-            ffprobe_path, "-v", "error",
-            "-show_entries", "stream=index,codec_type,codec_name:stream_tags=language",
-            "-select_streams", "s",
-            "-of", "json", path
-        ]
-        result = constants.silent_run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            log_error(f"ffprobe failed on {path}: {result.stderr.strip()}")
-            return None
+    # one ffmpeg demuxes the file once and writes every stream as srt text into a matroska stream on its stdout
+    # the blocks are parsed as they arrive, stderr is read on its own thread so a full pipe can't stall ffmpeg
+    # returns a list of blocks or None per stream, a failed run is tried again per stream to keep the ones that work
+    def extract_streams(media_path, streams):
+        cmd = [ffmpeg_path, "-nostdin", "-loglevel", "error", "-i", media_path]
+        for stream in streams:
+            cmd += ["-map", f"0:{stream['index']}"]
+        cmd += ["-c:s", "srt", "-f", "matroska", "pipe:1"]
+        # matroska isn't text, both pipes are read as bytes
+        process = constants.silent_popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding=None, errors=None)
+        errors = []
+        drain = threading.Thread(target=lambda: errors.append(process.stderr.read().decode("utf-8", errors="replace")), daemon=True)
+        drain.start()
+        parsed = [[] for _ in streams]
         try:
-            return json.loads(result.stdout)
+            for track, block in subtitle_parser.iter_matroska_blocks(process.stdout):
+                if 1 <= track <= len(streams):
+                    parsed[track - 1].append(block)
         except Exception as e:
-            log_error(f"ffprobe JSON parse error for {path}: {e}")
-            return None
-
-    def parse_srt_blocks(srt_text):
-        blocks = []
-        parts = srt_text.strip().split('\n\n')
-        for part in parts:
-            lines = part.splitlines()
-            if len(lines) >= 3:
-                index = lines[0]
-                timing = lines[1]
-                content = '\n'.join(lines[2:])
-                start_end = timing.split(' --> ')
-                if len(start_end) == 2:
-                    start, end = start_end
-                    blocks.append({
-                        'index': index,
-                        'start': start.strip(),
-                        'end': end.strip(),
-                        'text': content.strip()
-                    })
-        return blocks
-
-    def rebuild_srt_blocks(blocks):
-        srt_lines = []
-        for i, block in enumerate(blocks, 1):
-            srt_lines.append(str(i))
-            srt_lines.append(f"{block['start']} --> {block['end']}")
-            srt_lines.append(block['text'])
-            srt_lines.append('')
-        return '\n'.join(srt_lines)
-
-    def filter_duplicate_timings(blocks):
-        timing_counts = Counter((b['start'], b['end']) for b in blocks)
-        filtered = []
-        for b in blocks:
-            if timing_counts[(b['start'], b['end'])] >= 4:
-                continue
-            cleaned_text = remove_subtitle_formatting(b['text'])
-            if cleaned_text:
-                b['text'] = cleaned_text
-                filtered.append(b)
-        return filtered
-
-    def extract_all_subs_single(media_path, subtitle_streams):
-        temp_dir = tempfile.mkdtemp()
-        try:
-            cmd = [ffmpeg_path, "-y", "-i", media_path]
-            for i, _ in enumerate(subtitle_streams):
-                cmd += ["-map", f"0:s:{i}", "-c:s", "srt", os.path.join(temp_dir, f"track_{i}.srt")]
-            result = constants.silent_run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                log_error(f"ffmpeg failed on {media_path}: {result.stderr.strip()}")
-                return None
-
-            filtered_texts = []
-            for i in range(len(subtitle_streams)):
-                p = os.path.join(temp_dir, f"track_{i}.srt")
-                if os.path.exists(p):
-                    with open(p, "r", encoding="utf-8") as f:
-                        srt_content = f.read()
-                    blocks = parse_srt_blocks(srt_content)
-                    blocks = filter_duplicate_timings(blocks)
-                    filtered_texts.append(rebuild_srt_blocks(blocks))
-                else:
-                    filtered_texts.append("")
-            return filtered_texts
+            # killing it gives a nonzero return code so the run counts as failed
+            errors.append(f"{e} ")
+            process.kill()
         finally:
-            shutil.rmtree(temp_dir)
-
-    current_media = {
-        os.path.relpath(os.path.join(root, f), folder)
-        for root, dirs, files in os.walk(folder)
-        if 'ignore' not in root.split(os.sep)
-        for f in files
-        if os.path.splitext(f)[1].lower() in media_exts
-    }
-
-    # fetch all filenames with any subtitle entry, use basenames only
-    cursor = conn.execute('SELECT DISTINCT filename FROM subtitles')
+            process.stdout.close()
+            process.wait()
+            drain.join()
+
+        if process.returncode != 0:
+            log_error(f"ffmpeg failed on {media_path}: {''.join(errors).strip()}")
+            if len(streams) == 1:
+                return [None]
+            return [extract_streams(media_path, [stream])[0] for stream in streams]
+        return [subtitle_parser.clean_blocks(blocks, drop_repeated_timings=True) for blocks in parsed]
+
+    if snapshot is None:
+        snapshot = get_source_snapshot()
+    current_media = {os.path.relpath(f.path, folder) for f in snapshot.media_files()}
+
+    # fetch all filenames with an extracted subtitle track, use basenames only
+    # a user placed subtitle (track -1) survives its media file changing, so it doesn't count
+    cursor = conn.execute("SELECT DISTINCT filename FROM subtitles WHERE track != '-1'")
     indexed_basenames = {os.path.basename(r[0]) for r in cursor}
 
-    media_to_process = sorted(m for m in current_media if os.path.basename(m) not in indexed_basenames)
+    media_to_process = sorted(
+        m for m in current_media
+        if os.path.basename(m) not in indexed_basenames and m not in unchanged_media
+    )
+
+    if not ffmpeg_path or not ffprobe_path:
+        log_error("ffmpeg/ffprobe not found, skipping subtitle extraction")
+        return set(media_to_process)
 
-    for media_file in media_to_process:
+    # probes, extracts and parses one media file
+    # returns (tracks, complete), tracks is (track, lang, blocks) for each usable stream and complete is False if anything failed
+    def process_media_file(media_file):
         log_database(f"processing file: {media_file}")
         path = os.path.join(folder, media_file)
-        info = run_ffprobe(path)
+        subtitle_streams = get_media_streams(path, "subtitle")
 
-        if not info:
-            continue
+        if subtitle_streams is None:
+            return [], False
 
         streams = [
-            s for s in info.get("streams", [])
-            if s.get("codec_type") == "subtitle" and s.get("codec_name") in ("subrip", "ass", "srt", "ssa", "mov_text", "webvtt")
+            s for s in subtitle_streams
+            if s["codec"] in ("subrip", "ass", "srt", "ssa", "mov_text", "webvtt")
         ]
 
         if not streams:
             log_database(f"No subtitle streams in {media_file}, skipping")
-            continue
+            return [], True
 
         log_database(f"Found {len(streams)} subtitle streams in {media_file}")
-        all_texts = extract_all_subs_single(path, streams)
-        if all_texts is None:
-            continue
-
-        for idx, (stream, text) in enumerate(zip(streams, all_texts), 1):
-            track = idx
-            lang = stream.get("tags", {}).get("language", "und")
-            codec = stream.get("codec_name")
-            log_database(f"Extracting track={track}, lang={lang}, codec={codec}")
-
-            if codec not in ("subrip", "ass", "srt", "ssa", "webvtt"):
-                log_database(f"skip unsupported codec {codec}")
+        # track numbers count every listed stream, mov_text is numbered but not extracted
+        numbered = []
+        for track, stream in enumerate(streams, 1):
+            log_database(f"Extracting track={track}, lang={stream['language'] or 'und'}, codec={stream['codec']}")
+            if stream["codec"] not in ("subrip", "ass", "srt", "ssa", "webvtt"):
+                log_database(f"skip unsupported codec {stream['codec']}")
                 continue
-
-            if check_already_indexed(conn, os.path.basename(media_file), track, lang):
+            numbered.append((track, stream))
+        if not numbered:
+            return [], True
+
+        results = extract_streams(path, [stream for _, stream in numbered])
+        tracks = [
+            (track, stream["language"] or "und", parsed)
+            for (track, stream), parsed in zip(numbered, results)
+            if parsed is not None
+        ]
+        return tracks, len(tracks) == len(numbered)
+
+    # workers only run ffprobe/ffmpeg and parse, the parsed tracks are written by the database writer
+    workers = get_extraction_worker_count()
+    log_database(f"extracting subtitles from {len(media_to_process)} files with {workers} workers")
+    pending = {}
+    unfinished = set()
+    media_iter = iter(media_to_process)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="subtitle_extract") as executor:
+        while True:
+            # keep at most two files per worker in flight so parsed results don't pile up
+            while len(pending) < workers * 2:
+                media_file = next(media_iter, None)
+                if media_file is None:
+                    break
+                pending[executor.submit(process_media_file, media_file)] = media_file
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                media_file = pending.pop(future)
+                try:
+                    tracks, complete = future.result()
+                    if tracks:
+                        run_write(store_extracted_tracks, os.path.basename(media_file), tracks)
+                except Exception as e:
+                    log_error(f"Failed to extract subtitles from {media_file}: {e}")
+                    complete = False
+                if not complete:
+                    unfinished.add(media_file)
+                constants.database_items_left -= 1
+
+    if unfinished:
+        log_database(f"{len(unfinished)} files couldn't be extracted and will be tried again next update")
+    return unfinished
+
+# writes the parsed tracks of one media file in a single transaction
+def store_extracted_tracks(conn, media_filename, tracks):
+    started = not conn.in_transaction
+    if started:
+        conn.execute("BEGIN")
+    try:
+        for track, lang, parsed in tracks:
+            if check_already_indexed(conn, media_filename, track, lang):
                 log_database(f"skip already indexed track={track}, lang={lang}")
                 continue
 
-            blocks = text.strip().split("\n\n")
-            parsed = []
-            for blk in blocks:
-                lines = blk.split("\n")
-                if len(lines) < 3:
-                    continue
-                m = re.match(r"(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})", lines[1])
-                if not m:
-                    continue
-                start, end = m.groups()
-                content = " ".join(lines[2:]).strip()
-                content = remove_subtitle_formatting(content)
-                if not content:
-                    continue
-                parsed.append([lines[0], start, end, content])
-
-            conn.executemany(
-                'INSERT INTO subtitles (filename, language, auto_language_code, track, content) VALUES (?,?,?,?,?)',
-                [(os.path.basename(media_file), lang, lang, str(track),
-                  json.dumps(parsed, ensure_ascii=False))]
-            )
-
-            conn.execute('''
-            INSERT INTO subtitle_access(filename, last_accessed)
-            VALUES (?, CURRENT_TIMESTAMP)
-            ON CONFLICT(filename) DO UPDATE SET last_accessed = CURRENT_TIMESTAMP
-            ''', (os.path.basename(media_file),))
-            log_database(f"Inserted {len(parsed)} blocks for {os.path.basename(media_file)}, track={track}, lang={lang}")
-            conn.commit()
-        constants.database_items_left -= 1
-
-    conn.commit()
-    return conn
+            store_subtitle_track(conn, media_filename, lang, lang, track, parsed)
+            upsert_subtitle_access(conn, media_filename)
+            log_database(f"Inserted {len(parsed)} blocks for {media_filename}, track={track}, lang={lang}")
+        if started:
+            conn.execute("COMMIT")
+    except Exception:
+        if started:
+            conn.execute("ROLLBACK")
+        raise
+
+# configured worker count for subtitle extraction, 0 picks one from the core count
+def get_extraction_worker_count():
+    try:
+        workers = int(constants.load_config().get("extraction_workers", 0))
+    except (TypeError, ValueError):
+        workers = 0
+    if workers <= 0:
+        workers = min(8, max(1, (os.cpu_count() or 2) - 1))
+    return workers
 
 def print_top_20_largest_subtitle_entries():
     conn = get_database()
     cursor = conn.cursor()
 
     query = """
-    SELECT filename, language, track, LENGTH(content) as size
-    FROM subtitles
+    SELECT filename, language, track, SUM(LENGTH(text)) as size
+    FROM subtitle_blocks
+    GROUP BY filename, track, language
     ORDER BY size DESC
     LIMIT 20
     """
@@ -593,17 +1542,18 @@ def print_largest_subtitle_entry_content():
     cursor = conn.cursor()
 
     query = """
-    SELECT filename, language, track, content
-    FROM subtitles
-    ORDER BY LENGTH(content) DESC
+    SELECT filename, language, track
+    FROM subtitle_blocks
+    GROUP BY filename, track, language
+    ORDER BY SUM(LENGTH(text)) DESC
     LIMIT 1
     """
     row = cursor.execute(query).fetchone()
 
     if row:
-        filename, language, track, content = row
+        filename, language, track = row
         log_database(f"Largest entry: {filename}, Lang: {language}, Track: {track}")
-        parsed = json.loads(content)
+        parsed = get_subtitle_blocks(conn, filename, track, language)
         for i, line in enumerate(parsed[:500]):  # Limit output for preview
             idx, start, end, text = line
             log_database(f"{idx}: {start} --> {end} | {text}")
@@ -617,12 +1567,11 @@ def print_largest_subtitle_entry_content():
 
 def print_all_subtitle_contents():
     conn = get_database()
-    cursor = conn.execute('SELECT filename, track, language, content FROM subtitles')
-    for filename, track, language, content in cursor:
+    cursor = conn.execute('SELECT filename, track, language FROM subtitles')
+    for filename, track, language in cursor.fetchall():
         log_database(f"Subtitle: filename={filename}, track={track}, language={language}")
         try:
-            log_database(f"Raw content: {content}")
-            parsed = json.loads(content)
+            parsed = get_subtitle_blocks(conn, filename, track, language)
             log_database(f"parsed: {parsed}")
             for i, line in enumerate(parsed[:20]):  # limit output to first 20 lines per subtitle
                 if len(line) >= 4:
@@ -646,6 +1595,7 @@ def print_all_subtitle_names():
 print_all_subtitle_names()
 
 def print_subtitles_by_last_accessed():
+    flush_subtitle_access(wait=True)
     conn = get_database()
 
     cursor = conn.execute('''
@@ -1,20 +1,31 @@
 import os
 import json
+import math
 import re
-import threading
-import time
 from collections import defaultdict
 
-from aqt.utils import showInfo
 from send2trash import send2trash
 
 from . import manage_database
 from . import constants
+from . import ffmpeg_batch
+from . import audio_cache
+from . import timing_variants
+from . import media_jobs
 
 from .constants import log_filename
 from .constants import log_error
 from .constants import log_image
 from .constants import log_command
+from .constants import showInfo
+
+# true peak ceiling for normalized clips, in dBTP
+LOUDNESS_TRUE_PEAK = -1.5
+# note type settings that change which audio is cut and how it's encoded
+AUDIO_PARAM_KEYS = (
+    "bitrate", "normalize_audio", "lufs", "target_language_code", "translation_language_code",
+    "target_audio_track", "translation_audio_track", "selected_tab_index",
+)
 
 
 # todo: implement 4 character sha hash to disambiguate files with the same name and extension
@@ -102,14 +113,7 @@ def extract_sound_line_data(sound_line):
 
 # returns all current config values as a dict
 def get_config():
-    config_path = os.path.join(os.path.dirname(__file__), "config.json")
-
-    if not os.path.exists(config_path):
-        log_error(f"Config file not found at {config_path}")
-        return None
-
-    with open(config_path, "r", encoding="utf-8") as f:
-        config = json.load(f)
+    config = constants.extract_config_data()
 
     keys = [
         "default_model", "default_deck", "audio_ext", "bitrate", "image_height",
@@ -204,7 +208,7 @@ def get_subtitle_file_from_database(full_source_filename, track, code, config, d
         # try exact match
         log_filename(f"trying exact match")
         cursor = database.execute('''
-                                  SELECT s.filename, s.language, s.track, s.content
+                                  SELECT s.filename, s.language, s.track
                                   FROM subtitles s
                                            JOIN subtitle_access a ON s.filename = a.filename
                                   WHERE s.filename = ?
@@ -221,11 +225,7 @@ def get_subtitle_file_from_database(full_source_filename, track, code, config, d
                 log_filename(f"tagged_subtitle_path: {tagged_subtitle_path}")
 
                 # Update last_accessed for this access
-                database.execute('''
-                                 INSERT INTO subtitle_access(filename, last_accessed)
-                                 VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                                 UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                                 ''', (full_source_filename,))
+                manage_database.touch_subtitle_access(full_source_filename)
 
                 return tagged_subtitle_path
 
@@ -248,11 +248,7 @@ def get_subtitle_file_from_database(full_source_filename, track, code, config, d
             log_filename(f"Found subtitle in DB for {full_source_filename} with track=-1 and language=und")
 
             # Update last_accessed for this access
-            database.execute('''
-                             INSERT INTO subtitle_access(filename, last_accessed)
-                             VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                             UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                             ''', (full_source_filename,))
+            manage_database.touch_subtitle_access(full_source_filename)
 
             return f"{full_source_filename}.srt"
 
@@ -261,53 +257,45 @@ def get_subtitle_file_from_database(full_source_filename, track, code, config, d
         like_pattern = f"{full_source_filename}%"
         if selected_tab_index == 0:
             query = '''
-                    SELECT s.filename, s.track, s.language
+                    SELECT s.filename, s.track, s.language, a.last_accessed
                     FROM subtitles s
                              JOIN subtitle_access a ON s.filename = a.filename
                     WHERE s.filename LIKE ?
                       AND s.language = ?
-                    ORDER BY a.last_accessed DESC LIMIT 1 \
+                    ORDER BY a.last_accessed DESC \
                     '''
             cursor.execute(query, (like_pattern, code))
-            row = cursor.fetchone()
-            if row:
-                base_filename, found_track, found_code = row
+            rows = manage_database.sort_by_last_accessed(cursor.fetchall())
+            if rows:
+                base_filename, found_track, found_code, _ = rows[0]
                 subtitle_filename = f"{base_filename}`track_{found_track}`{found_code}.srt"
                 subtitle_path = os.path.join(constants.addon_source_folder, subtitle_filename)
                 log_filename(f"[tab 0] subtitle_path (by code, recent-first): {subtitle_path}")
 
                 # Update last_accessed for this access
-                database.execute('''
-                                 INSERT INTO subtitle_access(filename, last_accessed)
-                                 VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                                 UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                                 ''', (base_filename,))
+                manage_database.touch_subtitle_access(base_filename)
 
                 return subtitle_path
 
         # search for track
         log_filename(f"trying to match track")
         query = '''
-                SELECT s.filename, s.track, s.language
+                SELECT s.filename, s.track, s.language, a.last_accessed
                 FROM subtitles s
                          JOIN subtitle_access a ON s.filename = a.filename
                 WHERE s.filename LIKE ?
                 ORDER BY a.last_accessed DESC \
                 '''
         cursor.execute(query, (like_pattern,))
-        rows = cursor.fetchall()
-        for db_filename, db_track, db_lang in rows:
+        rows = manage_database.sort_by_last_accessed(cursor.fetchall())
+        for db_filename, db_track, db_lang, _ in rows:
             if db_filename.startswith(full_source_filename) and f"`track_{track}`" in db_filename:
                 subtitle_filename = f"{db_filename}`track_{track}`{db_lang}.srt"
                 subtitle_path = os.path.join(constants.addon_source_folder, subtitle_filename)
                 log_filename(f"[tab {selected_tab_index}] subtitle_path (by track, recent-first): {subtitle_path}")
 
                 # Update last_accessed for this access
-                database.execute('''
-                                 INSERT INTO subtitle_access(filename, last_accessed)
-                                 VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                                 UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                                 ''', (db_filename,))
+                manage_database.touch_subtitle_access(db_filename)
 
                 return subtitle_path
 
@@ -315,27 +303,23 @@ def get_subtitle_file_from_database(full_source_filename, track, code, config, d
         log_filename(f"trying code as fallback")
         if selected_tab_index != 0:
             query = '''
-                    SELECT s.filename, s.track, s.language
+                    SELECT s.filename, s.track, s.language, a.last_accessed
                     FROM subtitles s
                              JOIN subtitle_access a ON s.filename = a.filename
                     WHERE s.filename LIKE ?
                       AND s.language = ?
-                    ORDER BY a.last_accessed DESC LIMIT 1 \
+                    ORDER BY a.last_accessed DESC \
                     '''
             cursor.execute(query, (like_pattern, code))
-            row = cursor.fetchone()
-            if row:
-                base_filename, found_track, found_code = row
+            rows = manage_database.sort_by_last_accessed(cursor.fetchall())
+            if rows:
+                base_filename, found_track, found_code, _ = rows[0]
                 subtitle_filename = f"{base_filename}`track_{found_track}`{found_code}.srt"
                 subtitle_path = os.path.join(constants.addon_source_folder, subtitle_filename)
                 log_filename(f"[tab 1+] subtitle_path (fallback by code, recent-first): {subtitle_path}")
 
                 # Update last_accessed for this access
-                database.execute('''
-                                 INSERT INTO subtitle_access(filename, last_accessed)
-                                 VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                                 UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                                 ''', (base_filename,))
+                manage_database.touch_subtitle_access(base_filename)
 
                 return subtitle_path
 
@@ -543,7 +527,7 @@ def get_overlapping_blocks_from_subtitle_path_and_hmsms_timings(subtitle_path, s
 
     # try exact match first (using base without extension)
     query = '''
-            SELECT s.content, s.filename
+            SELECT s.filename
             FROM subtitles s
                      JOIN subtitle_access a ON s.filename = a.filename
             WHERE s.filename = ?
@@ -559,61 +543,35 @@ def get_overlapping_blocks_from_subtitle_path_and_hmsms_timings(subtitle_path, s
     if row is None:
         like_pattern = base_no_ext + "%"
         query_like = '''
-                     SELECT s.content, s.filename
+                     SELECT s.filename, a.last_accessed
                      FROM subtitles s
                               JOIN subtitle_access a ON s.filename = a.filename
                      WHERE s.filename LIKE ?
                        AND s.track = ?
                        AND s.language = ?
-                     ORDER BY a.last_accessed DESC LIMIT 1 \
+                     ORDER BY a.last_accessed DESC \
                      '''
         cursor = db.execute(query_like, (like_pattern, str(track), code))
-        row = cursor.fetchone()
+        rows = manage_database.sort_by_last_accessed(cursor.fetchall())
+        row = rows[0] if rows else None
 
     # update last_accessed after fetching
     if row:
-        db.execute('''
-                   INSERT INTO subtitle_access(filename, last_accessed)
-                   VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                   UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                   ''', (row[1],))
+        manage_database.touch_subtitle_access(row[0])
 
     if row is None:
         log_error(f"No subtitle content found in DB for filename={base_no_ext} track={track} language={code}")
         return []
 
-    content_json = row[0]
-
-    try:
-        blocks = json.loads(content_json)
-    except Exception as e:
-        log_error(f"Failed to parse subtitle JSON for {base_no_ext}: {e}")
-        return []
-
     start_ms = time_hmsms_to_milliseconds(start_time)
     end_ms = time_hmsms_to_milliseconds(end_time)
+    if start_ms is None or end_ms is None:
+        return []
 
-    overlapping_blocks = []
-    for block in blocks:
-        if not block or len(block) < 3:
-            continue
-        try:
-            sub_start_ms = time_hmsms_to_milliseconds(block[1])
-            sub_end_ms = time_hmsms_to_milliseconds(block[2])
-        except Exception:
-            continue
-
-        if sub_start_ms is None or sub_end_ms is None:
-            log_error(f"Unrecognized timestamp format: {block}")
-            continue
-
-        if sub_start_ms > end_ms:
-            break
-
-        if sub_start_ms < end_ms and sub_end_ms > start_ms:
-            overlapping_blocks.append(block)
-
-    return overlapping_blocks
+    loaded_track = manage_database.load_subtitle_track(db, row[0], track, code)
+    if loaded_track is None:
+        return []
+    return loaded_track.get_overlapping_blocks(start_ms, end_ms)
 
 
 def get_source_path_from_full_filename(full_source_filename) -> str:
@@ -633,71 +591,27 @@ def get_source_path_from_full_filename(full_source_filename) -> str:
         if os.path.exists(path):
             return path
 
-    # Walk recursively through all subfolders except 'ignore'
-    for root, dirs, files in os.walk(folder):
-        if 'ignore' in root.split(os.sep):
-            continue
-        for base in possible_bases:
-            for ext in all_exts:
-                candidate = base + ext
-                if candidate in files:
-                    full_path = os.path.join(root, candidate)
-                    log_image(f"searching path for video/audio: {full_path}")
-                    log_command(f"now checking: {full_path}")
-                    if os.path.exists(full_path):
-                        return full_path
+    # look the name up in the source folder index, every subfolder except 'ignore'
+    candidates = [base + ext for base in possible_bases for ext in all_exts]
+    full_path = manage_database.find_source_file(candidates)
+    if full_path:
+        log_command(f"found source file: {full_path}")
+        return full_path
 
     log_error(f"No source file found for base name: {full_source_filename}")
     return ""
 
 
-def get_subtitle_track_number_by_code(source_path, code):
-    conn = manage_database.get_database()
-    filename = os.path.basename(source_path)
-
-    cursor = conn.execute('''
-                          SELECT m.track
-                          FROM media_tracks m
-                                   JOIN subtitle_access a ON m.filename = a.filename
-                          WHERE m.filename = ?
-                            AND m.language = ?
-                            AND m.type = 'subtitle'
-                          ORDER BY a.last_accessed DESC LIMIT 1
-                          ''', (filename, code.lower()))
-
-    row = cursor.fetchone()
-    if row:
-        # Update last_accessed for this access
-        conn.execute('''
-                     INSERT INTO subtitle_access(filename, last_accessed)
-                     VALUES (?, CURRENT_TIMESTAMP) ON CONFLICT(filename) DO
-                     UPDATE SET last_accessed = CURRENT_TIMESTAMP
-                     ''', (filename,))
-        return row[0]
-
-    return None
-
-
 def get_subtitle_code_by_track_number(source_path, track_number):
-    _, ffprobe_exe = constants.get_ffmpeg_exe_path()
-    try:
-        cmd = [
-            ffprobe_exe, "-v", "error", "-select_streams", "s",
-            "-show_entries", "stream=index:stream_tags=language",
-            "-of", "json", source_path
-        ]
-        result = constants.silent_run(cmd, capture_output=True, text=True)
-        log_command(
-            f"[ffprobe subtitle code lookup]\ncmd: {' '.join(cmd)}\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}")
+    streams = manage_database.get_media_streams(source_path, "subtitle")
+    if streams is None:
+        log_error(f"ffprobe error while reading subtitle code for {source_path}")
+        return None
 
-        streams = json.loads(result.stdout).get("streams", [])
-        if 1 <= int(track_number) <= len(streams):
-            return streams[int(track_number) - 1].get("tags", {}).get("language", "")
-        else:
-            log_error(
-                f"Invalid subtitle track number {track_number} for {source_path} — only {len(streams)} subtitle track(s) found.")
-    except Exception as e:
-        log_error(f"ffprobe error while reading subtitle code: {e}")
+    if 1 <= int(track_number) <= len(streams):
+        return streams[int(track_number) - 1]["language"]
+    log_error(
+        f"Invalid subtitle track number {track_number} for {source_path} — only {len(streams)} subtitle track(s) found.")
     return None
 
 
@@ -714,7 +628,6 @@ def get_subtitle_blocks_from_index_range_and_path(start_index, end_index, subtit
     track = str(subtitle_data["track"])
     code = subtitle_data["code"]
     conn = manage_database.get_database()
-    cursor = conn.cursor()
 
     if track is None or track == "None":
         track = "-1"
@@ -722,35 +635,13 @@ def get_subtitle_blocks_from_index_range_and_path(start_index, end_index, subtit
         code = "und"
 
     log_filename(f"searching for blocks with filename: {filename}, code: {code}, track: {track}")
-    cursor.execute('''
-                   SELECT s.content
-                   FROM subtitles s
-                            JOIN subtitle_access a ON s.filename = a.filename
-                   WHERE s.filename = ?
-                     AND s.track = ?
-                     AND s.language = ?
-                   ORDER BY a.last_accessed DESC
-                   ''', (filename, track, code))
-    row = cursor.fetchone()
-
-    if row is None:
-        log_error(f"No subtitle content found in DB for filename={filename} track={track} language={code}")
-        return []
-
-    content_json = row[0]
-
-    try:
-        blocks = json.loads(content_json)
-    except Exception as e:
-        log_error(f"Failed to parse subtitle JSON")
-        return []
-
-    total_blocks = len(blocks)
+    loaded_track = manage_database.load_subtitle_track(conn, filename, track, code)
+    total_blocks = len(loaded_track.blocks) if loaded_track else 0
 
     log_filename(f"start index: {start_index}, end index: {end_index}, total blocks: {total_blocks}")
 
     if total_blocks == 0:
-        log_error(f"no subtitle blocks returned")
+        log_error(f"No subtitle content found in DB for filename={filename} track={track} language={code}")
         return []
 
     if start_index <= 0:
@@ -765,19 +656,12 @@ def get_subtitle_blocks_from_index_range_and_path(start_index, end_index, subtit
         showInfo(f"Start index cannot be after end index: {start_index}-{end_index}.")
         return []
 
-    usable_blocks = []
-    if 0 <= start_index - 1 < len(blocks):
-        log_error(f"starting block at index: {start_index - 1}, {blocks[start_index - 1]}")
-    else:
-        log_error(f"[warning] Invalid access attempt: start_index={start_index}, total_blocks={len(blocks)}")
+    if start_index > total_blocks:
+        log_error(f"[warning] Invalid access attempt: start_index={start_index}, total_blocks={total_blocks}")
         return []
-    for i, raw_block in enumerate(blocks[start_index - 1:end_index]):
-        if isinstance(raw_block, str):
-            parsed = constants.format_subtitle_block(raw_block)
-            if parsed:
-                usable_blocks.append(parsed)
-        elif isinstance(raw_block, list) and len(raw_block) == 4:
-            usable_blocks.append(raw_block)
+
+    usable_blocks = loaded_track.get_blocks(start_index, end_index)
+    log_error(f"starting block at index: {start_index - 1}, {usable_blocks[0]}")
 
     if keep_start:
         usable_blocks[0][1] = keep_start
@@ -803,11 +687,22 @@ def get_target_subtitle_block_and_subtitle_path_from_sentence_line(sentence_line
     normalized_sentence = constants.normalize_text(sentence_line)
     log_filename(f"Normalized sentence to match: '{normalized_sentence}'")
 
+    if len(sentence_line) <= 10:
+        max_window = max(1, len(sentence_line))
+    elif len(sentence_line) <= 100:
+        max_window = max(1, 10 + len(sentence_line) // 10)
+    elif len(sentence_line) <= 1000:
+        max_window = max(1, len(sentence_line) // 10)
+    else:
+        max_window = 100
+
+    log_filename(f"search subtitle window length: {max_window}")
+
     # use auto generated code if language is undefined
     subtitle_database = manage_database.get_database()
     cursor = subtitle_database.execute('''
         SELECT s.filename,
-               COALESCE(NULLIF(s.language, 'und'), s.auto_language_code) AS language, s.track, s.content,
+               COALESCE(NULLIF(s.language, 'und'), s.auto_language_code) AS language, s.track,
         COALESCE(a.last_accessed, '1970-01-01 00:00:00') AS last_accessed,
         s.language AS raw_language
         FROM subtitles s
@@ -817,85 +712,128 @@ def get_target_subtitle_block_and_subtitle_path_from_sentence_line(sentence_line
         ORDER BY last_accessed DESC, s.filename COLLATE NOCASE ASC''',
         (target_language_code, target_audio_track))
 
-    rows = cursor.fetchall()
+    # sources used since the last flush of subtitle_access are still ranked first
+    rows = manage_database.sort_by_last_accessed(cursor.fetchall(), 3)
     lang_track_groups = defaultdict(list)
-    for db_filename, language, track, content_json, last_accessed, raw_language in rows:
+    for db_filename, language, track, last_accessed, raw_language in rows:
         lang_track_groups[(db_filename, language)].append(track)
 
-    for db_filename, language, track, content_json, last_accessed, raw_language in rows:
-        log_filename(f"Checking subtitle file: {db_filename}, language={language}, track={track}")
-        if raw_language == 'und' and language != 'und':
-            log_filename(f"[auto language] {language}: using auto_language_code '{language}'")
-        try:
-            raw_blocks = json.loads(content_json)
-        except Exception as e:
-            log_error(f"Failed to parse content for {db_filename}: {e}")
-            continue
+    def search_rows(candidates):
+        for db_filename, language, track, last_accessed, raw_language in rows:
+            candidate_blocks = None
+            if candidates is not None:
+                candidate_blocks = candidates.get((db_filename, raw_language, str(track)))
+                if not candidate_blocks:
+                    continue
 
-        usable_blocks = []
-        for raw_block in raw_blocks:
-            if isinstance(raw_block, str):
-                parsed = constants.format_subtitle_block(raw_block)
-                if parsed:
-                    usable_blocks.append(parsed)
-            elif isinstance(raw_block, list) and len(raw_block) == 4:
-                usable_blocks.append(raw_block)
-
-        normalized_lines = [constants.normalize_text(b[3]) for b in usable_blocks]
-
-        if len(sentence_line) <= 10:
-            max_window = max(1, len(sentence_line))
-        elif len(sentence_line) <= 100:
-            max_window = max(1, 10 + len(sentence_line) // 10)
-        elif len(sentence_line) <= 1000:
-            max_window = max(1, len(sentence_line) // 10)
-        else:
-            max_window = 100
+            log_filename(f"Checking subtitle file: {db_filename}, language={language}, track={track}")
+            if raw_language == 'und' and language != 'und':
+                log_filename(f"[auto language] {language}: using auto_language_code '{language}'")
+
+            if candidate_blocks is None:
+                block_rows = manage_database.get_subtitle_block_rows(subtitle_database, db_filename, track, raw_language)
+                normalized_lines = [block_row[4] for block_row in block_rows]
+                block_position = find_sentence_in_blocks(normalized_lines, normalized_sentence, max_window)
+                block_row = block_rows[block_position] if block_position is not None else None
+            else:
+                block_row = find_sentence_in_candidate_blocks(subtitle_database, db_filename, track, raw_language,
+                                                              candidate_blocks, normalized_sentence, max_window)
+            if block_row is None:
+                continue
 
-        log_filename(f"search subtitle window length: {max_window}")
+            manage_database.touch_subtitle_access(db_filename)
 
-        joined_lines = normalized_lines
+            subtitle_name = f"{db_filename}"
+            if language != "und" or str(track) != "-1":
+                subtitle_name += f"`track_{track}`{language}"
+            subtitle_name += ".srt"
+            actual_path = os.path.join(constants.addon_source_folder, subtitle_name)
 
-        for i in range(len(joined_lines) - max_window + 1):
-            window = joined_lines[i:i + max_window]
-            joined = ''.join(window)
-            if normalized_sentence in joined:
-                subtitle_database.execute(
-                    "UPDATE subtitle_access SET last_accessed = CURRENT_TIMESTAMP WHERE filename = ?",
-                    (db_filename,)
-                )
-                subtitle_database.commit()
-
-                subtitle_name = f"{db_filename}"
-                if language != "und" or str(track) != "-1":
-                    subtitle_name += f"`track_{track}`{language}"
-                subtitle_name += ".srt"
-                actual_path = os.path.join(constants.addon_source_folder, subtitle_name)
-
-                # search for the correct block if the subtitle line is smaller than the search window
-                if i == 0:
-                    log_filename(f"subtitle line at index smaller than search window ({max_window})")
-                    start_index = joined.index(normalized_sentence)
-                    pos = 0
-                    for offset, line in enumerate(window):
-                        next_pos = pos + len(line)
-                        if start_index < next_pos:
-                            group = lang_track_groups[(db_filename, language)]
-                            log_filename(f"group for ({db_filename}, {language}): {group}, matched track: {track}, index: {group.index(track) if len(group) > 1 else 0}")
-                            corresponding_audio_track_count = group.index(str(track)) if len(group) > 1 else 0
-                            return usable_blocks[i + offset], actual_path, corresponding_audio_track_count
-                        pos = next_pos
-
-                # otherwise the last block will contain the correct line
-                group = lang_track_groups[(db_filename, language)]
-                log_filename(f"group for ({db_filename}, {language}): {group}, matched track: {track}, index: {group.index(track) if len(group) > 1 else 0}")
-                corresponding_audio_track_count = group.index(str(track)) if len(group) > 1 else 0
-                return usable_blocks[i + max_window - 1], actual_path, corresponding_audio_track_count
+            group = lang_track_groups[(db_filename, language)]
+            log_filename(f"group for ({db_filename}, {language}): {group}, matched track: {track}, index: {group.index(track) if len(group) > 1 else 0}")
+            corresponding_audio_track_count = group.index(str(track)) if len(group) > 1 else 0
+            return manage_database.block_from_row(block_row), actual_path, corresponding_audio_track_count
+        return None
+
+    # narrow the search to the blocks a match could start in, from the trigram index
+    # every match starts in one of them, so this finds the same block as scanning every window of every track
+    candidates = manage_database.get_sentence_candidate_blocks(normalized_sentence)
+    if candidates is not None:
+        log_filename(f"search index returned candidates in {len(candidates)} subtitle tracks")
+
+    result = search_rows(candidates)
+    if result:
+        return result
 
     log_command("No subtitle match found across blocks.")
     return None, None, -1
 
 
+# checks only the windows containing one of the search index's candidate blocks, reading just those parts of the track
+# returns the row of the matched block, or None
+def find_sentence_in_candidate_blocks(conn, db_filename, track, language, candidate_blocks, normalized_sentence, max_window):
+    # a window starting at position i covers the blocks i to i + max_window - 1, idx is 1 based
+    window_starts = sorted({
+        i
+        for idx in candidate_blocks
+        for i in range(max(0, idx - max_window), idx)
+    })
+
+    # windows whose blocks touch are read together, in track order so the first match is the full scan's
+    runs = []
+    for start in window_starts:
+        if runs and start <= runs[-1][-1] + max_window:
+            runs[-1].append(start)
+        else:
+            runs.append([start])
+
+    for run in runs:
+        first_position = run[0]
+        block_rows = manage_database.get_subtitle_block_rows(conn, db_filename, track, language,
+                                                             first_position + 1, run[-1] + max_window)
+        normalized_lines = [block_row[4] for block_row in block_rows]
+        block_position = find_sentence_in_blocks(normalized_lines, normalized_sentence, max_window,
+                                                 [start - first_position for start in run], first_position)
+        if block_position is not None:
+            return block_rows[block_position]
+    return None
+
+
+# slides a window over the normalized lines and returns the position of the matched line
+# window_starts limits which windows are checked, None checks every window
+# first_position is where normalized_lines begin in the track when they're only part of it
+def find_sentence_in_blocks(normalized_lines, normalized_sentence, max_window, window_starts=None, first_position=0):
+    last_start = len(normalized_lines) - max_window
+    if window_starts is None:
+        window_starts = range(last_start + 1)
+
+    for i in window_starts:
+        if i < 0 or i > last_start:
+            continue
+        window = normalized_lines[i:i + max_window]
+        joined = ''.join(window)
+        if normalized_sentence not in joined:
+            continue
+
+        # search for the correct block if the subtitle line is smaller than the search window
+        # otherwise use the block containing the end of the line
+        if first_position + i == 0:
+            log_filename(f"subtitle line at index smaller than search window ({max_window})")
+            target_pos = joined.index(normalized_sentence)
+        else:
+            target_pos = joined.index(normalized_sentence) + len(normalized_sentence) - 1
+
+        pos = 0
+        for offset, line in enumerate(window):
+            next_pos = pos + len(line)
+            if target_pos < next_pos:
+                return i + offset
+            pos = next_pos
+        return i + max_window - 1
+
+    return None
+
+
 def get_sound_sentence_line_from_subtitle_blocks_and_path(blocks, subtitle_path, sentence_code, timing_code, config,
                                                           note_type_name, corresponding_audio_track_count):
     if not subtitle_path:
@@ -983,7 +921,7 @@ def get_next_matching_subtitle_block(sentence_line, selected_text, sound_line, c
 
         db = manage_database.get_database()
         rows = db.execute('''
-                          SELECT s.filename, s.language, s.track, s.content
+                          SELECT s.filename, s.language, s.track
                           FROM subtitles s
                                    JOIN subtitle_access a ON s.filename = a.filename
                           ''').fetchall()
@@ -1000,36 +938,18 @@ def get_next_matching_subtitle_block(sentence_line, selected_text, sound_line, c
 
         # only search files with target code or track
         candidates = [
-            (fn, language, track, content_json)
-            for fn, language, track, content_json in sorted(rows, key=lambda row: priority(row[1], row[2]))
+            (fn, language, track)
+            for fn, language, track in sorted(rows, key=lambda row: priority(row[1], row[2]))
             if priority(language, track) < 3
         ]
 
-        for fn, language, track, content_json in candidates:
+        for fn, language, track in candidates:
             log_filename(f"checking for next result: {fn}, {language}, {track}")
             base_candidate, _ = os.path.splitext(fn)
 
-            # convert to blocks
-            try:
-                raw_blocks = json.loads(content_json)
-            except Exception as e:
-                log_error(f"Failed to parse {fn}: {e}")
-                continue
-
-            # normalize and format
-            usable = []
-            for rb in raw_blocks:
-                if isinstance(rb, list) and len(rb) == 4:
-                    usable.append(rb)
-                elif isinstance(rb, str):
-                    parsed = constants.format_subtitle_block(rb)
-                    if parsed:
-                        usable.append(parsed)
-
             # scan through blocks
-            for b in usable:
-                block_idx = int(b[0])
-                text = b[3]
+            for block_row in manage_database.get_subtitle_block_rows(db, fn, track, language):
+                block_idx = block_row[0]
                 if not found_current:
                     if base_candidate == filename_base and block_idx == target_index:
                         found_current = True
@@ -1037,9 +957,9 @@ def get_next_matching_subtitle_block(sentence_line, selected_text, sound_line, c
 
                 subtitle_filename = f"{fn}`track_{track}`{code}.srt"
                 subtitle_path = os.path.join(constants.addon_source_folder, subtitle_filename)
-                if normalized_target_text in constants.normalize_text(text):
+                if normalized_target_text in block_row[4]:
                     log_filename(f"Match found in block {block_idx} of {base_candidate}, path is: {subtitle_path}")
-                    return b, subtitle_path
+                    return manage_database.block_from_row(block_row), subtitle_path
 
         return None, None
 
@@ -1076,21 +996,30 @@ def run_ffmpeg_extract_image_command(source_path, image_timestamp, image_collect
             m4b_image_collection_path
         ]
         log_command(f"Extracting cover from m4b:\n{' '.join(cmd)}")
-        result = constants.silent_run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            log_error(f"FFmpeg cover extraction failed:\n{result.stderr}")
-            return ""
-        if os.path.exists(m4b_image_collection_path):
-            log_command(f"Extracted cover: {m4b_image_collection_path}")
+        if ffmpeg_batch.queue_command(cmd, source_path, m4b_image_collection_path):
             return m4b_image_collection_path
-        else:
-            log_error("Cover extraction failed: output file not found")
-            return ""
+        media_jobs.submit(cmd, m4b_image_collection_path)
+        return get_submitted_image_path(m4b_image_collection_path)
+
+    # the same screenshot is already in the collection, from this or another note
+    fast_image_seek = constants.load_config().get("fast_image_seek", False)
+    params_hash = manage_database.hash_media_params(
+        source_path, [os.path.basename(image_collection_path), image_timestamp, image_height, fast_image_seek]
+    )
+    if not media_jobs.is_pending(image_collection_path) and manage_database.is_generated_media_current(image_collection_path, params_hash):
+        log_image(f"reusing generated image: {image_collection_path}")
+        return image_collection_path
+
+    def on_done(succeeded):
+        if succeeded:
+            manage_database.record_generated_media(image_collection_path, params_hash)
 
     timestamp = convert_hmsms_to_ffmpeg_time_notation(image_timestamp)
-    cmd = [
-        ffmpeg_path, "-y",
-        "-ss", timestamp,
+    cmd = [ffmpeg_path, "-y", "-ss", timestamp]
+    # fast mode takes the keyframe before the timestamp and only decodes keyframes
+    if fast_image_seek:
+        cmd += ["-noaccurate_seek", "-skip_frame", "nokey"]
+    cmd += [
         "-i", source_path,
         "-frames:v", "1",
         "-q:v", "15",
@@ -1099,13 +1028,18 @@ def run_ffmpeg_extract_image_command(source_path, image_timestamp, image_collect
     ]
 
     log_image(f"Extracting image:\n{' '.join(cmd)}")
-    result = constants.silent_run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        log_error(f"FFmpeg image extraction failed:\n{result.stderr}")
-        return ""
+    if ffmpeg_batch.queue_command(cmd, source_path, image_collection_path, on_done):
+        return image_collection_path
+    # written in the background, the editor shows it once it exists or takes it out of the note if it fails
+    media_jobs.submit(cmd, image_collection_path, on_done)
+    return get_submitted_image_path(image_collection_path)
 
-    log_command(f"Extracted image: {image_collection_path}")
-    return image_collection_path
+
+# off the GUI thread a submitted command has already run, like before a failed screenshot returns ""
+def get_submitted_image_path(image_path):
+    if not media_jobs.is_pending(image_path) and not os.path.exists(image_path):
+        return ""
+    return image_path
 
 
 def create_ffmpeg_extract_audio_command(source_path, start_time, end_time, collection_path, sound_line, config,
@@ -1138,15 +1072,6 @@ def create_ffmpeg_extract_audio_command(source_path, start_time, end_time, colle
         log_error(f"End time must be after start time: {start}, {end}")
         return []
 
-    # get or add start time to database
-    conn = manage_database.get_database()
-    filename = os.path.basename(source_path)
-    delay_ms = get_audio_start_time_ms_from_db(filename, conn)
-
-    if delay_ms is None:
-        delay_ms = get_audio_start_time_ms(source_path)
-        set_audio_start_time_ms_in_db(filename, delay_ms, conn)
-
     base, file_extension = os.path.splitext(collection_path)
     ext_no_dot = file_extension[1:].lower()
 
@@ -1170,17 +1095,12 @@ def create_ffmpeg_extract_audio_command(source_path, start_time, end_time, colle
     track = translation_track if use_translation_data else target_track
 
     audio_track_index = None
+    delay_ms = 0
     try:
-        result = constants.silent_run(
-            [ffprobe_path, "-v", "error", "-select_streams", "a", "-show_entries",
-             "stream=index:stream_tags=language", "-of", "json", source_path],
-            capture_output=True, text=True,
-        )
-        log_command(f"[ffprobe audio stream scan]\nstdout:\n{result.stdout}\nstderr:\n{result.stderr}")
-        info = json.loads(result.stdout)
-        streams = info.get("streams", [])
-
-        if not info:
+        streams = manage_database.get_media_streams(source_path, "audio")
+        log_command(f"[ffprobe audio stream scan]\n{streams}")
+
+        if streams is None:
             log_error(f"no info from file: {source_path}")
             return []
 
@@ -1190,7 +1110,7 @@ def create_ffmpeg_extract_audio_command(source_path, start_time, end_time, colle
         if selected_tab_index == 0:
             match_count = 0
             for stream in streams:
-                if stream.get("tags", {}).get("language", "").lower() == code.lower():
+                if stream["language"].lower() == code.lower():
                     audio_track_index = stream["index"]
                     if match_count == corresponding_audio_track_count:
                         break
@@ -1215,43 +1135,37 @@ def create_ffmpeg_extract_audio_command(source_path, start_time, end_time, colle
             showInfo(f"No audio track found for '{basename}' with the code '{code}' or track '{track}'.")
             return []
 
+        # start time of the chosen stream, from the same probe
+        delay_ms = next((stream["start_ms"] for stream in streams if stream["index"] == audio_track_index), 0)
+
     except Exception as e:
         log_error(f"Error selecting audio track: {e}")
         audio_track_index = 0
 
-    #  retrieve delay_ms for this audio stream from database
-    conn = manage_database.get_database()
-    filename = os.path.basename(source_path)
-
-    cursor = conn.execute(
-        "SELECT delay_ms FROM media_audio_start_times WHERE filename=? AND audio_track=?",
-        (filename, audio_track_index)
-    )
-    row = cursor.fetchone()
+    log_command(f"audio stream {audio_track_index} starts at {delay_ms}ms")
 
-    if row:
-        delay_ms = row[0]
-    else:
-        delay_ms = constants.get_audio_start_time_ms_for_track(source_path, audio_track_index)
-        conn.execute(
-            "INSERT OR REPLACE INTO media_audio_start_times (filename, audio_track, delay_ms) VALUES (?, ?, ?)",
-            (filename, audio_track_index, delay_ms)
-        )
-        conn.commit()
+    # cut from the decoded track when it's cached instead of demuxing the source again
+    input_path = source_path
+    input_map = f"0:{audio_track_index}"
+    cached_track = audio_cache.get_cached_track(source_path, audio_track_index)
+    if cached_track:
+        log_command(f"cutting from cached audio track: {cached_track}")
+        input_path = cached_track
+        input_map = "0:0"
 
     # build ffmpeg command using delay_ms
     cmd = [
         ffmpeg_path, "-y",
         "-ss", start,
-        "-i", source_path,
-        "-map", f"0:{audio_track_index}",
+        "-i", input_path,
+        "-map", input_map,
         "-t", str(duration_sec),
     ]
 
     filters = []
 
     if normalize_audio and int(lufs) < 1:
-        filters.append(f"loudnorm=I={lufs}:TP=-1.5:LRA=11")
+        filters.append(get_clip_loudness_filter(source_path, audio_track_index, lufs))
 
     if filters:
         cmd += ["-af", ",".join(filters)]
@@ -1268,6 +1182,35 @@ def create_ffmpeg_extract_audio_command(source_path, start_time, end_time, colle
     return cmd
 
 
+# a clip gets the linear gain that brings its source stream to the target, measured once per stream
+# until the background measurement is stored, the clip is normalized on its own with single-pass loudnorm
+def get_clip_loudness_filter(source_path, stream_index, lufs):
+    measured = manage_database.get_or_request_loudness(source_path, stream_index)
+    if measured is None:
+        return f"loudnorm=I={lufs}:TP={LOUDNESS_TRUE_PEAK}:LRA=11"
+
+    gain = float(lufs) - measured["integrated"]
+    gain_filter = f"volume={gain:.2f}dB"
+    if measured["true_peak"] + gain <= LOUDNESS_TRUE_PEAK:
+        return gain_filter
+    # only the peaks the gain pushes over the ceiling get limited
+    limit = 10 ** (LOUDNESS_TRUE_PEAK / 20)
+    # latency compensation keeps the lookahead from delaying the clip and cutting off its end under -t
+    return f"{gain_filter},alimiter=limit={limit:.4f}:level=false:latency=1"
+
+
+# second loudnorm pass from a first pass measurement, lra is kept at least as wide as the input so it can stay linear
+def get_measured_loudnorm_filter(lufs, measured):
+    if measured is None:
+        return f"loudnorm=I={lufs}:TP={LOUDNESS_TRUE_PEAK}:LRA=11"
+    lra = min(max(11, math.ceil(measured["lra"])), 50)
+    return (
+        f"loudnorm=I={lufs}:TP={LOUDNESS_TRUE_PEAK}:LRA={lra}"
+        f":measured_I={measured['integrated']}:measured_TP={measured['true_peak']}"
+        f":measured_LRA={measured['lra']}:measured_thresh={measured['threshold']}:linear=true"
+    )
+
+
 def ffmpeg_extract_full_audio(source_file_path, config, note_type_name) -> str:
     ffmpeg_path, _ = constants.get_ffmpeg_exe_path()
     audio_ext = config[note_type_name]["audio_ext"]
@@ -1313,14 +1256,23 @@ def create_just_normalize_audio_command(source_path, config, note_type_name):
     base, file_extension = os.path.splitext(source_path)
     ext_no_dot = file_extension[1:].lower()
 
+    # the stream is mapped explicitly so it's the one the stored measurement belongs to
+    streams = manage_database.get_media_streams(source_path, "audio")
+    if not streams:
+        log_error(f"No audio stream found in: {source_path}")
+        return ""
+    stream_index = streams[0]["index"]
+
     if lufs != -1:
         new_collection_path = f"{base}`{lufs}LUFS{file_extension}"
-        filter_args = ["-af", f"loudnorm=I={lufs}:TP=-1.5:LRA=11"]
+        # measuring decodes the whole file, until the background measurement is stored it's single-pass loudnorm
+        measured = manage_database.get_or_request_loudness(source_path, stream_index)
+        filter_args = ["-af", get_measured_loudnorm_filter(lufs, measured)]
     else:
         new_collection_path = f"{base}.{file_extension}"
         filter_args = []
 
-    cmd = [ffmpeg_path, "-y", "-i", source_path] + filter_args
+    cmd = [ffmpeg_path, "-y", "-i", source_path, "-map", f"0:{stream_index}"] + filter_args
 
     if ext_no_dot == "mp3":
         cmd += ["-c:a", "libmp3lame"]
@@ -1357,44 +1309,13 @@ def is_backtick_format(sound_line: str) -> bool:
     return '`' in sound_line and '-' in sound_line and ']' in sound_line
 
 
-def get_audio_start_time_ms_from_db(filename, conn):
-    cursor = conn.execute(
-        "SELECT delay_ms FROM media_audio_start_times WHERE filename = ?",
-        (filename,)
-    )
-    row = cursor.fetchone()
-    return row[0] if row else None
-
-
-def set_audio_start_time_ms_in_db(filename, delay_ms, conn):
-    conn.execute(
-        "INSERT OR REPLACE INTO media_audio_start_times (filename, delay_ms) VALUES (?, ?)",
-        (filename, delay_ms)
-    )
-    conn.commit()
-
-
-# todo deprecate
+# start time of the first audio stream
 def get_audio_start_time_ms(source_file_path: str) -> int:
-    if not os.path.exists(source_file_path):
-        log_error(f"[skip] file missing: {source_file_path}")
-        return 0
-
-    _, ffprobe_path = constants.get_ffmpeg_exe_path()
-    cmd = [
-        ffprobe_path, "-v", "error",
-        "-select_streams", "a:0",
-        "-show_packets", "-read_intervals", "0%+#5",
-        "-print_format", "compact", source_file_path
-    ]
-    try:
-        result = constants.silent_run(cmd, capture_output=True, text=True, check=True)
-        log_command(f"ffprobe output: {result.stdout.strip()}")
-        match = re.search(r"pts_time=(\d+(?:\.\d+)?)", result.stdout)
-        return round(float(match.group(1)) * 1000) if match else 0
-    except Exception as e:
-        log_error(f"ffprobe failed: {e}")
+    streams = manage_database.get_media_streams(source_file_path, "audio")
+    if not streams:
+        log_error(f"[skip] no audio streams found: {source_file_path}")
         return 0
+    return streams[0]["start_ms"]
 
 
 def timestamp_to_dot_format(ts: str) -> str:
@@ -1619,9 +1540,6 @@ def alter_sound_file_times(altered_data, sound_line, config, use_translation_dat
     if not altered_data["old_path"]:
         return None
 
-    if os.path.exists(altered_data["old_path"]):
-        send2trash(altered_data["old_path"])
-
     full_source_filename = altered_data["full_source_filename"]
     log_filename(f"4: full source filename: {full_source_filename}")
     source_path = get_source_path_from_full_filename(full_source_filename)
@@ -1629,11 +1547,35 @@ def alter_sound_file_times(altered_data, sound_line, config, use_translation_dat
         log_error(f"Source file not found for: {full_source_filename}.")
         return None
 
+    old_path = altered_data["old_path"]
+    new_path = altered_data["new_path"]
+    new_sound_line = f"[sound:{altered_data['new_filename']}]"
+    params_hash = get_audio_params_hash(source_path, altered_data, config, use_translation_data, note_type_name,
+                                        corresponding_audio_track_count)
+
+    # the old clip is only replaced when it's a different file, regenerating one in place overwrites it
+    if old_path != new_path:
+        if media_jobs.is_pending(old_path):
+            # the previous clip is still being written, trash it once it exists
+            media_jobs.when_ready(old_path, lambda succeeded: send2trash(old_path) if os.path.exists(old_path) else None)
+        elif os.path.exists(old_path):
+            send2trash(old_path)
+
+    # a clip made from the same parameters is already in the collection, unchanged or shared with another note
+    if not media_jobs.is_pending(new_path) and manage_database.is_generated_media_current(new_path, params_hash):
+        log_filename(f"reusing generated clip: {altered_data['new_filename']}")
+        return new_sound_line
+
+    # a timing change rendered ahead of time only has to be moved into the collection
+    if timing_variants.take_variant(altered_data["new_filename"], new_path, params_hash):
+        manage_database.record_generated_media(new_path, params_hash)
+        return new_sound_line
+
     cmd = create_ffmpeg_extract_audio_command(
         source_path,
         altered_data["new_start_time"],
         altered_data["new_end_time"],
-        altered_data["new_path"],
+        new_path,
         sound_line,
         config,
         extract_sound_line_data(altered_data["new_sound_line"]),
@@ -1646,61 +1588,83 @@ def alter_sound_file_times(altered_data, sound_line, config, use_translation_dat
         log_error(f"command was not generated")
         return None
 
-    # run without freezing anki
-    def run_ffmpeg():
-        try:
-            log_filename(f"generating new sound file: {altered_data['new_path']}")
-            log_filename(f"Running FFmpeg command: {' '.join(cmd)}")
-            result = constants.silent_run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
-            if result.returncode != 0:
-                log_error(f"FFmpeg failed:\n{result.stderr}")
-                return
-            log_command(f"FFmpeg output:\n{result.stdout}")
-        except Exception as e:
-            log_error(f"FFmpeg error: {e}")
-            return
-
-        if not os.path.exists(altered_data["new_path"]):
-            log_error(f"Expected output file not found: {altered_data['new_path']}")
-
-    # wait until file is generated to return
-    def run_and_wait():
-        run_ffmpeg()
-        for _ in range(80):
-            if os.path.exists(altered_data["new_path"]):
-                break
-            time.sleep(0.05)
-
-    thread = threading.Thread(target=run_and_wait)
-    thread.start()
-    thread.join(timeout=4)  # won't freeze Anki UI
-    return f"[sound:{altered_data['new_filename']}]"
+    def on_done(succeeded):
+        if succeeded:
+            manage_database.record_generated_media(new_path, params_hash)
 
+    # bulk runs extract every clip of a source file together later
+    if ffmpeg_batch.queue_command(cmd, source_path, new_path, on_done):
+        return new_sound_line
 
-def audio_language_exists_in_file(full_source_path, requested_lang):
-    _, ffprobe_exe = constants.get_ffmpeg_exe_path()
-
-    command = [
-        ffprobe_exe,
-        "-v", "error",
-        "-select_streams", "a",
-        "-show_entries", "stream=index:stream_tags=language",
-        "-of", "json",
-        full_source_path
-    ]
+    # written in the background, playback waits for the file and the editor takes the tag out again if it fails
+    # off the GUI thread the command has already run, like before a failed clip returns None
+    log_filename(f"generating new sound file: {new_path}")
+    media_jobs.submit(cmd, new_path, on_done)
+    if not media_jobs.is_pending(new_path) and not os.path.exists(new_path):
+        return None
+    return new_sound_line
+
+
+# everything that decides a clip's contents besides the source file, the timings and lufs are in its filename
+# a normalized clip is cut with single-pass loudnorm until its stream is measured and with a fixed gain after,
+# so the measured streams are part of the hash and a clip cut before the measurement is made again
+def get_audio_params_hash(source_path, altered_data, config, use_translation_data, note_type_name,
+                          corresponding_audio_track_count):
+    note_type_config = config.get(note_type_name, {})
+    params = [altered_data["new_filename"], bool(use_translation_data), corresponding_audio_track_count]
+    params += [note_type_config.get(key) for key in AUDIO_PARAM_KEYS]
+    if note_type_config.get("normalize_audio", True) and int(note_type_config.get("lufs", -14)) < 1:
+        params.append(manage_database.get_measured_streams(source_path))
+    return manage_database.hash_media_params(source_path, params)
+
+
+# renders the clips the timing buttons would produce next, plain and with ctrl held, in the background
+def prerender_timing_variants(sound_line, config, use_translation_data, note_type_name, corresponding_audio_track_count):
+    data = extract_sound_line_data(sound_line)
+    if not data:
+        return
+    source_path = get_source_path_from_full_filename(data["full_source_filename"])
+    if not source_path:
+        return
+
+    start_ms = time_hmsms_to_milliseconds(data["start_time"])
+    end_ms = time_hmsms_to_milliseconds(data["end_time"])
+    variants = []
+    for amount in (constants.ms_amount, constants.ms_amount * 10):
+        for lengthen_start, lengthen_end in ((amount, 0), (-amount, 0), (0, amount), (0, -amount)):
+            # skip the ones the buttons would reject or clamp to the current clip
+            new_start_ms = start_ms - lengthen_start
+            if new_start_ms < 0 or end_ms + lengthen_end <= new_start_ms:
+                continue
+            altered_data = get_altered_sound_data(sound_line, lengthen_start, lengthen_end, config, data, note_type_name)
+            if not altered_data or not altered_data["new_filename"]:
+                continue
+            variant_path = os.path.join(timing_variants.variants_folder, altered_data["new_filename"])
+            params_hash = get_audio_params_hash(source_path, altered_data, config, use_translation_data, note_type_name,
+                                                corresponding_audio_track_count)
+
+            def make_cmd(altered_data=altered_data, variant_path=variant_path):
+                return create_ffmpeg_extract_audio_command(
+                    source_path,
+                    altered_data["new_start_time"],
+                    altered_data["new_end_time"],
+                    variant_path,
+                    altered_data["new_sound_line"],
+                    config,
+                    extract_sound_line_data(altered_data["new_sound_line"]),
+                    use_translation_data,
+                    note_type_name,
+                    corresponding_audio_track_count
+                )
 
-    result = constants.silent_run(command, capture_output=True, text=True)
-    if not result:
-        return False
+            variants.append((altered_data["new_filename"], params_hash, make_cmd))
 
-    try:
-        data = json.loads(result.stdout)
-        streams = data.get("streams", [])
-        for stream in streams:
-            language = stream.get("tags", {}).get("language")
-            if language == requested_lang:
-                return True
-    except Exception:
+    timing_variants.render(variants)
+
+
+def audio_language_exists_in_file(full_source_path, requested_lang):
+    streams = manage_database.get_media_streams(full_source_path, "audio")
+    if not streams:
         return False
 
-    return False
+    return any(stream["language"] == requested_lang for stream in streams)
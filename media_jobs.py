@@ -0,0 +1,136 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aqt.sound import play
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from . import constants
+from .constants import log_command, log_error
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+# ffmpeg commands started from the editor, run off the GUI thread
+# completion is sent back to the GUI thread by a signal, where the callbacks waiting on the output run
+class MediaJobQueue(QObject):
+    job_finished = pyqtSignal(str, bool)
+
+    def __init__(self, max_workers):
+        super().__init__()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media_jobs")
+        self.lock = threading.Lock()
+        # output path -> callbacks(succeeded) waiting on it, a path stays here until its callbacks have run
+        self.pending = {}
+        self.job_finished.connect(self.on_job_finished)
+
+    def submit(self, cmd, output_path, on_done=None):
+        output_path = os.path.abspath(output_path)
+        with self.lock:
+            duplicate = output_path in self.pending
+            callbacks = self.pending.setdefault(output_path, [])
+            if on_done is not None:
+                callbacks.append(on_done)
+        # the same output requested again is only written once
+        if duplicate:
+            log_command(f"already writing {output_path}, not queued again")
+            return
+        self.executor.submit(self.run_job, cmd, output_path)
+
+    def run_job(self, cmd, output_path):
+        self.job_finished.emit(output_path, run_command(cmd, output_path))
+
+    def on_job_finished(self, output_path, succeeded):
+        with self.lock:
+            callbacks = self.pending.pop(output_path, [])
+        for callback in callbacks:
+            try:
+                callback(succeeded)
+            except Exception as e:
+                log_error(f"Media job callback for {output_path} failed: {e}")
+
+    def is_pending(self, path):
+        with self.lock:
+            return os.path.abspath(path) in self.pending
+
+    # calls callback(succeeded) once the file at path is written, right away if nothing is writing it
+    # succeeded is False when the file doesn't exist, whether its job failed or it was never written
+    def when_ready(self, path, callback):
+        path = os.path.abspath(path)
+        with self.lock:
+            if path in self.pending:
+                self.pending[path].append(callback)
+                return
+        callback(os.path.exists(path))
+
+
+def run_command(cmd, output_path):
+    try:
+        log_command(f"[media job]\n{' '.join(cmd)}")
+        result = constants.silent_run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+        if result.returncode != 0:
+            log_error(f"FFmpeg failed:\n{result.stderr}")
+            return False
+    except Exception as e:
+        log_error(f"FFmpeg error: {e}")
+        return False
+
+    if not os.path.exists(output_path):
+        log_error(f"Expected output file not found: {output_path}")
+        return False
+    return True
+
+
+def get_worker_count():
+    try:
+        workers = int(constants.load_config().get("media_job_workers", 2))
+    except (TypeError, ValueError):
+        workers = 2
+    return max(workers, 1)
+
+
+# the queue belongs to the GUI thread, so it's only created there
+def get_queue():
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = MediaJobQueue(get_worker_count())
+        return _queue
+
+
+def on_gui_thread():
+    return threading.current_thread() is threading.main_thread()
+
+
+# runs cmd in the background and calls on_done(succeeded) on the GUI thread when output_path is written
+# off the GUI thread there's nothing to keep responsive, so the command runs right away
+def submit(cmd, output_path, on_done=None):
+    if not on_gui_thread():
+        succeeded = run_command(cmd, output_path)
+        if on_done is not None:
+            on_done(succeeded)
+        return
+    get_queue().submit(cmd, output_path, on_done)
+
+
+def is_pending(path):
+    return _queue is not None and _queue.is_pending(path)
+
+
+def when_ready(path, callback):
+    if _queue is None:
+        callback(os.path.exists(path))
+        return
+    _queue.when_ready(path, callback)
+
+
+# plays a sound from the collection once its clip has been written
+def play_when_ready(filename):
+    def on_ready(succeeded):
+        if succeeded:
+            play(filename)
+        else:
+            log_error(f"Not playing {filename}, the clip could not be created")
+
+    when_ready(os.path.join(constants.get_collection_dir(), filename), on_ready)
@@ -45,11 +45,8 @@ from aqt.qt import *
 
 
 def create_default_config():
-    config_file_path = os.path.join(constants.addon_dir, "config.json")
-
-    if not os.path.exists(config_file_path):
-        with open(config_file_path, "w", encoding="utf-8") as f:
-            json.dump(constants.default_settings, f, indent=2)
+    # loading the shared config creates the file with defaults if it's missing
+    constants.load_config()
     return constants.default_settings
 
 class ConfigManager:
@@ -58,20 +55,13 @@ class ConfigManager:
         self.data = {"fields": [], "mapped_fields": {}}
         self.load()
 
+    # reads from the config shared with the rest of the add-on
     def load(self) -> dict:
-        if os.path.exists(self.config_path):
-            try:
-                with open(self.config_path, "r", encoding="utf-8") as f:
-                    self.data = json.load(f)
-            except Exception:
-                self.data = {"fields": [], "mapped_fields": {}}
-        else:
-            self.data = {"fields": [], "mapped_fields": {}}
+        self.data = constants.extract_config_data()
         return self.data
 
     def save(self) -> None:
-        with open(self.config_path, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2)
+        constants.save_config_data(self.data)
 
 
 
@@ -101,17 +91,7 @@ class AudioToolsDialog(QDialog):
 
 
     def load_settings(self):
-        config_file_path = os.path.join(constants.addon_dir, "config.json")
-        if not os.path.exists(config_file_path):
-            print("No config.json found, creating default config.")
-            config = create_default_config()
-        else:
-            try:
-                with open(config_file_path, "r", encoding="utf-8") as f:
-                    config = json.load(f)
-            except Exception as e:
-                print(f"Invalid config.json, resetting to defaults. Error: {e}")
-                config = create_default_config()
+        config = constants.extract_config_data()
 
         default_settings = create_default_config()
 
@@ -303,10 +283,8 @@ class AudioToolsDialog(QDialog):
         def reload_database_button():
             tooltip("Reloading database...")
 
-            db_path = os.path.join(constants.addon_dir, "subtitles_index.db")
-
             try:
-                os.remove(db_path)
+                manage_database.delete_database()
             except PermissionError:
                 tooltip(f"Cannot reload, database currently in use.")
             except FileNotFoundError:
@@ -984,6 +962,12 @@ def add_audio_tools_menu():
     action.triggered.connect(lambda: open_audio_tools_dialog(False))
     menu_bar.addAction(action)
 
+    # only shown while profiling, dumps the summary to debug.log and shows it
+    if constants.profiling_enabled:
+        profile_action = QAction("Audio Tools Profile", mw)
+        profile_action.triggered.connect(lambda: showInfo(constants.dump_profile_summary(), textFormat="plain"))
+        menu_bar.addAction(profile_action)
+
 add_audio_tools_menu()
 
 
@@ -1124,9 +1108,7 @@ def on_profile_loaded():
     gui_hooks.editor_did_load_note.append(wrapped)
 
 def save_config(cfg: dict) -> None:
-    path = os.path.join(constants.addon_dir, "config.json")
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, indent=2)
+    constants.save_config_data(cfg)
 
 def handle_autoplay_toggle_and_save(editor: Editor):
     # flip editor state
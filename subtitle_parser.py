@@ -0,0 +1,293 @@
+import codecs
+import io
+import os
+import re
+from collections import Counter, namedtuple
+
+from .constants import log_error
+
+# one subtitle line, timings are milliseconds from the start of the media
+SubtitleBlock = namedtuple("SubtitleBlock", ["index", "start_ms", "end_ms", "text"])
+
+# srt and webvtt cue timings, webvtt can leave out the hours and puts cue settings after the end time
+TIMING_LINE_PATTERN = re.compile(
+    r"\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{2})[,.](\d{1,3})"
+)
+# 00:01:02,345, 00:01:02.345, the 00.01.02.345 of old stored blocks and the 0:01:02.34 of ass
+TIME_PATTERN = re.compile(r"\s*(\d+)[:.](\d{2})[:.](\d{2})[,.](\d{1,3})")
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+OVERRIDE_TAG_PATTERN = re.compile(r"{[^{}]*}")
+BRACKETED_PATTERN = re.compile(r"[\[\(].*?[\]\)]")
+ASS_LINE_BREAK_PATTERN = re.compile(r"\\[Nnh]")
+# \p1 and up switch an override block to drawing mode, unlike \pos and \pbo
+ASS_DRAWING_PATTERN = re.compile(r"{[^}]*\\p[1-9]")
+# events without a Format line use the standard v4+ field order
+ASS_DEFAULT_FIELDS = ["layer", "start", "end", "style", "name", "marginl", "marginr", "marginv", "effect", "text"]
+ass_extensions = {".ass", ".ssa"}
+# milliseconds per unit of a 1, 2 or 3 digit fraction of a second
+FRACTION_SCALE = (0, 100, 10, 1)
+
+# matroska element ids read by iter_matroska_blocks
+MKV_SEGMENT = 0x18538067
+MKV_INFO = 0x1549A966
+MKV_TIMESTAMP_SCALE = 0x2AD7B1
+MKV_CLUSTER = 0x1F43B675
+MKV_CLUSTER_TIMESTAMP = 0xE7
+MKV_BLOCK_GROUP = 0xA0
+MKV_BLOCK = 0xA1
+MKV_SIMPLE_BLOCK = 0xA3
+MKV_BLOCK_DURATION = 0x9B
+# elements whose children are read, every other element is skipped
+MKV_CONTAINERS = {MKV_SEGMENT, MKV_INFO, MKV_CLUSTER, MKV_BLOCK_GROUP}
+# how long the last block of a track is shown when it has no duration and no block follows it
+MKV_LAST_BLOCK_DURATION_MS = 2000
+
+
+def to_milliseconds(hours, minutes, seconds, fraction):
+    return int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000 + int(fraction) * FRACTION_SCALE[len(fraction)]
+
+
+# returns None if value isn't a time
+def time_to_milliseconds(value):
+    match = TIME_PATTERN.match(str(value))
+    if not match:
+        return None
+    return to_milliseconds(*match.groups())
+
+
+def milliseconds_to_srt_time(ms):
+    hours, ms = divmod(ms, 3600 * 1000)
+    minutes, ms = divmod(ms, 60 * 1000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def remove_subtitle_formatting(text: str) -> str:
+    # ass drawings aren't text
+    if ASS_DRAWING_PATTERN.search(text):
+        return ''
+
+    text = HTML_TAG_PATTERN.sub('', text)
+    text = OVERRIDE_TAG_PATTERN.sub('', text)
+    text = BRACKETED_PATTERN.sub('', text)
+    return text.strip()
+
+
+# (start_ms, end_ms) of a TIMING_LINE_PATTERN match
+def timing_to_milliseconds(match):
+    h1, m1, s1, f1, h2, m2, s2, f2 = match.groups()
+    return (
+        int(h1 or 0) * 3600000 + int(m1) * 60000 + int(s1) * 1000 + int(f1) * FRACTION_SCALE[len(f1)],
+        int(h2 or 0) * 3600000 + int(m2) * 60000 + int(s2) * 1000 + int(f2) * FRACTION_SCALE[len(f2)],
+    )
+
+
+# yields blocks from srt or webvtt read line by line, so a pipe can be parsed while it's written
+# a block is a timing line and the text lines up to the next blank line, the srt index or webvtt cue id before it is skipped
+# webvtt headers, NOTE and STYLE blocks have no timing line and are skipped too
+def iter_srt_blocks(lines):
+    index = 1
+    timing = None
+    text_lines = []
+    for line in lines:
+        line = line.rstrip()
+        if line:
+            if timing is not None:
+                text_lines.append(line.lstrip())
+            elif "-->" in line:
+                timing = TIMING_LINE_PATTERN.match(line)
+            continue
+
+        if timing is not None and text_lines:
+            start_ms, end_ms = timing_to_milliseconds(timing)
+            yield SubtitleBlock(index, start_ms, end_ms, " ".join(text_lines))
+            index += 1
+        timing = None
+        text_lines = []
+
+    if timing is not None and text_lines:
+        start_ms, end_ms = timing_to_milliseconds(timing)
+        yield SubtitleBlock(index, start_ms, end_ms, " ".join(text_lines))
+
+
+# yields the Dialogue events of an ass or ssa script in time order, line breaks in the text become spaces
+def iter_ass_blocks(lines):
+    in_events = False
+    fields = ASS_DEFAULT_FIELDS
+    events = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("["):
+            in_events = line.lower() == "[events]"
+            continue
+        if not in_events:
+            continue
+        if line.startswith("Format:"):
+            fields = [field.strip().lower() for field in line[len("Format:"):].split(",")]
+            continue
+        if not line.startswith("Dialogue:"):
+            continue
+
+        # only the last field, the text, can contain commas
+        values = line[len("Dialogue:"):].split(",", len(fields) - 1)
+        if len(values) < len(fields):
+            continue
+        event = dict(zip(fields, values))
+        start_ms = time_to_milliseconds(event.get("start", ""))
+        end_ms = time_to_milliseconds(event.get("end", ""))
+        if start_ms is None or end_ms is None:
+            continue
+        events.append((start_ms, end_ms, ASS_LINE_BREAK_PATTERN.sub(" ", event.get("text", "")).strip()))
+
+    events.sort(key=lambda event: event[0])
+    for index, (start_ms, end_ms, text) in enumerate(events, 1):
+        yield SubtitleBlock(index, start_ms, end_ms, text)
+
+
+# reads an ebml variable length number, raises EOFError at the end of the stream
+# an element id keeps its length marker, a size doesn't and is None when it's unknown
+def read_ebml_number(stream, keep_marker=False):
+    first = stream.read(1)
+    if not first:
+        raise EOFError
+    length = 9 - first[0].bit_length()
+    if length > 8:
+        raise ValueError("invalid ebml number")
+    rest = stream.read(length - 1)
+    if len(rest) < length - 1:
+        raise EOFError
+    value = first[0] if keep_marker else first[0] & (0xFF >> length)
+    for byte in rest:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None
+    return value
+
+
+# yields (track_number, SubtitleBlock) from a matroska stream of text subtitles as it's read, so a pipe can be parsed while it's written
+# ffmpeg numbers the tracks from 1 in the order of its -map options, the blocks of each track are numbered from 1
+# a block is complete once its duration is read, a block without one ends where the next block of its track starts
+def iter_matroska_blocks(stream):
+    timestamp_scale = 1000000
+    cluster_timestamp = 0
+    # the last block read, its duration can still follow in the same block group
+    pending = None
+    # blocks without a duration by track, waiting for the start of the track's next block
+    open_blocks = {}
+    indexes = Counter()
+
+    def to_ms(timestamp):
+        return timestamp * timestamp_scale // 1000000
+
+    def make_block(track, start_ms, end_ms, text):
+        if not text:
+            return None
+        indexes[track] += 1
+        return track, SubtitleBlock(indexes[track], start_ms, end_ms, text)
+
+    def close_pending():
+        nonlocal pending
+        if pending is not None:
+            track, timestamp, text = pending
+            open_blocks[track] = (timestamp, text)
+            pending = None
+
+    while True:
+        try:
+            element_id = read_ebml_number(stream, keep_marker=True)
+        except EOFError:
+            break
+        try:
+            size = read_ebml_number(stream)
+        except EOFError:
+            return
+        # the segment written to a pipe has an unknown size, its children follow either way
+        if element_id in MKV_CONTAINERS or size is None:
+            continue
+        data = stream.read(size)
+        if len(data) < size:
+            return
+
+        if element_id == MKV_TIMESTAMP_SCALE:
+            timestamp_scale = int.from_bytes(data, "big")
+        elif element_id == MKV_CLUSTER_TIMESTAMP:
+            # a block group never spans clusters, so the last block's duration won't follow anymore
+            close_pending()
+            cluster_timestamp = int.from_bytes(data, "big")
+        elif element_id in (MKV_BLOCK, MKV_SIMPLE_BLOCK):
+            close_pending()
+            block = io.BytesIO(data)
+            track = read_ebml_number(block)
+            timestamp = cluster_timestamp + int.from_bytes(block.read(2), "big", signed=True)
+            # the flags byte, text blocks aren't laced
+            block.read(1)
+            lines = block.read().decode("utf-8", errors="replace").splitlines()
+            if track in open_blocks:
+                open_timestamp, open_text = open_blocks.pop(track)
+                made = make_block(track, to_ms(open_timestamp), to_ms(timestamp), open_text)
+                if made:
+                    yield made
+            pending = (track, timestamp, " ".join(line.strip() for line in lines if line.strip()))
+        elif element_id == MKV_BLOCK_DURATION and pending is not None:
+            track, timestamp, text = pending
+            pending = None
+            made = make_block(track, to_ms(timestamp), to_ms(timestamp + int.from_bytes(data, "big")), text)
+            if made:
+                yield made
+
+    # the stream ended cleanly, the blocks still waiting for a next block are the last of their tracks
+    close_pending()
+    for track, (timestamp, text) in open_blocks.items():
+        made = make_block(track, to_ms(timestamp), to_ms(timestamp) + MKV_LAST_BLOCK_DURATION_MS, text)
+        if made:
+            yield made
+
+
+def iter_blocks(lines, ass=False):
+    return iter_ass_blocks(lines) if ass else iter_srt_blocks(lines)
+
+
+# removes formatting and lines left empty, and renumbers what's left from 1
+# repeated timings drops lines sharing their timing with 3 or more others, like karaoke and typeset signs
+def clean_blocks(blocks, drop_repeated_timings=False):
+    blocks = list(blocks)
+    timing_counts = Counter((block.start_ms, block.end_ms) for block in blocks) if drop_repeated_timings else None
+    cleaned = []
+    for block in blocks:
+        if timing_counts is not None and timing_counts[(block.start_ms, block.end_ms)] >= 4:
+            continue
+        text = remove_subtitle_formatting(block.text)
+        if text:
+            cleaned.append(SubtitleBlock(len(cleaned) + 1, block.start_ms, block.end_ms, text))
+    return cleaned
+
+
+def parse_subtitle_text(text, ass=None):
+    if ass is None:
+        ass = "[Events]" in text
+    return clean_blocks(iter_blocks(text.splitlines(), ass))
+
+
+# files are utf-8 unless they start with a byte order mark
+def read_subtitle_file(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode("utf-8", errors="replace")
+    if data.startswith(codecs.BOM_UTF16_LE) or data.startswith(codecs.BOM_UTF16_BE):
+        return data.decode("utf-16", errors="replace")
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        log_error(f"{path} isn't utf-8, unreadable characters are replaced")
+        return data.decode("utf-8", errors="replace")
+
+
+# parses a user placed .srt, .vtt, .ass or .ssa file, returns None if it can't be read
+def parse_subtitle_file(path):
+    try:
+        text = read_subtitle_file(path)
+    except OSError as e:
+        log_error(f"Could not read subtitle file {path}: {e}")
+        return None
+    return parse_subtitle_text(text, os.path.splitext(path)[1].lower() in ass_extensions)
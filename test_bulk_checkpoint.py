@@ -0,0 +1,151 @@
+import os
+import subprocess
+import types
+
+import testing_support
+
+button_actions = testing_support.load("button_actions")
+constants = testing_support.load("constants")
+ffmpeg_batch = testing_support.load("ffmpeg_batch")
+
+DECK = {"id": 1, "name": "Japanese"}
+
+
+class FakeCollection:
+    def __init__(self):
+        self.saved = []
+
+    def get_note(self, note_id):
+        return types.SimpleNamespace(id=note_id)
+
+    def update_notes(self, notes):
+        self.saved.extend(notes)
+
+
+class FakeProgress:
+    def setValue(self, value):
+        pass
+
+    def setLabelText(self, text):
+        pass
+
+
+def new_run(note_ids, done=()):
+    run = button_actions.BulkGenerateRun(DECK, "Basic", note_ids, set(done))
+    run.progress = FakeProgress()
+    return run
+
+
+def test_checkpoint_round_trip():
+    button_actions.save_bulk_checkpoint(1, "Basic", {3, 1, 2})
+    assert button_actions.load_bulk_checkpoint(1, "Basic") == {1, 2, 3}
+    # a checkpoint only resumes the same deck and note type
+    assert button_actions.load_bulk_checkpoint(2, "Basic") == set()
+    assert button_actions.load_bulk_checkpoint(1, "Cloze") == set()
+    button_actions.clear_bulk_checkpoint()
+    assert button_actions.load_bulk_checkpoint(1, "Basic") == set()
+    button_actions.clear_bulk_checkpoint()
+
+
+def test_unreadable_checkpoint():
+    with open(constants.bulk_checkpoint_path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert button_actions.load_bulk_checkpoint(1, "Basic") == set()
+    button_actions.clear_bulk_checkpoint()
+
+
+def test_resume_skips_done_notes():
+    run = new_run([1, 2, 3, 4], done={2, 4})
+    assert run.note_ids == [1, 3]
+    assert run.total == 4
+
+
+# only notes that were filled are checkpointed, failed ones are retried on the next run
+def test_failed_notes_are_not_checkpointed():
+    outcomes = {
+        1: ("clip.mp3", True),
+        2: (None, None),
+        3: ValueError("broken note"),
+        4: ("clip.mp3", False),
+    }
+
+    def fake_generate(editor, note, should_overwrite, pending_updates=None):
+        outcome = outcomes[note.id]
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome[1] is not None:
+            pending_updates.append(note)
+        return outcome
+
+    original_generate, original_mw = button_actions.generate_and_update_fields, button_actions.aqt.mw
+    button_actions.generate_and_update_fields = fake_generate
+    button_actions.aqt.mw = types.SimpleNamespace(col=FakeCollection())
+    try:
+        run = new_run(list(outcomes))
+        pending_updates = []
+        results = [run.resolve_note(note_id, None, pending_updates) for note_id in outcomes]
+        assert results == [True, False, False, True]
+
+        processed = [note_id for note_id, resolved in zip(outcomes, results) if resolved]
+        run.apply_updates(processed, pending_updates)
+        assert run.done == {1, 4}
+        assert [note.id for note in button_actions.aqt.mw.col.saved] == [1, 4]
+        assert button_actions.load_bulk_checkpoint(1, "Basic") == {1, 4}
+
+        run.cancelled.set()
+        assert run.resolve_note(2, None, []) is None
+    finally:
+        button_actions.generate_and_update_fields = original_generate
+        button_actions.aqt.mw = original_mw
+        button_actions.clear_bulk_checkpoint()
+
+
+# a note whose queued clip isn't written by the batch is neither saved nor checkpointed
+def test_failed_batch_jobs_are_not_checkpointed():
+    tmp_dir = testing_support.temp_dir()
+    source_path = os.path.join(tmp_dir, "source.mkv")
+
+    def fake_generate(editor, note, should_overwrite, pending_updates=None):
+        output_path = os.path.join(tmp_dir, f"{note.id}.mp3")
+        cmd = ["ffmpeg", "-y", "-ss", "1.0", "-i", source_path, "-map", "0:a:0", output_path]
+        assert ffmpeg_batch.queue_command(cmd, source_path, output_path)
+        pending_updates.append(note)
+        return output_path, True
+
+    # the batched run fails, then every clip but note 2's is written on its own
+    def silent_run(cmd, **kwargs):
+        output_path = cmd[-1]
+        if cmd.count("-i") > 1 or output_path.endswith("2.mp3"):
+            return subprocess.CompletedProcess(cmd, 1, "", "error")
+        with open(output_path, "wb") as f:
+            f.write(b"clip")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    original_generate, original_run = button_actions.generate_and_update_fields, constants.silent_run
+    original_mw = button_actions.aqt.mw
+    button_actions.generate_and_update_fields = fake_generate
+    constants.silent_run = silent_run
+    button_actions.aqt.mw = types.SimpleNamespace(
+        col=FakeCollection(), taskman=types.SimpleNamespace(run_on_main=lambda callback: callback())
+    )
+    try:
+        run = new_run([1, 2, 3])
+        batch = ffmpeg_batch.FFmpegBatch()
+        pending_updates = []
+        results = [run.resolve_note(note_id, batch, pending_updates) for note_id in run.note_ids]
+        assert results == [True, True, True]
+
+        assert run.extract_and_apply(batch, run.note_ids, pending_updates) == 1
+        assert batch.failed_owners == {2}
+        assert run.done == {1, 3}
+        assert [note.id for note in button_actions.aqt.mw.col.saved] == [1, 3]
+        assert button_actions.load_bulk_checkpoint(1, "Basic") == {1, 3}
+    finally:
+        button_actions.generate_and_update_fields = original_generate
+        constants.silent_run = original_run
+        button_actions.aqt.mw = original_mw
+        button_actions.clear_bulk_checkpoint()
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
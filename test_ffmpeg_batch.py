@@ -0,0 +1,114 @@
+import os
+import subprocess
+
+import testing_support
+
+constants = testing_support.load("constants")
+ffmpeg_batch = testing_support.load("ffmpeg_batch")
+
+
+def clip_command(source_path, start, stream, output_path, codec="libmp3lame"):
+    return [
+        "ffmpeg", "-y", "-ss", start, "-i", source_path, "-map", f"0:{stream}", "-t", "2.5",
+        "-af", "volume=3dB", "-c:a", codec, output_path
+    ]
+
+
+# an ffmpeg that writes every output it's given, failing runs that match fail_when
+def fake_run(calls, fail_when=lambda cmd: False):
+    def silent_run(cmd, **kwargs):
+        calls.append(cmd)
+        if fail_when(cmd):
+            return subprocess.CompletedProcess(cmd, 1, "", "error")
+        for arg in cmd:
+            if arg.endswith(".mp3") or arg.endswith(".m4a"):
+                with open(arg, "wb") as f:
+                    f.write(b"clip")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+    return silent_run
+
+
+# nearby clips of a source share one seek and one decode per audio stream, the rest are seeked inputs
+def test_nearby_clips_are_trimmed_from_one_decode():
+    tmp_dir = testing_support.temp_dir()
+    source_path = os.path.join(tmp_dir, "episode.mkv")
+    batch = ffmpeg_batch.FFmpegBatch()
+    clips = [
+        ("00:00:14.100", 1, "c.mp3", "libmp3lame"),
+        ("00:00:10.250", 1, "a.mp3", "libmp3lame"),
+        ("00:00:10.250", 2, "b.mp3", "libmp3lame"),
+        ("00:05:00.000", 1, "far.mp3", "libmp3lame"),
+        ("00:00:12.000", 1, "copied.m4a", "copy"),
+    ]
+    for start, stream, filename, codec in clips:
+        output_path = os.path.join(tmp_dir, filename)
+        batch.add(clip_command(source_path, start, stream, output_path, codec), source_path, output_path)
+
+    calls = []
+    original_run = constants.silent_run
+    constants.silent_run = fake_run(calls)
+    try:
+        batch.run()
+    finally:
+        constants.silent_run = original_run
+
+    assert batch.completed == 5
+    assert len(calls) == 2
+    trim_cmd = calls[0]
+    assert trim_cmd.count("-i") == 1
+    assert trim_cmd[trim_cmd.index("-ss") + 1] == "00:00:10.250"
+    graph = trim_cmd[trim_cmd.index("-filter_complex") + 1].split(";")
+    assert graph[:2] == ["[0:1]asplit=2[a0][a2]", "[0:2]asplit=1[a1]"]
+    assert graph[4] == "[a2]atrim=start=3.850:duration=2.5,asetpts=PTS-STARTPTS,volume=3dB[o2]"
+    assert "-t" not in trim_cmd and "-af" not in trim_cmd
+    # the lone clip and the stream copy aren't decoded, they stay seeked inputs of one run
+    assert calls[1].count("-i") == 2
+
+
+# a trim run that fails falls back to seeking every clip
+def test_failed_trim_run_seeks_each_clip():
+    tmp_dir = testing_support.temp_dir()
+    source_path = os.path.join(tmp_dir, "episode.mkv")
+    batch = ffmpeg_batch.FFmpegBatch()
+    for n, start in enumerate(["00:00:01.000", "00:00:03.000"]):
+        output_path = os.path.join(tmp_dir, f"{n}.mp3")
+        batch.add(clip_command(source_path, start, 1, output_path), source_path, output_path)
+
+    calls = []
+    original_run = constants.silent_run
+    constants.silent_run = fake_run(calls, lambda cmd: "-filter_complex" in cmd)
+    try:
+        batch.run()
+    finally:
+        constants.silent_run = original_run
+
+    assert batch.completed == 2 and batch.failed == 0
+    assert "-filter_complex" in calls[0]
+    assert calls[1].count("-ss") == 2
+
+
+# an output queued twice is written once, and everything that queued it is told
+def test_output_queued_twice_calls_every_callback():
+    tmp_dir = testing_support.temp_dir()
+    source_path = os.path.join(tmp_dir, "episode.mkv")
+    output_path = os.path.join(tmp_dir, "twice.mp3")
+    batch = ffmpeg_batch.FFmpegBatch()
+    done = []
+    for name in ("first", "second"):
+        batch.add(clip_command(source_path, "00:00:01.000", 1, output_path), source_path, output_path,
+                  lambda succeeded, name=name: done.append((name, succeeded)))
+
+    calls = []
+    original_run = constants.silent_run
+    constants.silent_run = fake_run(calls)
+    try:
+        batch.run()
+    finally:
+        constants.silent_run = original_run
+
+    assert len(calls) == 1 and batch.completed == 1
+    assert done == [("first", True), ("second", True)]
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
@@ -0,0 +1,62 @@
+import os
+
+import testing_support
+
+manage_database = testing_support.load("manage_database")
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+# waits for the writes queued so far, record_generated_media doesn't wait for its insert
+def wait_for_writer():
+    manage_database.run_write(lambda conn: None, transaction=False)
+
+
+def test_params_hash():
+    tmp_dir = testing_support.temp_dir()
+    source_path = write_file(os.path.join(tmp_dir, "source.mkv"), b"video")
+    params = ["mp3", 0, 1500, -16]
+    params_hash = manage_database.hash_media_params(source_path, params)
+    assert manage_database.hash_media_params(source_path, list(params)) == params_hash
+    assert manage_database.hash_media_params(source_path, ["mp3", 0, 1600, -16]) != params_hash
+
+    # a replaced source changes the hash even with the same parameters
+    write_file(source_path, b"another video")
+    assert manage_database.hash_media_params(source_path, params) != params_hash
+
+
+def test_recorded_media_is_current():
+    tmp_dir = testing_support.temp_dir()
+    output_path = write_file(os.path.join(tmp_dir, "clip.mp3"), b"clip")
+    assert not manage_database.is_generated_media_current(output_path, "hash")
+
+    manage_database.record_generated_media(output_path, "hash")
+    wait_for_writer()
+    assert manage_database.is_generated_media_current(output_path, "hash")
+    assert not manage_database.is_generated_media_current(output_path, "other hash")
+
+    # a file replaced by something else isn't reused
+    write_file(output_path, b"edited clip")
+    assert not manage_database.is_generated_media_current(output_path, "hash")
+
+    os.remove(output_path)
+    assert not manage_database.is_generated_media_current(output_path, "hash")
+
+
+def test_missing_output_is_not_recorded():
+    tmp_dir = testing_support.temp_dir()
+    output_path = os.path.join(tmp_dir, "missing.mp3")
+    manage_database.record_generated_media(output_path, "hash")
+    wait_for_writer()
+    row = manage_database.get_database().execute(
+        "SELECT 1 FROM generated_media WHERE filename=?", ("missing.mp3",)
+    ).fetchone()
+    assert row is None
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
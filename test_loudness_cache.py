@@ -0,0 +1,121 @@
+import os
+import subprocess
+from contextlib import contextmanager
+
+import testing_support
+
+manage_database = testing_support.load("manage_database")
+manage_files = testing_support.load("manage_files")
+constants = testing_support.load("constants")
+
+LOUDNORM_OUTPUT = """[Parsed_loudnorm_0 @ 0x5581]
+{
+	"input_i" : "-24.50",
+	"input_tp" : "-3.20",
+	"input_lra" : "14.10",
+	"input_thresh" : "-35.00",
+	"output_i" : "-16.02",
+	"normalization_type" : "dynamic",
+	"target_offset" : "-0.98"
+}
+"""
+
+
+# runs the block with an ffmpeg that prints stderr, yields the commands it was called with
+@contextmanager
+def fake_ffmpeg(stderr, returncode=0):
+    calls = []
+
+    def silent_run(cmd, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, returncode, "", stderr)
+
+    original_run, original_path = constants.silent_run, manage_database.ffmpeg_path
+    constants.silent_run, manage_database.ffmpeg_path = silent_run, "ffmpeg"
+    try:
+        yield calls
+    finally:
+        constants.silent_run, manage_database.ffmpeg_path = original_run, original_path
+
+
+def write_source(path, data=b"audio"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def test_measure_loudness():
+    tmp_dir = testing_support.temp_dir()
+    source_path = os.path.join(tmp_dir, "a.mkv")
+    with fake_ffmpeg(LOUDNORM_OUTPUT) as calls:
+        measured = manage_database.measure_loudness(source_path, 2)
+    assert measured == {"integrated": -24.5, "true_peak": -3.2, "lra": 14.1, "threshold": -35.0}
+    assert calls[0][calls[0].index("-map") + 1] == "0:2"
+
+    # silence measures as -inf and failed runs measure nothing
+    with fake_ffmpeg(LOUDNORM_OUTPUT.replace('"-24.50"', '"-inf"')):
+        assert manage_database.measure_loudness(source_path, 2) is None
+    with fake_ffmpeg("No such file", returncode=1):
+        assert manage_database.measure_loudness(source_path, 2) is None
+
+
+# a measurement is reused until the source file changes
+def test_stored_loudness_follows_the_source():
+    tmp_dir = testing_support.temp_dir()
+    source_path = write_source(os.path.join(tmp_dir, "stored.mkv"))
+    with fake_ffmpeg(LOUDNORM_OUTPUT) as calls:
+        manage_database.measure_and_store_loudness(source_path, 1)
+        manage_database.measure_and_store_loudness(source_path, 1)
+    assert len(calls) == 1
+    assert manage_database.get_stored_loudness(source_path, 1)["integrated"] == -24.5
+    assert manage_database.get_stored_loudness(source_path, 2) is None
+
+    write_source(source_path, b"replaced audio")
+    assert manage_database.get_stored_loudness(source_path, 1) is None
+
+
+def test_clip_loudness_filter():
+    tmp_dir = testing_support.temp_dir()
+    source_path = write_source(os.path.join(tmp_dir, "filter.mkv"))
+    original_request = manage_database.get_or_request_loudness
+    try:
+        manage_database.get_or_request_loudness = lambda path, stream_index: None
+        assert manage_files.get_clip_loudness_filter(source_path, 1, -16).startswith("loudnorm=I=-16:")
+
+        measured = {"integrated": -24.5, "true_peak": -12.0, "lra": 14.1, "threshold": -35.0}
+        manage_database.get_or_request_loudness = lambda path, stream_index: measured
+        assert manage_files.get_clip_loudness_filter(source_path, 1, -16) == "volume=8.50dB"
+
+        # the gain would push the peaks over the ceiling, so they are limited
+        measured["true_peak"] = -3.2
+        assert manage_files.get_clip_loudness_filter(source_path, 1, -16) == "volume=8.50dB,alimiter=limit=0.8414:level=false:latency=1"
+    finally:
+        manage_database.get_or_request_loudness = original_request
+
+
+# a clip cut with the single-pass fallback isn't current anymore once its source is measured
+def test_clip_hash_follows_the_measurement():
+    tmp_dir = testing_support.temp_dir()
+    source_path = write_source(os.path.join(tmp_dir, "hashed.mkv"))
+    config = {"Basic": {"normalize_audio": True, "lufs": -16}}
+    altered_data = {"new_filename": "hashed`-16LUFS.mp3"}
+
+    def params_hash():
+        return manage_files.get_audio_params_hash(source_path, altered_data, config, False, "Basic", 0)
+
+    before = params_hash()
+    assert params_hash() == before
+    with fake_ffmpeg(LOUDNORM_OUTPUT):
+        manage_database.measure_and_store_loudness(source_path, 1)
+    assert params_hash() != before
+
+    # without normalization the measurement changes nothing
+    config["Basic"]["normalize_audio"] = False
+    unnormalized = params_hash()
+    with fake_ffmpeg(LOUDNORM_OUTPUT):
+        manage_database.measure_and_store_loudness(source_path, 2)
+    assert params_hash() == unnormalized
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
@@ -0,0 +1,75 @@
+import os
+import types
+
+import testing_support
+
+button_actions = testing_support.load("button_actions")
+media_jobs = testing_support.load("media_jobs")
+
+
+class FakeEditor:
+    def __init__(self, note):
+        self.note = note
+        self.loads = 0
+
+    def loadNote(self):
+        self.loads += 1
+
+
+class FakeCollection:
+    def __init__(self, media_dir):
+        self.media = types.SimpleNamespace(dir=lambda: media_dir)
+        self.saved = []
+
+    def update_note(self, note):
+        self.saved.append(list(note.fields))
+
+
+# a file nothing is writing is only ready if it exists
+def test_when_ready_checks_the_file():
+    tmp_dir = testing_support.temp_dir()
+    path = os.path.join(tmp_dir, "clip.mp3")
+    queue = media_jobs.MediaJobQueue(1)
+    results = []
+    queue.when_ready(path, results.append)
+    with open(path, "wb") as f:
+        f.write(b"clip")
+    queue.when_ready(path, results.append)
+    assert results == [False, True]
+
+
+# a clip or screenshot that fails is taken out of the note, a screenshot that's written is shown
+def test_failed_media_is_removed_from_the_note():
+    tmp_dir = testing_support.temp_dir()
+    waiting = {}
+    original_pending, original_ready, original_mw = media_jobs.is_pending, media_jobs.when_ready, button_actions.aqt.mw
+    media_jobs.is_pending = lambda path: os.path.basename(path) in ("bad.mp3", "bad.webp", "good.webp")
+    media_jobs.when_ready = lambda path, callback: waiting.setdefault(os.path.basename(path), []).append(callback)
+    button_actions.aqt.mw = types.SimpleNamespace(col=FakeCollection(tmp_dir))
+    try:
+        note = types.SimpleNamespace(id=7, fields=["[sound:bad.mp3]", '<img src="bad.webp">', '<img src="good.webp">'])
+        editor = FakeEditor(note)
+        button_actions.watch_pending_media(editor)
+        # loading the note again doesn't wait on the same files twice
+        button_actions.watch_pending_media(editor)
+        assert sorted(waiting) == ["bad.mp3", "bad.webp", "good.webp"]
+        assert all(len(callbacks) == 1 for callbacks in waiting.values())
+
+        waiting["bad.webp"][0](False)
+        assert note.fields == ["[sound:bad.mp3]", "", '<img src="good.webp">']
+        assert button_actions.aqt.mw.col.saved == [note.fields]
+        assert editor.loads == 1
+
+        waiting["bad.mp3"][0](False)
+        assert note.fields == ["", "", '<img src="good.webp">']
+        assert editor.loads == 2
+
+        waiting["good.webp"][0](True)
+        assert note.fields[2] == '<img src="good.webp">'
+        assert editor.loads == 3
+    finally:
+        media_jobs.is_pending, media_jobs.when_ready, button_actions.aqt.mw = original_pending, original_ready, original_mw
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import testing_support
+
+manage_database = testing_support.load("manage_database")
+SubtitleBlock = testing_support.load("subtitle_parser").SubtitleBlock
+
+BLOCKS = [SubtitleBlock(1, 0, 900, "こんにちは"), SubtitleBlock(2, 1000, 1900, "さようなら")]
+
+
+def table_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+
+# "Reload Database" deletes the file while the add-on runs, the next connections have to create the tables again
+def test_reload_recreates_tables():
+    manage_database.run_write(manage_database.store_subtitle_track, "a.mkv", "jpn", "jpn", "1", BLOCKS)
+    tables = table_names(manage_database.get_database())
+    assert {"subtitles", "subtitle_blocks", "media_tracks", "media_files"} <= tables
+
+    manage_database.delete_database()
+    assert not os.path.exists(manage_database.db_path)
+
+    conn = manage_database.get_database()
+    assert table_names(conn) == tables
+    assert conn.execute("SELECT COUNT(*) FROM subtitle_blocks").fetchone() == (0,)
+
+    # the writer thread reconnects too
+    manage_database.run_write(manage_database.store_subtitle_track, "b.mkv", "jpn", "jpn", "1", BLOCKS)
+    assert [block[3] for block in manage_database.get_subtitle_blocks(conn, "b.mkv", "1", "jpn")] == ["こんにちは", "さようなら"]
+
+
+# reader threads never run the schema setup, the writer does it once per file
+def test_only_the_writer_creates_tables():
+    manage_database.delete_database()
+    threads = []
+    original_create = manage_database.create_tables
+
+    def create_tables(conn):
+        threads.append(threading.current_thread().name)
+        original_create(conn)
+
+    manage_database.create_tables = create_tables
+    try:
+        readers = [threading.Thread(target=lambda: table_names(manage_database.get_database())) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        assert len(threads) == 1 and threads[0].startswith("database_writer")
+    finally:
+        manage_database.create_tables = original_create
+
+
+# another thread's open connection is closed before the file is removed, otherwise windows can't delete it
+def test_reload_closes_other_threads_connections():
+    opened = []
+    connected = threading.Event()
+    done = threading.Event()
+
+    def reader():
+        opened.append(manage_database.get_database())
+        connected.set()
+        done.wait()
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    try:
+        connected.wait()
+        manage_database.delete_database()
+        try:
+            opened[0].execute("SELECT 1")
+            assert False, "the reader's connection is still open"
+        except sqlite3.ProgrammingError:
+            pass
+    finally:
+        done.set()
+        reader_thread.join()
+
+
+# pool threads that have finished don't keep their connections open until the next reload
+def test_finished_threads_connections_are_closed():
+    manage_database.get_database()
+    before = len(manage_database._connections)
+    opened = []
+    for _ in range(3):
+        with ThreadPoolExecutor(4) as executor:
+            opened += executor.map(lambda _: manage_database.get_database(), range(4))
+    # only the last pool's connections are left, they're closed when the next thread connects
+    assert len(manage_database._connections) <= before + 4
+    try:
+        opened[0].execute("SELECT 1")
+        assert False, "a finished thread's connection is still open"
+    except sqlite3.ProgrammingError:
+        pass
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
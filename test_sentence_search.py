@@ -0,0 +1,83 @@
+import random
+
+import testing_support
+
+constants = testing_support.load("constants")
+manage_database = testing_support.load("manage_database")
+manage_files = testing_support.load("manage_files")
+SubtitleBlock = testing_support.load("subtitle_parser").SubtitleBlock
+
+CONFIG = {"Basic": {"target_language_code": "jpn", "target_audio_track": 1}}
+SOURCES = ["search_a.mkv", "search_b.mkv", "search_c.mkv", "search_d.mkv"]
+
+
+def search(sentence, use_index):
+    original = manage_database.search_index_available
+    manage_database.search_index_available = use_index
+    try:
+        return manage_files.get_target_subtitle_block_and_subtitle_path_from_sentence_line(sentence, CONFIG, "Basic")
+    finally:
+        manage_database.search_index_available = original
+
+
+# the same sources and sentences share short blocks, so matches cross block boundaries at either end
+# and several sources match the same sentence, the index has to pick the one the full scan picks
+def test_index_finds_the_same_block_as_a_full_scan():
+    generator = random.Random(7)
+    texts = {}
+    for filename in SOURCES:
+        texts[filename] = ["".join(generator.choice("あいうえお") for _ in range(generator.randint(1, 5))) for _ in range(60)]
+        blocks = [SubtitleBlock(i, i * 1000, i * 1000 + 900, text) for i, text in enumerate(texts[filename], 1)]
+        manage_database.run_write(manage_database.store_subtitle_track, filename, "jpn", "jpn", "1", blocks)
+    manage_database.run_write(lambda conn: conn.executemany(
+        "INSERT OR REPLACE INTO subtitle_access(filename, last_accessed) VALUES (?, ?)",
+        [(filename, f"2026-01-0{n + 1} 00:00:00") for n, filename in enumerate(SOURCES)]
+    ))
+
+    # a search moves its source to the front, which would change the ranking between the two searches
+    original_touch = manage_database.touch_subtitle_access
+    manage_database.touch_subtitle_access = lambda filename: None
+    try:
+        sentences = []
+        for _ in range(100):
+            lines = texts[generator.choice(SOURCES)]
+            start = generator.randrange(len(lines) - 3)
+            joined = "".join(lines[start:start + 3])
+            begin = generator.randrange(len(joined) - 3)
+            sentences.append(joined[begin:begin + generator.randint(3, len(joined) - begin)])
+        sentences += ["かきく", "あいうえおかきくけこ"]
+
+        for sentence in sentences:
+            assert search(sentence, True) == search(sentence, False), sentence
+    finally:
+        manage_database.touch_subtitle_access = original_touch
+
+
+# with the index only the blocks around the candidates are read, never a whole track
+def test_index_reads_only_the_candidate_ranges():
+    blocks = [SubtitleBlock(i, i * 1000, i * 1000 + 900, f"第{i}番のブロック") for i in range(1, 201)]
+    manage_database.run_write(manage_database.store_subtitle_track, "search_ranges.mkv", "jpn", "jpn", "1", blocks)
+    reads = []
+    original_rows = manage_database.get_subtitle_block_rows
+
+    def get_subtitle_block_rows(conn, filename, track, language, start_index=None, end_index=None):
+        reads.append((filename, start_index, end_index))
+        return original_rows(conn, filename, track, language, start_index, end_index)
+
+    manage_database.get_subtitle_block_rows = get_subtitle_block_rows
+    try:
+        block, _, _ = search("第150番のブロック", True)
+    finally:
+        manage_database.get_subtitle_block_rows = original_rows
+    assert block[0] == "150"
+    assert reads and all(start is not None and end - start < 100 for _, start, end in reads)
+
+
+def test_search_texts_reach_into_the_next_blocks():
+    assert manage_database.get_block_search_texts(["あい", "", "う", "えおか", "き"]) == [
+        "あいうえお", "うえお", "うえおか", "えおかき", "き"
+    ]
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
@@ -0,0 +1,144 @@
+import io
+
+import testing_support
+
+subtitle_parser = testing_support.load("subtitle_parser")
+SubtitleBlock = subtitle_parser.SubtitleBlock
+
+
+def test_srt():
+    text = (
+        "1\n"
+        "00:00:01,000 --> 00:00:02,500\n"
+        "<i>今日は</i>\n"
+        "天気\n"
+        "\n"
+        "2\n"
+        "00:00:03,000 --> 00:00:04,000\n"
+        "(笑)\n"
+        "\n"
+        "3\n"
+        "00:00:05,000 --> 00:00:06,000\n"
+        "いいですね\n"
+    )
+    assert subtitle_parser.parse_subtitle_text(text) == [
+        SubtitleBlock(1, 1000, 2500, "今日は 天気"),
+        SubtitleBlock(2, 5000, 6000, "いいですね"),
+    ]
+
+
+def test_webvtt():
+    text = (
+        "WEBVTT\n"
+        "\n"
+        "NOTE a comment\n"
+        "\n"
+        "cue-1\n"
+        "01:02.5 --> 01:03.250 align:start\n"
+        "こんにちは\n"
+    )
+    assert subtitle_parser.parse_subtitle_text(text) == [SubtitleBlock(1, 62500, 63250, "こんにちは")]
+
+
+def test_ass_override_tags():
+    text = (
+        "[Script Info]\n"
+        "Title: test\n"
+        "\n"
+        "[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+        "Dialogue: 0,0:00:03.00,0:00:04.00,Default,,0,0,0,,{\\pbo10}二行目\\Nです\n"
+        "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,{\\pos(320,50)}こんにちは, 世界\n"
+        "Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,{\\an7\\p1}m 0 0 l 100 0 100 100 0 100{\\p0}\n"
+        "Dialogue: 0,0:00:07.00,0:00:08.00,Default,,0,0,0,,{\\p2}m 0 0 l 10 10\n"
+    )
+    assert subtitle_parser.parse_subtitle_text(text) == [
+        SubtitleBlock(1, 1000, 2000, "こんにちは, 世界"),
+        SubtitleBlock(2, 3000, 4000, "二行目 です"),
+    ]
+
+
+def test_remove_subtitle_formatting():
+    remove = subtitle_parser.remove_subtitle_formatting
+    assert remove("{\\pos(320,50)}こんにちは") == "こんにちは"
+    assert remove("{\\pbo-5\\b1}太字") == "太字"
+    assert remove("{\\p1}m 0 0 l 100 0 100 100") == ""
+    assert remove("{\\fad(200,200)\\p4}m 0 0 l 1 1") == ""
+    assert remove("<font color=\"#fff\">[音楽]</font>") == ""
+
+
+def test_repeated_timings():
+    blocks = [SubtitleBlock(i, 1000, 2000, f"sign {i}") for i in range(1, 5)]
+    blocks.append(SubtitleBlock(5, 3000, 4000, "台詞"))
+    assert subtitle_parser.clean_blocks(blocks, drop_repeated_timings=True) == [SubtitleBlock(1, 3000, 4000, "台詞")]
+    assert len(subtitle_parser.clean_blocks(blocks)) == 5
+
+
+# an ebml element with a two byte size, ids are written with their length marker
+def mkv_element(element_id, payload):
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    return id_bytes + (0x4000 | len(payload)).to_bytes(2, "big") + payload
+
+
+def mkv_block_group(track, timestamp, duration, text):
+    block = bytes([0x80 | track]) + timestamp.to_bytes(2, "big", signed=True) + b"\x00" + text.encode("utf-8")
+    return mkv_element(0xA0, mkv_element(0xA1, block) + mkv_element(0x9B, duration.to_bytes(2, "big")))
+
+
+def test_matroska_blocks():
+    # the segment size is unknown, like ffmpeg writes it to a pipe
+    data = mkv_element(0x1A45DFA3, mkv_element(0x4282, b"matroska"))
+    data += bytes.fromhex("18538067") + bytes.fromhex("01ffffffffffffff")
+    data += mkv_element(0x1549A966, mkv_element(0x2AD7B1, (1000000).to_bytes(3, "big")))
+    data += mkv_element(0x1F43B675, (
+        mkv_element(0xE7, (1000).to_bytes(2, "big"))
+        + mkv_block_group(2, 0, 500, "english")
+        + mkv_block_group(1, 500, 1500, "<i>今日は</i>\r\n天気")
+        + mkv_block_group(1, 2000, 1000, " ")
+    ))
+    data += mkv_element(0x1F43B675, (
+        mkv_element(0xE7, (5000).to_bytes(2, "big"))
+        + mkv_block_group(1, -1000, 1000, "いいですね")
+    ))
+    assert list(subtitle_parser.iter_matroska_blocks(io.BytesIO(data))) == [
+        (2, SubtitleBlock(1, 1000, 1500, "english")),
+        (1, SubtitleBlock(1, 1500, 3000, "<i>今日は</i> 天気")),
+        (1, SubtitleBlock(2, 4000, 5000, "いいですね")),
+    ]
+    # a stream cut off in the middle of a block ends with the blocks before it
+    assert len(list(subtitle_parser.iter_matroska_blocks(io.BytesIO(data[:-4])))) == 2
+
+
+# simple blocks and block groups without a duration end where their track's next block starts
+def test_matroska_blocks_without_duration():
+    def simple_block(track, timestamp, text):
+        return mkv_element(0xA3, bytes([0x80 | track]) + timestamp.to_bytes(2, "big", signed=True) + b"\x80" + text.encode("utf-8"))
+
+    data = bytes.fromhex("18538067") + bytes.fromhex("01ffffffffffffff")
+    data += mkv_element(0x1F43B675, (
+        mkv_element(0xE7, (0).to_bytes(2, "big"))
+        + simple_block(1, 1000, "一行目")
+        + mkv_block_group(2, 1200, 300, "first")
+        + mkv_element(0xA0, mkv_element(0xA1, bytes([0x81]) + (2000).to_bytes(2, "big") + b"\x00" + "二行目".encode("utf-8")))
+    ))
+    data += mkv_element(0x1F43B675, (
+        mkv_element(0xE7, (3000).to_bytes(2, "big"))
+        + simple_block(1, 500, "三行目")
+    ))
+    assert list(subtitle_parser.iter_matroska_blocks(io.BytesIO(data))) == [
+        (2, SubtitleBlock(1, 1200, 1500, "first")),
+        (1, SubtitleBlock(1, 1000, 2000, "一行目")),
+        (1, SubtitleBlock(2, 2000, 3500, "二行目")),
+        (1, SubtitleBlock(3, 3500, 3500 + subtitle_parser.MKV_LAST_BLOCK_DURATION_MS, "三行目")),
+    ]
+
+
+def test_times():
+    assert subtitle_parser.time_to_milliseconds("0:01:02.34") == 62340
+    assert subtitle_parser.time_to_milliseconds("00.01.02.345") == 62345
+    assert subtitle_parser.time_to_milliseconds("soon") is None
+    assert subtitle_parser.milliseconds_to_srt_time(3723004) == "01:02:03,004"
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
@@ -0,0 +1,124 @@
+import threading
+
+import testing_support
+
+manage_database = testing_support.load("manage_database")
+SubtitleBlock = testing_support.load("subtitle_parser").SubtitleBlock
+
+
+def make_blocks(count, text="line"):
+    return [SubtitleBlock(i + 1, i * 1000, i * 1000 + 900, f"{text} {i}") for i in range(count)]
+
+
+def store(filename, blocks):
+    manage_database.run_write(manage_database.store_subtitle_track, filename, "jpn", "jpn", "1", blocks)
+
+
+def load(filename):
+    return manage_database.load_subtitle_track(manage_database.get_database(), filename, "1", "jpn")
+
+
+def is_cached(filename):
+    return (filename, "1", "jpn") in manage_database._track_cache
+
+
+def test_hits_and_misses():
+    manage_database.invalidate_track_cache()
+    store("hits.mkv", make_blocks(5))
+    stats = manage_database.get_track_cache_stats()
+    first = load("hits.mkv")
+    assert load("hits.mkv") is first
+    after = manage_database.get_track_cache_stats()
+    assert after["misses"] == stats["misses"] + 1
+    assert after["hits"] == stats["hits"] + 1
+    assert load("missing.mkv") is None
+
+
+def test_overlapping_blocks():
+    blocks = make_blocks(10)
+    # a long sign overlapping the blocks after it
+    blocks[2] = SubtitleBlock(3, 2000, 6000, "long")
+    store("overlap.mkv", blocks)
+    loaded_track = load("overlap.mkv")
+    assert [block[3] for block in loaded_track.get_overlapping_blocks(4500, 5200)] == ["long", "line 4", "line 5"]
+    assert loaded_track.get_overlapping_blocks(20000, 21000) == []
+    assert [block[0] for block in loaded_track.get_blocks(2, 3)] == ["2", "3"]
+    # callers get copies they can change
+    loaded_track.get_blocks(1, 1)[0][3] = "changed"
+    assert loaded_track.get_blocks(1, 1)[0][3] == "line 0"
+
+
+def test_store_invalidates():
+    store("changed.mkv", make_blocks(3))
+    assert len(load("changed.mkv").blocks) == 3
+    store("changed.mkv", make_blocks(4, "new"))
+    assert not is_cached("changed.mkv")
+    assert load("changed.mkv").blocks[0][3] == "new 0"
+
+
+def test_lru_eviction():
+    manage_database.invalidate_track_cache()
+    original_max = manage_database.TRACK_CACHE_MAX_BYTES
+    store("lru1.mkv", make_blocks(20))
+    store("lru2.mkv", make_blocks(20))
+    size = load("lru1.mkv").size
+    manage_database.TRACK_CACHE_MAX_BYTES = size * 2 - 1
+    try:
+        load("lru2.mkv")
+        assert not is_cached("lru1.mkv") and is_cached("lru2.mkv")
+        assert manage_database.get_track_cache_stats()["bytes"] == size
+    finally:
+        manage_database.TRACK_CACHE_MAX_BYTES = original_max
+
+
+# a write landing while a reader fetches rows keeps the reader's copy out of the cache
+def test_write_during_read_is_not_cached():
+    store("race.mkv", make_blocks(3))
+    manage_database.invalidate_track_cache()
+    original_rows = manage_database.get_subtitle_block_rows
+
+    def rows_then_write(*args, **kwargs):
+        rows = original_rows(*args, **kwargs)
+        store("race.mkv", make_blocks(4, "new"))
+        return rows
+
+    manage_database.get_subtitle_block_rows = rows_then_write
+    try:
+        assert len(load("race.mkv").blocks) == 3
+    finally:
+        manage_database.get_subtitle_block_rows = original_rows
+    assert not is_cached("race.mkv")
+    assert len(load("race.mkv").blocks) == 4
+
+
+# a reader caching the committed rows while a write transaction is still open is dropped at the commit
+def test_read_before_commit_is_dropped():
+    store("commit.mkv", make_blocks(3))
+    manage_database.invalidate_track_cache()
+    seen = []
+    connected = threading.Event()
+    read = threading.Event()
+
+    # the reader connects first, opening a connection needs a moment without a write transaction
+    def reader():
+        manage_database.get_database()
+        connected.set()
+        read.wait()
+        seen.append(len(load("commit.mkv").blocks))
+        manage_database.close_thread_connection()
+
+    def write_and_read(conn):
+        manage_database.store_subtitle_track(conn, "commit.mkv", "jpn", "jpn", "1", make_blocks(4, "new"))
+        read.set()
+        reader_thread.join()
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    connected.wait()
+    manage_database.run_write(write_and_read)
+    assert seen == [3]
+    assert len(load("commit.mkv").blocks) == 4
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
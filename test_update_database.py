@@ -0,0 +1,125 @@
+import io
+import os
+
+import testing_support
+
+constants = testing_support.load("constants")
+manage_database = testing_support.load("manage_database")
+subtitle_parser = testing_support.load("subtitle_parser")
+SubtitleBlock = subtitle_parser.SubtitleBlock
+
+SIDECAR = "1\n00:00:01,000 --> 00:00:02,000\nユーザー字幕\n"
+
+
+# an ffmpeg whose one embedded track holds the text of the media file
+class FakeProcess:
+    def __init__(self, cmd, **kwargs):
+        with open(cmd[cmd.index("-i") + 1], "rb") as f:
+            self.stdout = io.BytesIO(f.read())
+        self.stderr = io.BytesIO(b"")
+        self.returncode = None
+
+    def wait(self):
+        self.returncode = 0
+
+    def kill(self):
+        pass
+
+
+def fake_matroska_blocks(stream):
+    yield 1, SubtitleBlock(1, 0, 1000, stream.read().decode("utf-8"))
+
+
+def write_file(path, text, mtime):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.utime(path, (mtime, mtime))
+
+
+def embedded_text(filename):
+    rows = manage_database.get_database().execute(
+        "SELECT text FROM subtitle_blocks WHERE filename=? AND track='1'", (filename,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+# a changed media file is extracted again even though its user placed subtitle stays indexed
+def test_changed_media_with_sidecar_is_extracted_again():
+    folder = os.path.join(constants.addon_dir, constants.addon_source_folder)
+    os.makedirs(folder, exist_ok=True)
+    media_path = os.path.join(folder, "sidecar.mkv")
+    write_file(media_path, "first release", 1000000000)
+    write_file(os.path.join(folder, "sidecar.jpn.srt"), SIDECAR, 1000000000)
+
+    originals = (
+        manage_database.get_media_streams, constants.silent_popen, subtitle_parser.iter_matroska_blocks,
+        manage_database.ffmpeg_path, manage_database.ffprobe_path
+    )
+    manage_database.get_media_streams = lambda path, stream_type=None: [{"index": 2, "codec": "subrip", "language": "jpn"}]
+    constants.silent_popen = FakeProcess
+    subtitle_parser.iter_matroska_blocks = fake_matroska_blocks
+    manage_database.ffmpeg_path, manage_database.ffprobe_path = "ffmpeg", "ffprobe"
+    try:
+        manage_database.update_database()
+        assert embedded_text("sidecar.mkv") == ["first release"]
+
+        write_file(media_path, "fixed second release", 1000000100)
+        manage_database.update_database()
+        assert embedded_text("sidecar.mkv") == ["fixed second release"]
+        sidecar_rows = manage_database.get_database().execute(
+            "SELECT text FROM subtitle_blocks WHERE filename='sidecar.mkv' AND track='-1'"
+        ).fetchall()
+        assert sidecar_rows == [("ユーザー字幕",)]
+    finally:
+        (
+            manage_database.get_media_streams, constants.silent_popen, subtitle_parser.iter_matroska_blocks,
+            manage_database.ffmpeg_path, manage_database.ffprobe_path
+        ) = originals
+
+
+# a sidecar that can't be parsed isn't recorded, the next update reads it again
+def test_unreadable_sidecar_is_not_recorded():
+    folder = os.path.join(constants.addon_dir, constants.addon_source_folder)
+    os.makedirs(folder, exist_ok=True)
+    write_file(os.path.join(folder, "broken.mp3"), "audio", 1000000000)
+    sidecar_path = os.path.join(folder, "broken.jpn.srt")
+    write_file(sidecar_path, "not a subtitle", 1000000000)
+
+    originals = (manage_database.get_media_streams, manage_database.ffmpeg_path, manage_database.ffprobe_path)
+    manage_database.get_media_streams = lambda path, stream_type=None: []
+    manage_database.ffmpeg_path, manage_database.ffprobe_path = "ffmpeg", "ffprobe"
+    try:
+        manage_database.update_database()
+        recorded = manage_database.get_database().execute(
+            "SELECT path FROM media_files WHERE filename='broken.jpn.srt'"
+        ).fetchall()
+        assert recorded == []
+
+        write_file(sidecar_path, SIDECAR, 1000000000)
+        manage_database.update_database()
+        rows = manage_database.get_database().execute(
+            "SELECT text FROM subtitle_blocks WHERE filename='broken.mp3' AND track='-1'"
+        ).fetchall()
+        assert rows == [("ユーザー字幕",)]
+    finally:
+        manage_database.get_media_streams, manage_database.ffmpeg_path, manage_database.ffprobe_path = originals
+
+
+# a rescanned folder keeps its place in scan order, so a name in two folders still finds the same file
+def test_refreshed_folder_keeps_its_priority():
+    root = testing_support.temp_dir()
+    for subfolder in ("a", "b"):
+        os.makedirs(os.path.join(root, subfolder))
+        write_file(os.path.join(root, subfolder, "episode.mkv"), subfolder, 1000000000)
+    snapshot = manage_database.SourceFolderSnapshot(root)
+    assert snapshot.names["episode.mkv"] == os.path.join(root, "a", "episode.mkv")
+
+    write_file(os.path.join(root, "a", "new.mkv"), "new", 1000000000)
+    os.utime(os.path.join(root, "a"), (1000000100, 1000000100))
+    assert snapshot.refresh()
+    assert snapshot.names["episode.mkv"] == os.path.join(root, "a", "episode.mkv")
+    assert "new.mkv" in snapshot.names
+
+
+if __name__ == "__main__":
+    testing_support.run_tests(globals())
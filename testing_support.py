@@ -0,0 +1,60 @@
+# shared setup for the test_*.py scripts, which run with pytest or on their own: python test_track_cache.py
+# like benchmark.py, the add-on is copied into a temporary folder and imported from there,
+# so the index, config, log and bulk checkpoint the tests write never touch the real ones
+import atexit
+import glob
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+import benchmark
+
+addon_dir = os.path.dirname(os.path.abspath(__file__))
+package_name = "audio_card_suite_test"
+work_dir = tempfile.mkdtemp(prefix="audio_card_suite_test_")
+atexit.register(shutil.rmtree, work_dir, True)
+
+# pytest imports the test files as modules of the add-on's folder, which would run __init__ and start an update
+repo_package = os.path.basename(addon_dir)
+if repo_package not in sys.modules:
+    package = types.ModuleType(repo_package)
+    package.__path__ = [addon_dir]
+    sys.modules[repo_package] = package
+
+
+def load_package():
+    if package_name in sys.modules:
+        return
+    collection_dir = os.path.join(work_dir, "collection.media")
+    os.makedirs(collection_dir)
+    benchmark.install_stubs(collection_dir)
+
+    package_dir = os.path.join(work_dir, package_name)
+    os.makedirs(package_dir)
+    for path in glob.glob(os.path.join(addon_dir, "*.py")):
+        shutil.copy2(path, package_dir)
+    package = types.ModuleType(package_name)
+    package.__path__ = [package_dir]
+    sys.modules[package_name] = package
+
+
+# imports one of the add-on's modules from the temporary copy
+def load(name):
+    load_package()
+    return importlib.import_module(f"{package_name}.{name}")
+
+
+# a new empty folder inside the temporary copy
+def temp_dir():
+    return tempfile.mkdtemp(dir=work_dir)
+
+
+# runs the test_ functions of a test script when it's run on its own
+def run_tests(namespace):
+    for name, test in list(namespace.items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
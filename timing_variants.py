@@ -0,0 +1,106 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import constants
+from .constants import log_command, log_error
+
+# clips for the next likely timing adjustments, rendered outside the media folder until one is used
+variants_folder = os.path.join(constants.addon_dir, "timing_variants")
+
+# building a command can hit a showInfo, which is only logged on these threads
+_executor = ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix="timing_variants",
+    initializer=constants.mark_background_worker, initargs=("timing variant",)
+)
+# filename in the collection -> (path in variants_folder, params hash it was rendered with, future of the render)
+_variants = {}
+_variants_lock = threading.Lock()
+
+
+def run_variant(make_cmd, variant_path):
+    cmd = make_cmd()
+    if not cmd:
+        return False
+    log_command(f"[FFmpeg timing variant]\n{' '.join(cmd)}")
+    result = constants.silent_run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if result.returncode != 0:
+        log_error(f"Rendering timing variant failed:\n{result.stderr}")
+        return False
+    return os.path.exists(variant_path)
+
+
+def remove_variant_file(variant_path):
+    try:
+        os.remove(variant_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log_error(f"Could not remove timing variant {variant_path}: {e}")
+
+
+# variants is a list of (filename, params_hash, make_cmd), make_cmd builds the ffmpeg command writing to
+# variants_folder/filename, params_hash is the clip's get_audio_params_hash
+# variants of the previous clip that aren't in the new list, or were rendered with other parameters, are removed
+def render(variants):
+    os.makedirs(variants_folder, exist_ok=True)
+    wanted = {filename: params_hash for filename, params_hash, _ in variants}
+    with _variants_lock:
+        stale = [_variants.pop(filename) for filename in list(_variants)
+                 if wanted.get(filename) != _variants[filename][1]]
+        for filename, params_hash, make_cmd in variants:
+            if filename in _variants:
+                continue
+            variant_path = os.path.join(variants_folder, filename)
+            _variants[filename] = (variant_path, params_hash, _executor.submit(run_variant, make_cmd, variant_path))
+        tracked = {variant_path for variant_path, _, _ in _variants.values()}
+
+    for variant_path, _, future in stale:
+        if future.cancel() or future.done():
+            remove_variant_file(variant_path)
+        else:
+            future.add_done_callback(lambda _, path=variant_path: remove_variant_file(path))
+
+    # leftovers from an earlier session
+    stale_paths = {variant_path for variant_path, _, _ in stale}
+    for entry in os.scandir(variants_folder):
+        if entry.is_file() and entry.path not in tracked and entry.path not in stale_paths:
+            remove_variant_file(entry.path)
+
+
+# moves a rendered variant into the collection as new_path, one still rendering or rendered with other parameters
+# is dropped and the clip made normally
+def take_variant(filename, new_path, params_hash):
+    with _variants_lock:
+        variant = _variants.pop(filename, None)
+    if variant is None:
+        return False
+
+    variant_path, variant_hash, future = variant
+    if variant_hash != params_hash:
+        log_command(f"timing variant {filename} was rendered with other parameters, not using it")
+        if future.cancel() or future.done():
+            remove_variant_file(variant_path)
+        else:
+            future.add_done_callback(lambda _: remove_variant_file(variant_path))
+        return False
+    if not future.done():
+        future.add_done_callback(lambda _: remove_variant_file(variant_path))
+        return False
+    try:
+        rendered = future.result()
+    except Exception as e:
+        log_error(f"Timing variant {filename} failed: {e}")
+        rendered = False
+
+    if not rendered:
+        remove_variant_file(variant_path)
+        return False
+    try:
+        os.replace(variant_path, new_path)
+    except OSError as e:
+        log_error(f"Could not move timing variant into the collection: {e}")
+        remove_variant_file(variant_path)
+        return False
+    log_command(f"used pre-rendered timing variant: {filename}")
+    return True